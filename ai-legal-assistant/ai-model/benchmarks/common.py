@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+AI_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(AI_MODEL_DIR, "data")
+# Benchmarks never touch the real vectorstores/ and extraction_cache/; stores built here are reused between runs
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), "ai-legal-assistant-bench")
+
+
+def prepare_work_dir(path: str) -> str:
+    """A directory main.py can run in: its own vectorstores and caches, and the shipped data/ linked in."""
+    path = os.path.abspath(path)
+    os.makedirs(path, exist_ok=True)
+    data_link = os.path.join(path, "data")
+    if not os.path.exists(data_link):
+        os.symlink(DATA_DIR, data_link)
+    return path
+
+
+def import_main(work_dir: str, environment: Optional[Dict[str, str]] = None):
+    """Import main.py in-process from inside `work_dir` (it creates its directories relative to the cwd)."""
+    os.environ.update(environment or {})
+    os.environ.setdefault("GEMINI_API_KEY", "fake-gemini-key")
+    os.chdir(work_dir)
+    if AI_MODEL_DIR not in sys.path:
+        sys.path.insert(0, AI_MODEL_DIR)
+    import main
+    return main
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean of latencies in seconds, reported in milliseconds."""
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0}
+    values = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def rss_mb(pid: Optional[int] = None) -> Dict[str, float]:
+    """Current and peak resident set size of a process (Linux /proc), in MB."""
+    usage = {}
+    try:
+        with open(f"/proc/{pid or os.getpid()}/status", "r") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key = "rss_mb" if line.startswith("VmRSS") else "peak_rss_mb"
+                    usage[key] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        if pid is None or pid == os.getpid():
+            import resource
+            usage["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return usage
+
+
+def print_table(rows: List[Dict[str, Any]], columns: Sequence[str]) -> None:
+    widths = {column: max([len(column)] + [len(_cell(row.get(column))) for row in rows]) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for row in rows:
+        print("  ".join(_cell(row.get(column)).ljust(widths[column]) for column in columns))
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}" if abs(value) < 100 else f"{value:.1f}"
+    return str(value)
+
+
+def save_results(path: str, rows: List[Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2)
+
+
+def compare_to_baseline(rows: List[Dict[str, Any]], baseline_path: str, key_fields: Sequence[str],
+                        lower_is_better: Sequence[str], higher_is_better: Sequence[str] = (),
+                        tolerance: float = 0.2) -> List[str]:
+    """Regressions of more than `tolerance` (a fraction) against a saved run, one message each."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {tuple(row.get(field) for field in key_fields): row for row in json.load(f)}
+
+    regressions = []
+    for row in rows:
+        key = tuple(row.get(field) for field in key_fields)
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        label = "/".join(str(part) for part in key)
+        for metric in lower_is_better:
+            if previous.get(metric) and row.get(metric, 0) > previous[metric] * (1 + tolerance):
+                regressions.append(f"{label}: {metric} {previous[metric]} -> {row[metric]}")
+        for metric in higher_is_better:
+            if previous.get(metric) and row.get(metric, 0) < previous[metric] * (1 - tolerance):
+                regressions.append(f"{label}: {metric} {previous[metric]} -> {row[metric]}")
+    return regressions
@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import argparse
+import datetime
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+import grpc
+from google.ai.generativelanguage_v1beta.types import content as content_types
+from google.ai.generativelanguage_v1beta.types import generative_service as service_types
+
+SERVICE_NAME = "google.ai.generativelanguage.v1beta.GenerativeService"
+CERT_FILE = "fake_gemini.pem"
+# Printed on stdout once the server accepts connections, followed by the port
+READY_LINE = "FAKE_GEMINI_READY"
+
+CLAUSE_TYPES = ["Payment", "Termination", "Liability", "Confidentiality", "Intellectual Property",
+                "Dispute Resolution", "Governing Law", "Force Majeure", "Warranties", "Indemnification"]
+RISK_LEVELS = ["High", "Medium", "Low"]
+_FILLER = ("the party shall within thirty days of notice provide written confirmation of compliance with "
+           "applicable law and the terms of this agreement subject to section").split()
+
+
+def _seed(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _words(rng: np.random.Generator, count: int) -> str:
+    return " ".join(_FILLER[i] for i in rng.integers(0, len(_FILLER), count))
+
+
+def extraction_response(prompt: str, clauses: int = 6, words_per_field: int = 25) -> str:
+    """A clause-extraction answer in the CLAUSE_START/CLAUSE_END format the extractor parses."""
+    rng = np.random.default_rng(_seed(prompt))
+    blocks = []
+    for i in range(clauses):
+        blocks.append(
+            "CLAUSE_START\n"
+            f"Type: {CLAUSE_TYPES[(i + int(rng.integers(0, len(CLAUSE_TYPES)))) % len(CLAUSE_TYPES)]}\n"
+            f"Text: {_words(rng, words_per_field * 2)}\n"
+            f"Key Points: {_words(rng, words_per_field)}\n"
+            f"Risk Level: {RISK_LEVELS[int(rng.integers(0, len(RISK_LEVELS)))]}\n"
+            f"Analysis: **{_words(rng, 3)}** {_words(rng, words_per_field)}\n"
+            "CLAUSE_END"
+        )
+    return "\n\n".join(blocks)
+
+
+def answer_response(prompt: str, tokens: int) -> str:
+    """A markdown-heavy answer of about `tokens` words, so response cleaning has work to do."""
+    rng = np.random.default_rng(_seed(prompt))
+    lines = ["## Answer", ""]
+    written = 0
+    while written < tokens:
+        count = int(min(tokens - written, rng.integers(8, 24)))
+        lines.append(f"* **Point:** {_words(rng, count)}.")
+        written += count + 1
+    return "\n".join(lines)
+
+
+def fake_embedding(text: str, dimension: int) -> List[float]:
+    return np.random.default_rng(_seed(text)).standard_normal(dimension).astype(np.float32).tolist()
+
+
+def make_certificate(directory: str):
+    """Self-signed certificate for localhost; clients trust it through GRPC_DEFAULT_SSL_ROOTS_FILE_PATH.
+
+    The Gemini client only opens TLS channels, so the fake server has to speak TLS too.
+    Returns (certificate PEM path, certificate bytes, key bytes).
+    """
+    try:
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+    except ImportError:
+        raise ImportError("The fake Gemini server needs cryptography for its TLS certificate (pip install cryptography).")
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=7))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_pem = certificate.public_bytes(serialization.Encoding.PEM)
+    key_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, CERT_FILE)
+    with open(path, "wb") as f:
+        f.write(cert_pem)
+    return path, cert_pem, key_pem
+
+
+class FakeGemini:
+    """Stand-in for Gemini's GenerativeService with configurable latency and token rate.
+
+    Chat calls wait `chat_latency` seconds (time to first token) and then
+    produce tokens at `tokens_per_second`; streamed calls send them as they are
+    "generated". Clause-extraction prompts get parseable CLAUSE_START blocks,
+    other prompts a markdown answer of `answer_tokens` words. Embedding calls
+    wait `embed_latency` per request plus `embed_latency_per_text` per text and
+    return deterministic vectors.
+    """
+
+    def __init__(self, chat_latency: float = 0.5, tokens_per_second: float = 80.0, answer_tokens: int = 200,
+                 embed_latency: float = 0.05, embed_latency_per_text: float = 0.001, dimension: int = 768,
+                 clauses_per_response: int = 6):
+        self.chat_latency = chat_latency
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.embed_latency = embed_latency
+        self.embed_latency_per_text = embed_latency_per_text
+        self.dimension = dimension
+        self.clauses_per_response = clauses_per_response
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def _count(self, method: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[method] = self.counts.get(method, 0) + amount
+
+    @staticmethod
+    def _prompt(request: service_types.GenerateContentRequest) -> str:
+        return "\n".join(part.text for item in request.contents for part in item.parts)
+
+    def _answer(self, prompt: str) -> str:
+        if "CLAUSE_START" in prompt:
+            return extraction_response(prompt, self.clauses_per_response)
+        return answer_response(prompt, self.answer_tokens)
+
+    def _generation_seconds(self, text: str) -> float:
+        return len(text.split()) / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    @staticmethod
+    def _response(text: str, prompt: str, finished: bool) -> service_types.GenerateContentResponse:
+        return service_types.GenerateContentResponse(
+            candidates=[service_types.Candidate(
+                content=content_types.Content(parts=[content_types.Part(text=text)], role="model"),
+                finish_reason=service_types.Candidate.FinishReason.STOP if finished else 0,
+                index=0
+            )],
+            usage_metadata=service_types.GenerateContentResponse.UsageMetadata(
+                prompt_token_count=len(prompt.split()),
+                candidates_token_count=len(text.split()),
+                total_token_count=len(prompt.split()) + len(text.split())
+            )
+        )
+
+    async def generate_content(self, request, context):
+        self._count("generate_content")
+        prompt = self._prompt(request)
+        answer = self._answer(prompt)
+        await asyncio.sleep(self.chat_latency + self._generation_seconds(answer))
+        return self._response(answer, prompt, finished=True)
+
+    async def stream_generate_content(self, request, context):
+        self._count("stream_generate_content")
+        prompt = self._prompt(request)
+        words = self._answer(prompt).split(" ")
+        await asyncio.sleep(self.chat_latency)
+        step = 8
+        for start in range(0, len(words), step):
+            piece = " ".join(words[start:start + step]) + (" " if start + step < len(words) else "")
+            await asyncio.sleep(self._generation_seconds(piece))
+            yield self._response(piece, prompt, finished=start + step >= len(words))
+
+    def _embedding(self, item: content_types.Content) -> service_types.ContentEmbedding:
+        text = "\n".join(part.text for part in item.parts)
+        return service_types.ContentEmbedding(values=fake_embedding(text, self.dimension))
+
+    async def embed_content(self, request, context):
+        self._count("embed_content")
+        self._count("embedded_texts")
+        await asyncio.sleep(self.embed_latency + self.embed_latency_per_text)
+        return service_types.EmbedContentResponse(embedding=self._embedding(request.content))
+
+    async def batch_embed_contents(self, request, context):
+        self._count("batch_embed_contents")
+        self._count("embedded_texts", len(request.requests))
+        await asyncio.sleep(self.embed_latency + self.embed_latency_per_text * len(request.requests))
+        return service_types.BatchEmbedContentsResponse(
+            embeddings=[self._embedding(item.content) for item in request.requests]
+        )
+
+    async def count_tokens(self, request, context):
+        self._count("count_tokens")
+        return service_types.CountTokensResponse(total_tokens=len(self._prompt(request).split()))
+
+    def handler(self) -> grpc.GenericRpcHandler:
+        def method(kind, function, request_type, response_type):
+            return getattr(grpc, f"{kind}_rpc_method_handler")(
+                function, request_deserializer=request_type.deserialize, response_serializer=response_type.serialize
+            )
+
+        return grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            "GenerateContent": method("unary_unary", self.generate_content,
+                                      service_types.GenerateContentRequest, service_types.GenerateContentResponse),
+            "StreamGenerateContent": method("unary_stream", self.stream_generate_content,
+                                            service_types.GenerateContentRequest, service_types.GenerateContentResponse),
+            "EmbedContent": method("unary_unary", self.embed_content,
+                                   service_types.EmbedContentRequest, service_types.EmbedContentResponse),
+            "BatchEmbedContents": method("unary_unary", self.batch_embed_contents,
+                                         service_types.BatchEmbedContentsRequest, service_types.BatchEmbedContentsResponse),
+            "CountTokens": method("unary_unary", self.count_tokens,
+                                  service_types.CountTokensRequest, service_types.CountTokensResponse),
+        })
+
+    async def serve(self, cert_dir: str, port: int = 0, ready=None) -> None:
+        """Serve until cancelled; `ready(port)` is called once connections are accepted."""
+        _, cert_pem, key_pem = make_certificate(cert_dir)
+        server = grpc.aio.server()
+        server.add_generic_rpc_handlers((self.handler(),))
+        port = server.add_secure_port(f"localhost:{port}", grpc.ssl_server_credentials([(key_pem, cert_pem)]))
+        await server.start()
+        if ready is not None:
+            ready(port)
+        try:
+            await server.wait_for_termination()
+        finally:
+            await server.stop(None)
+
+
+def client_environment(cert_dir: str, port: int) -> Dict[str, str]:
+    """Environment that points main.py's Gemini clients at a fake server started with `cert_dir`."""
+    return {
+        "GEMINI_API_KEY": "fake-gemini-key",
+        "GEMINI_ENDPOINT": f"localhost:{port}",
+        "GRPC_DEFAULT_SSL_ROOTS_FILE_PATH": os.path.join(cert_dir, CERT_FILE),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fake Gemini chat/embedding server for offline benchmarks.")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--cert-dir", required=True, help="Where the self-signed certificate is written")
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="Seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding request")
+    parser.add_argument("--embed-latency-per-text", type=float, default=0.001)
+    parser.add_argument("--dimension", type=int, default=768)
+    args = parser.parse_args(argv)
+
+    fake = FakeGemini(args.chat_latency, args.tokens_per_second, args.answer_tokens,
+                      args.embed_latency, args.embed_latency_per_text, args.dimension)
+    started = time.time()
+
+    def ready(port: int) -> None:
+        print(f"{READY_LINE} {port}", flush=True)
+
+    try:
+        asyncio.run(fake.serve(args.cert_dir, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"fake Gemini served {fake.counts} in {time.time() - started:.1f}s", file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import hashlib
+import argparse
+import subprocess
+from typing import Any, Dict, List, Optional
+import aiohttp
+from benchmarks.common import (
+    AI_MODEL_DIR, DATA_DIR, DEFAULT_WORK_DIR, prepare_work_dir, summarize, rss_mb, print_table,
+    save_results, compare_to_baseline
+)
+from benchmarks.fake_gemini import READY_LINE, client_environment
+
+ENDPOINTS = ["ask-existing", "ask-upload", "ask-context", "chat", "extract-clauses", "compare-clauses"]
+QUERIES = [
+    "What is the punishment for murder under the Indian Penal Code?",
+    "Explain the right to life under Article 21 of the Constitution.",
+    "What are the compliance requirements for a private limited company?",
+    "How is a civil suit instituted in India?",
+    "What does Section 420 cover?",
+    "What remedies are available for breach of contract?",
+    "Who can file a writ petition and where?",
+    "What are the duties of a company director?",
+]
+# Caches that would otherwise turn repeated benchmark requests into lookups
+CACHE_OFF_ENVIRONMENT = {"ANSWER_CACHE_SIZE": "0", "EMBEDDING_CACHE_SIZE": "0", "EXTRACTION_CACHE_MAX_ENTRIES": "0"}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+class LoadTest:
+    """Drives the app's endpoints over HTTP at fixed concurrency levels.
+
+    Each endpoint gets one untimed warm-up request (which, for the upload
+    endpoints, ingests the PDF), then `requests` timed requests per
+    concurrency level. A request counts as an error on a non-200 status or an
+    "error" key in the response.
+    """
+
+    def __init__(self, base_url: str, pdf: str, pdf2: str, server_pid: Optional[int] = None,
+                 timeout: float = 600):
+        self.base_url = base_url
+        with open(pdf, "rb") as f:
+            self.pdf_bytes = f.read()
+        with open(pdf2, "rb") as f:
+            self.pdf2_bytes = f.read()
+        self.pdf_name = os.path.basename(pdf)
+        self.pdf2_name = os.path.basename(pdf2)
+        # /ask-upload names an upload by the MD5 of its bytes, which /ask-context takes back
+        self.file_id = hashlib.md5(self.pdf_bytes).hexdigest()
+        self.server_pid = server_pid
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    def _form(self, endpoint: str, i: int) -> aiohttp.FormData:
+        form = aiohttp.FormData()
+        query = QUERIES[i % len(QUERIES)]
+        if endpoint in ("ask-existing", "chat"):
+            form.add_field("query", query)
+        elif endpoint == "ask-upload":
+            form.add_field("query", query)
+            form.add_field("wait", "true")
+            form.add_field("file", self.pdf_bytes, filename=self.pdf_name, content_type="application/pdf")
+        elif endpoint == "ask-context":
+            form.add_field("query", query)
+            form.add_field("file_id", self.file_id)
+            form.add_field("wait", "true")
+        elif endpoint == "extract-clauses":
+            form.add_field("file", self.pdf_bytes, filename=self.pdf_name, content_type="application/pdf")
+        elif endpoint == "compare-clauses":
+            form.add_field("file1", self.pdf_bytes, filename=self.pdf_name, content_type="application/pdf")
+            form.add_field("file2", self.pdf2_bytes, filename=self.pdf2_name, content_type="application/pdf")
+        else:
+            raise ValueError(f"Unknown endpoint: {endpoint}")
+        return form
+
+    async def call(self, session: aiohttp.ClientSession, endpoint: str, i: int) -> Optional[str]:
+        """Send one request; returns an error description or None."""
+        try:
+            async with session.post(f"{self.base_url}/{endpoint}", data=self._form(endpoint, i)) as response:
+                payload = await response.json(content_type=None)
+                if response.status != 200:
+                    return f"HTTP {response.status}"
+                if isinstance(payload, dict) and payload.get("error"):
+                    return str(payload["error"])
+                return None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return f"{type(e).__name__}: {e}"
+
+    async def warm_up(self, session: aiohttp.ClientSession, endpoint: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        error = await self.call(session, endpoint, 0)
+        return {"seconds": round(time.perf_counter() - started, 3), "error": error}
+
+    async def run_level(self, session: aiohttp.ClientSession, endpoint: str, concurrency: int,
+                        requests: int) -> Dict[str, Any]:
+        latencies: List[float] = []
+        errors: List[str] = []
+        pending = iter(range(requests))
+
+        async def worker():
+            for i in pending:
+                started = time.perf_counter()
+                error = await self.call(session, endpoint, i)
+                latencies.append(time.perf_counter() - started)
+                if error:
+                    errors.append(error)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        row = {
+            "endpoint": endpoint,
+            "concurrency": concurrency,
+            "requests": requests,
+            "errors": len(errors),
+            "seconds": round(elapsed, 3),
+            "rps": round(requests / elapsed, 3) if elapsed else 0.0,
+            **summarize(latencies),
+            **(rss_mb(self.server_pid) if self.server_pid else {}),
+        }
+        if errors:
+            row["first_error"] = errors[0][:200]
+        return row
+
+    async def run(self, endpoints: List[str], levels: List[int], requests: int) -> List[Dict[str, Any]]:
+        rows = []
+        connector = aiohttp.TCPConnector(limit=max(levels))
+        async with aiohttp.ClientSession(connector=connector, timeout=self.timeout) as session:
+            for endpoint in endpoints:
+                warm = await self.warm_up(session, endpoint)
+                print(f"🔥 {endpoint} warm-up: {warm['seconds']}s" + (f" ({warm['error']})" if warm["error"] else ""))
+                for concurrency in levels:
+                    row = await self.run_level(session, endpoint, concurrency, requests)
+                    row["warmup_s"] = warm["seconds"]
+                    print(f"   c={concurrency}: {row['rps']} req/s, p95 {row['p95_ms']} ms, {row['errors']} errors")
+                    rows.append(row)
+        return rows
+
+
+# -------------------------------
+# Processes: fake Gemini and the app under uvicorn
+# -------------------------------
+def start_fake_gemini(work_dir: str, args: argparse.Namespace):
+    command = [
+        sys.executable, "-m", "benchmarks.fake_gemini", "--cert-dir", work_dir,
+        "--chat-latency", str(args.chat_latency), "--tokens-per-second", str(args.tokens_per_second),
+        "--answer-tokens", str(args.answer_tokens), "--embed-latency", str(args.embed_latency),
+    ]
+    process = subprocess.Popen(command, cwd=AI_MODEL_DIR, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith(READY_LINE):
+        process.kill()
+        raise RuntimeError("The fake Gemini server did not start.")
+    return process, int(line.split()[1])
+
+
+def start_app(work_dir: str, environment: Dict[str, str], port: int, log_path: str):
+    env = {**os.environ, **environment}
+    log = open(log_path, "w")
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", AI_MODEL_DIR,
+               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_until_serving(base_url: str, process: subprocess.Popen, timeout: float) -> float:
+    """Poll /readyz until every corpus has settled and the unified index serves all that loaded."""
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"The app exited during startup (code {process.returncode}).")
+            try:
+                async with session.get(f"{base_url}/readyz") as response:
+                    status = await response.json(content_type=None)
+                    if response.status == 200 and status.get("warm_up_complete"):
+                        return time.perf_counter() - started
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"The app did not start within {timeout}s.")
+
+
+def stop(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the API against a fake Gemini server.")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Timed requests per endpoint and level")
+    parser.add_argument("--pdf", default=os.path.join(DATA_DIR, "legaldoc.pdf"), help="Upload/extraction document")
+    parser.add_argument("--pdf2", default=os.path.join(DATA_DIR, "Legal Knowledge Base Compilation_.pdf"),
+                        help="Second document for /compare-clauses")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR, help="Vectorstores and caches of the benchmarked app")
+    parser.add_argument("--warm-caches", action="store_true", help="Keep answer/embedding/extraction caches on")
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--startup-timeout", type=float, default=3600)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression as a fraction")
+    args = parser.parse_args(argv)
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    work_dir = prepare_work_dir(args.work_dir)
+
+    fake, fake_port = start_fake_gemini(work_dir, args)
+    environment = client_environment(work_dir, fake_port)
+    if not args.warm_caches:
+        environment.update(CACHE_OFF_ENVIRONMENT)
+    port = _free_port()
+    log_path = os.path.join(work_dir, "server.log")
+    app = start_app(work_dir, environment, port, log_path)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        print(f"⏳ Starting the app in {work_dir} (log: {log_path})")
+        startup = asyncio.run(wait_until_serving(base_url, app, args.startup_timeout))
+        print(f"✅ App ready in {startup:.1f}s, {rss_mb(app.pid).get('rss_mb', '-')} MB RSS")
+        test = LoadTest(base_url, args.pdf, args.pdf2, server_pid=app.pid)
+        rows = asyncio.run(test.run(endpoints, levels, args.requests))
+    finally:
+        stop(app)
+        stop(fake)
+
+    print()
+    print_table(rows, ["endpoint", "concurrency", "requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms",
+                       "rss_mb", "peak_rss_mb"])
+    if args.output:
+        save_results(args.output, rows)
+    if args.baseline:
+        regressions = compare_to_baseline(rows, args.baseline, ["endpoint", "concurrency"],
+                                          ["p95_ms", "p99_ms"], ["rps"], args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import itertools
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from benchmarks.common import (
+    DATA_DIR, DEFAULT_WORK_DIR, prepare_work_dir, import_main, summarize, rss_mb, print_table,
+    save_results, compare_to_baseline
+)
+from benchmarks.fake_gemini import answer_response, extraction_response
+from benchmarks.load_test import QUERIES
+
+
+def measure(name: str, function: Callable[[], Any], repeat: int, min_seconds: float, **extra) -> Dict[str, Any]:
+    """Call `function` at least `repeat` times and for at least `min_seconds`; per-call latency stats."""
+    function()  # warm-up: imports, compiled regexes, cached splitters
+    samples: List[float] = []
+    started = time.perf_counter()
+    while len(samples) < repeat or time.perf_counter() - started < min_seconds:
+        call_started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - call_started)
+    total = sum(samples)
+    return {
+        "benchmark": name,
+        "calls": len(samples),
+        "ops_per_s": round(len(samples) / total, 3) if total else 0.0,
+        **summarize(samples),
+        **extra,
+    }
+
+
+def run(app, pdfs: List[str], repeat: int, min_seconds: float, index_specs: List[str]) -> List[Dict[str, Any]]:
+    from langchain_community.vectorstores import FAISS
+    from utils.pdf_loader import iter_pdf_pages
+    from utils.chunking import ChunkingEngine
+    from utils.hybrid_search import BM25Index
+    from utils.embedding_backends import HashingEmbeddings
+    from utils.index_factory import parse_index_spec, build_index
+
+    rows = []
+    started = time.perf_counter()
+    pages = {os.path.basename(path): list(iter_pdf_pages(path)) for path in pdfs}
+    page_count = sum(len(document) for document in pages.values())
+    print(f"📄 Parsed {page_count} pages from {len(pages)} PDFs in {time.perf_counter() - started:.1f}s")
+
+    # Chunking: the successor of smart_chunk_splitter, in both of its modes
+    chunks = []
+    for mode in ("smart", "legal"):
+        engine = ChunkingEngine(mode)
+        rows.append(measure(f"chunking[{mode}]",
+                            lambda: [list(engine.split_documents(document)) for document in pages.values()],
+                            max(1, repeat // 10), min_seconds, pages=page_count))
+        if mode == "smart":
+            chunks = [chunk for document in pages.values() for chunk in engine.split_documents(document)]
+    print(f"✂️ {len(chunks)} chunks")
+
+    # Response cleaning and clause parsing on model-shaped output
+    answer = answer_response("benchmark answer", 400)
+    rows.append(measure("clean_ai_response", lambda: app.clean_ai_response(answer), repeat, min_seconds,
+                        chars=len(answer)))
+    extractor = app.get_clause_extractor()
+    extraction = extraction_response("benchmark extraction", clauses=20)
+    rows.append(measure("ClauseExtractor._parse_ai_response", lambda: extractor._parse_ai_response(extraction),
+                        repeat, min_seconds, chars=len(extraction)))
+
+    # Vector and sparse search over the shipped corpora, with deterministic local embeddings
+    embeddings = HashingEmbeddings(768)
+    store = FAISS.from_documents(chunks, embeddings)
+    vectors = store.index.reconstruct_n(0, store.index.ntotal)
+    queries = np.asarray([embeddings.embed_query(query) for query in QUERIES], dtype=np.float32)
+    for spec_text in index_specs:
+        spec = parse_index_spec(spec_text)
+        index, info = build_index(vectors, spec["type"], spec["params"])
+        for k in (4, 20):
+            cycle = itertools.cycle(queries)
+            rows.append(measure(f"faiss[{spec_text}] k={k}", lambda: index.search(next(cycle)[None, :], k),
+                                repeat, min_seconds, vectors=index.ntotal, built_as=info["type"]))
+    cycle = itertools.cycle(queries.tolist())
+    rows.append(measure("FAISS.similarity_search k=4",
+                        lambda: store.similarity_search_with_score_by_vector(next(cycle), k=4),
+                        repeat, min_seconds, vectors=store.index.ntotal))
+    bm25 = BM25Index.from_vectorstore(store)
+    texts = itertools.cycle(QUERIES)
+    rows.append(measure("BM25Index.search k=50", lambda: bm25.search(next(texts), 50),
+                        repeat, min_seconds, vectors=store.index.ntotal))
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of chunking, response parsing and search.")
+    parser.add_argument("--pdfs", nargs="*", help="PDFs to chunk and index (default: every PDF in data/)")
+    parser.add_argument("--repeat", type=int, default=200, help="Minimum calls per benchmark")
+    parser.add_argument("--min-seconds", type=float, default=1.0, help="Minimum time per benchmark")
+    parser.add_argument("--index-types", nargs="+", default=["flat", "hnsw", "sq8"],
+                        help="Index specs to search, space-separated (see utils.index_factory)")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression as a fraction")
+    args = parser.parse_args(argv)
+
+    pdfs = [os.path.abspath(path) for path in args.pdfs] if args.pdfs else sorted(glob.glob(os.path.join(DATA_DIR, "*.pdf")))
+    app = import_main(prepare_work_dir(args.work_dir))
+    rows = run(app, pdfs, args.repeat, args.min_seconds, args.index_types)
+
+    print()
+    print_table(rows, ["benchmark", "calls", "ops_per_s", "p50_ms", "p95_ms", "p99_ms"])
+    print(f"\nPeak RSS: {rss_mb().get('peak_rss_mb', '-')} MB")
+    if args.output:
+        save_results(args.output, rows)
+    if args.baseline:
+        regressions = compare_to_baseline(rows, args.baseline, ["benchmark"], ["p50_ms", "p95_ms"],
+                                          tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,51 @@
 import os
-import tempfile
+import asyncio
+import json
 import hashlib
 import re
-from typing import Dict
-from fastapi import FastAPI, UploadFile, Form
+import time
+from functools import partial
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from dotenv import load_dotenv
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter, CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain.chains import RetrievalQA
-from langchain.vectorstores.base import VectorStore
+# LangChain's vectorstores, chains and the Gemini SDK take seconds to import; they are loaded
+# on first use (the corpus warm-up, the first request) so a worker binds its port right away
 # from langchain_community.vectorstores.utils import distance
 # from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
+from langchain_core.documents import Document
 from utils.clause_extractor import ClauseExtractor
+from utils.embedding_cache import EmbeddingCache, CachedEmbeddings
+from utils.embedding_backends import (
+    create_backend, read_embedding_info, write_embedding_info, check_embedding_info, EmbeddingMismatchError
+)
+from utils.answer_cache import AnswerCache
+from utils.concurrency import StagePool
+from utils.model_registry import ModelRegistry
+from utils.extraction_cache import ExtractionCache
+from utils.vectorstore_cache import VectorStoreCache
+from utils.corpus_builder import CorpusBuilder, write_json_atomic
+from utils.embedding_pipeline import EmbeddingPipeline
+from utils.pdf_loader import iter_pdf_pages
+from utils.chunking import ChunkingEngine
+from utils.ingestion import IngestionQueue, IngestionJob, PARSING, EMBEDDING, READY, FAILED
+from utils.mmap_store import save_compact, load_compact, load_or_convert, read_compact_info
+from utils.hybrid_search import BM25Index, HybridRetriever, ensure_bm25
+from utils.reranker import CorpusCalibration, Reranker
+from utils.prompt_budget import PromptAssembler, count_tokens
+from utils.index_factory import (
+    parse_index_spec, apply_index_spec, lossy_source, all_vectors, configure_search, describe_index,
+    read_index_info, write_index_info
+)
+from utils.streaming import stream_cleaned_answer, stream_cached_answer
+from utils.telemetry import Telemetry, TelemetryMiddleware
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.vectorstores import VectorStore
+    from langchain_google_genai import ChatGoogleGenerativeAI
 
 # Load environment variables
 load_dotenv()
@@ -33,15 +62,155 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request stage spans and the /metrics histograms and counters; TRACE_EXPORT_URL sends a
+# TRACE_SAMPLE_RATE share of request traces to an OTLP/HTTP collector, TRACE_LOG=1 prints them
+telemetry = Telemetry.from_env()
+app.add_middleware(TelemetryMiddleware, telemetry=telemetry)
+
 # Path to save vectorstores
 VECTORSTORE_DIR = "vectorstores"
 os.makedirs(VECTORSTORE_DIR, exist_ok=True)
 
+# Memory-map persisted indexes and docstores read-only so uvicorn workers share one copy
+# through the OS page cache; set VECTORSTORE_MMAP=0 to load pickled stores into the heap
+VECTORSTORE_MMAP = os.environ.get("VECTORSTORE_MMAP", "1") == "1"
+UNIFIED_STORE_DIR = os.path.join(VECTORSTORE_DIR, "_unified")
+# Written last by persist_vectorstore: a store directory without it is half-written (e.g. by a crash)
+STORE_COMPLETE_FILE = "complete.json"
+
+# FAISS index type of the predefined corpora and of the unified index: flat, hnsw, sq8, ivf-sq8 or
+# ivf-pq, optionally with parameters ("ivf-pq:nlist=1024,nprobe=32"). Compressed types are trained
+# from each corpus; see `python -m utils.index_factory <store>` for recall vs latency against flat.
+CORPUS_INDEX_SPEC = parse_index_spec(os.environ.get("VECTOR_INDEX", "flat"))
+UNIFIED_INDEX_SPEC = parse_index_spec(os.environ.get("VECTOR_INDEX_UNIFIED") or os.environ.get("VECTOR_INDEX", "flat"))
+
 # -------------------------------
 # Caches
 # -------------------------------
-vectorstore_cache: Dict[str, VectorStore] = {}
-legal_docs_store: Dict[str, VectorStore] = {}  # For /ask-existing
+# Uploaded-document vectorstores for /ask-upload and /ask-context, bounded by estimated bytes
+vectorstore_cache = VectorStoreCache(
+    max_bytes=int(os.environ.get("VECTORSTORE_CACHE_MAX_MB", "512")) * 1024 * 1024,
+    policy=os.environ.get("VECTORSTORE_CACHE_POLICY", "lru")
+)
+legal_docs_store: Dict[str, "VectorStore"] = {}  # For /ask-existing
+unified_legal_store: Optional["FAISS"] = None  # All predefined corpora in one index
+unified_retriever: Optional[HybridRetriever] = None  # BM25 + dense search over the unified index
+unified_index_corpora: List[str] = []  # Corpora the unified index was last built from
+
+# Query embeddings shared by every retrieval endpoint
+query_embedding_cache = EmbeddingCache(
+    max_entries=int(os.environ.get("EMBEDDING_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.environ.get("EMBEDDING_CACHE_TTL", str(24 * 3600))),
+    persist_path=os.environ.get("EMBEDDING_CACHE_PATH") or None
+)
+
+# LLM answers keyed by (query, retrieved chunks, model, temperature)
+CHAT_MODEL = "models/gemini-2.5-pro"
+CHAT_TEMPERATURE = 0.3
+answer_cache = AnswerCache(
+    max_entries=int(os.environ.get("ANSWER_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.environ.get("ANSWER_CACHE_TTL", str(6 * 3600))),
+    similarity_threshold=float(os.environ["ANSWER_CACHE_SIMILARITY"]) if os.environ.get("ANSWER_CACHE_SIMILARITY") else None
+)
+
+# Shared Gemini clients, created once and reused by every request
+model_registry = ModelRegistry(
+    api_key=GEMINI_API_KEY,
+    pool_size=int(os.environ.get("GEMINI_POOL_SIZE", "1")),
+    keepalive_seconds=float(os.environ.get("GEMINI_KEEPALIVE", "300")),
+    transport=os.environ.get("GEMINI_TRANSPORT") or None,
+    # e.g. a regional endpoint, or benchmarks/fake_gemini.py for offline load tests
+    endpoint=os.environ.get("GEMINI_ENDPOINT") or None
+)
+
+# Embedding backend: "gemini[:model]" (default), "local:<model dir>" for an ONNX sentence encoder on
+# the CPU, or "hashing[:dimension]" for deterministic test vectors. Every store records the backend
+# it was embedded with and is rebuilt (predefined corpora, uploads) rather than searched with another.
+embedding_backend = create_backend(
+    os.environ.get("EMBEDDING_BACKEND", "gemini"),
+    registry=model_registry,
+    batch_size=int(os.environ.get("LOCAL_EMBED_BATCH_SIZE", "32")),
+    threads=int(os.environ["LOCAL_EMBED_THREADS"]) if os.environ.get("LOCAL_EMBED_THREADS") else None
+)
+# Keys corpus manifests and the query embedding cache
+EMBEDDING_MODEL = embedding_backend.model_id
+
+# Chunking: pages are joined so chunks can span page breaks; statutes are cut at their headings
+chunking_engine = ChunkingEngine(os.environ.get("CHUNKING_MODE", "smart"))
+legal_chunking_engine = ChunkingEngine("legal")
+LEGAL_STRUCTURE_CORPORA = {"IPC", "Constitution of India"}
+
+# Predefined corpora for /ask-existing and their source PDFs. The Format handbook's PDF is not
+# shipped in data/: that corpus is served from its committed vectorstore, and reported as
+# missing by /readyz (without holding up the others) where there is none.
+PREDEFINED_CORPORA = {
+    "Guide to Litigation in India": "data/Guide-to-Litigation-in-India.pdf",
+    "Legal Compliance & Corporate Laws": "data/Legal-Compliance-Corporate-Laws.pdf",
+    "legaldoc": "data/legaldoc.pdf",
+    "Constitution of India": "data/constitution_of_india.pdf",
+    "IPC": "data/penal_code.pdf",
+    "Format": "data/format.pdf"
+}
+# Warm-up states of a predefined corpus, as reported by /readyz
+CORPUS_PENDING = "pending"
+CORPUS_LOADING = "loading"
+CORPUS_BUILDING = "building"
+CORPUS_READY = "ready"
+CORPUS_MISSING = "missing"
+CORPUS_FAILED = "failed"
+CORPUS_SETTLED = {CORPUS_READY, CORPUS_MISSING, CORPUS_FAILED}
+# Processes splitting chunking units of uploads; 1 keeps splitting in the ingesting thread
+CHUNK_WORKERS = int(os.environ.get("CHUNK_WORKERS", "1"))
+
+# Index builds embed chunks in provider-sized batches, several at once, under a shared rate limit
+embedding_pipeline = EmbeddingPipeline(
+    embedding_backend.embeddings,
+    batch_size=int(os.environ.get("EMBED_BATCH_SIZE", "100")),
+    concurrency=int(os.environ.get("EMBED_CONCURRENCY", "4")),
+    # A local backend has no quota to stay under
+    requests_per_minute=float(os.environ.get("EMBED_RATE_LIMIT_RPM", "600")) if embedding_backend.remote else 0,
+    max_retries=int(os.environ.get("EMBED_MAX_RETRIES", "5"))
+)
+
+# Uploaded PDFs are parsed and embedded in the background; /ask-upload returns a file_id at once
+ingestion_queue = IngestionQueue(
+    workers=int(os.environ.get("INGEST_WORKERS", "2")),
+    max_finished=int(os.environ.get("INGEST_MAX_FINISHED_JOBS", "256"))
+)
+# Longest a request with wait=true blocks on an in-progress ingestion before reporting its status
+INGEST_WAIT_TIMEOUT = float(os.environ.get("INGEST_WAIT_TIMEOUT", "300"))
+
+CLAUSE_TEMPERATURE = 0.2
+# Concurrent Gemini calls per document when a long contract is extracted in chunks
+CLAUSE_EXTRACTION_WORKERS = int(os.environ.get("CLAUSE_EXTRACTION_WORKERS", "4"))
+
+# Clause-extraction results persisted by document content, prompt version and model
+extraction_cache = ExtractionCache(
+    os.environ.get("EXTRACTION_CACHE_DIR", "extraction_cache"),
+    max_bytes=int(os.environ.get("EXTRACTION_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    max_entries=int(os.environ.get("EXTRACTION_CACHE_MAX_ENTRIES", "10000"))
+)
+
+# Bounded executor and per-stage concurrency limits (STAGE_LIMIT_<STAGE>, EXECUTOR_WORKERS)
+stage_pool = StagePool.from_env()
+
+# Prompt token budgets per endpoint (PROMPT_BUDGET_<ENDPOINT>); context is trimmed to fit
+prompt_assembler = PromptAssembler.from_env()
+
+# Number of fused candidates pulled from the unified index per /ask-existing query
+ASK_EXISTING_TOP_K = int(os.environ.get("ASK_EXISTING_TOP_K", "20"))
+# Candidates are re-ranked (calibrated per corpus, MMR-deduplicated) and at most this many
+# chunks within the endpoint's prompt budget reach the LLM, from whichever corpora they come
+context_reranker = Reranker(
+    mmr_lambda=float(os.environ.get("RERANK_MMR_LAMBDA", "0.7")),
+    sparse_weight=float(os.environ.get("RERANK_SPARSE_WEIGHT", "0.3")),
+    max_chunks=int(os.environ.get("ASK_EXISTING_MAX_CHUNKS", "8")),
+    token_budget=prompt_assembler.budget("ask_existing")
+)
+# Chunks passed to the QA chain for uploaded documents
+UPLOAD_TOP_K = int(os.environ.get("UPLOAD_TOP_K", "4"))
+# Rows taken from each of the sparse (BM25) and dense rankings before reciprocal-rank fusion
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "50"))
 
 
 # -------------------------------
@@ -50,6 +219,23 @@ legal_docs_store: Dict[str, VectorStore] = {}  # For /ask-existing
 def file_hash(file_bytes):
     return hashlib.md5(file_bytes).hexdigest()
 
+# -------------------------------
+# Utility: Embeddings with cached query vectors
+# -------------------------------
+def make_embeddings() -> CachedEmbeddings:
+    return CachedEmbeddings(embedding_backend.embeddings(), query_embedding_cache, EMBEDDING_MODEL)
+
+
+def get_llm() -> "ChatGoogleGenerativeAI":
+    return model_registry.chat(CHAT_MODEL, CHAT_TEMPERATURE)
+
+
+def get_clause_extractor() -> ClauseExtractor:
+    return ClauseExtractor(llm=model_registry.chat(CHAT_MODEL, CLAUSE_TEMPERATURE),
+                           max_workers=CLAUSE_EXTRACTION_WORKERS, cache=extraction_cache,
+                           prompts=prompt_assembler, telemetry=telemetry,
+                           llm_slot=partial(stage_pool.limit, "llm"))
+
 # -------------------------------
 # Utility: Clean AI response
 # -------------------------------
@@ -67,123 +253,499 @@ def clean_ai_response(response: str) -> str:
 # -------------------------------
 # Utility: Create FAISS vectorstore safely
 # -------------------------------
-def create_faiss_vectorstore_safe(chunks, embeddings, name: str = None):
+def persist_vectorstore(vs: "FAISS", name: str, embeddings, index_info: Optional[dict] = None) -> "FAISS":
+    save_path = os.path.join(VECTORSTORE_DIR, name)
+    complete_path = os.path.join(save_path, STORE_COMPLETE_FILE)
+    if os.path.exists(complete_path):
+        os.remove(complete_path)
+    vs.save_local(save_path)
+    write_index_info(save_path, index_info or describe_index(vs.index))
+    write_embedding_info(save_path, embedding_backend.info())
+    # The sparse index is built from the same rows, so BM25 row i is FAISS id i
+    BM25Index.from_vectorstore(vs).save(save_path)
+    if VECTORSTORE_MMAP:
+        save_compact(vs, save_path)
+        vs = load_compact(save_path, embeddings)
+    write_json_atomic(complete_path, {"chunks": vs.index.ntotal})
+    # Answers built from the previous version of this store are stale now
+    answer_cache.invalidate(source=name)
+    return vs
+
+
+def is_persisted(name: str) -> bool:
+    """Whether persist_vectorstore finished writing the store `name`."""
+    return os.path.exists(os.path.join(VECTORSTORE_DIR, name, STORE_COMPLETE_FILE))
+
+
+def create_faiss_vectorstore(chunks, embeddings, name: str = None, on_progress=None) -> Optional["FAISS"]:
+    """Embed `chunks` (a list or a lazy iterator) and optionally persist the store; None if there was no text."""
+    vs = embedding_pipeline.build_vectorstore(chunks, embeddings, on_progress=on_progress)
+    if vs is None:
+        print("⚠️ No chunks to embed")
+        return None
+    print(f"✅ Embedded {vs.index.ntotal} chunks ({embedding_pipeline.last_run.get('chunks_per_second', 0)} chunks/s)")
+    if name:
+        vs = persist_vectorstore(vs, name, embeddings)
+    return vs
+
+
+def create_faiss_vectorstore_safe(chunks, embeddings, name: str = None, on_progress=None):
     try:
-        vs = FAISS.from_documents(chunks, embeddings)
-        if name:
-            save_path = os.path.join(VECTORSTORE_DIR, name)
-            vs.save_local(save_path)
-        return vs
+        return create_faiss_vectorstore(chunks, embeddings, name, on_progress)
     except Exception as e:
         print(f"⚠️ Failed to embed documents: {e}")
+        telemetry.error("create_faiss_vectorstore", e)
         return None
 
 
-# smart chunk splitting
-def smart_chunk_splitter(docs):
-    final_chunks = []
-
-    for doc in docs:
-        length = len(doc.page_content)
-
-        # Dynamically decide chunk size and overlap
-        if length < 1000:
-            chunk_size = 400
-            chunk_overlap = 50
-        elif length < 3000:
-            chunk_size = 700
-            chunk_overlap = 100
-        else:
-            chunk_size = 1000
-            chunk_overlap = 120
-
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", ".", " ", ""]
-        )
+def build_corpus_vectorstore(builder: CorpusBuilder, name: str, embeddings) -> Optional["FAISS"]:
+    """Run an incremental corpus build; page checkpoints survive a failure and are resumed next time."""
+    try:
+        vs = builder.build()
+        if vs is None:
+            print(f"⚠️ No text extracted for: {name}")
+            return None
+        vs = persist_vectorstore(vs, name, embeddings, builder.index_info)
+        builder.commit()
+        print(f"✅ Built {name}: {builder.stats['units_embedded']} of {builder.stats['units']} units embedded "
+              f"from {builder.stats['pages']} pages, "
+              f"{builder.stats['chunks']} chunks ({embedding_pipeline.last_run.get('chunks_per_second', 0)} chunks/s)")
+        return vs
+    except Exception as e:
+        print(f"⚠️ Failed to build vectorstore for {name}: {e}")
+        telemetry.error("build_corpus_vectorstore", e)
+        return None
+
 
-        # Always split each document individually
-        chunks = splitter.split_documents([doc])
-        final_chunks.extend(chunks)
+# -------------------------------
+# Utility: Merge a corpus into the unified index
+# -------------------------------
+def add_to_unified_index(unified: Optional["FAISS"], name: str, vectorstore: "FAISS", embeddings) -> Optional["FAISS"]:
+    """Copy a corpus' vectors into the cross-corpus index `unified` (created if None), tagging every
+    chunk with its source; returns the index."""
+    from langchain_community.vectorstores import FAISS
 
-    return final_chunks
+    ntotal = vectorstore.index.ntotal
+    if ntotal == 0:
+        return unified
 
+    # Reuse the stored vectors so merging never re-embeds anything
+    vectors = all_vectors(vectorstore.index)
+    texts, metadatas = [], []
+    for i in range(ntotal):
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+        metadata = dict(doc.metadata)
+        metadata["source"] = name
+        texts.append(doc.page_content)
+        metadatas.append(metadata)
+
+    text_embeddings = list(zip(texts, vectors.tolist()))
+    if unified is None:
+        return FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+    unified.add_embeddings(text_embeddings, metadatas=metadatas)
+    return unified
 
 
 # -------------------------------
-# Startup: Preload legal docs
+# Utility: Streaming (SSE) responses
 # -------------------------------
-@app.on_event("startup")
-async def preload_legal_documents():
-    print("🔍 Preloading legal documents...")
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=GEMINI_API_KEY
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
-    predefined_pdfs = {
-        "Guide to Litigation in India": "data/Guide-to-Litigation-in-India.pdf",
-        "Legal Compliance & Corporate Laws": "data/Legal-Compliance-Corporate-Laws.pdf",
-        "legaldoc": "data/legaldoc.pdf",
-        "Constitution of India": "data/constitution_of_india.pdf",
-        "IPC": "data/penal_code.pdf",
-        "Format": "data/format.pdf"
-    }
 
-    for name, path in predefined_pdfs.items():
-        save_path = os.path.join(VECTORSTORE_DIR, name)
+async def stream_llm(runnable, inputs, purpose: str, prompt_tokens: int):
+    """Stream a model or chain while holding an llm slot for the whole generation."""
+    # Timed by hand: a span opened in a generator would leak into whatever resumes it
+    started = time.perf_counter()
+    completion = []
+    try:
+        async with stage_pool.limit("llm"):
+            async for chunk in runnable.astream(inputs):
+                completion.append(chunk.content if hasattr(chunk, "content") else str(chunk))
+                yield chunk
+    except Exception as e:
+        telemetry.error("llm_stream", e)
+        raise
+    finally:
+        telemetry.observe("llm_stream", time.perf_counter() - started)
+    telemetry.tokens(purpose, prompt_tokens, count_tokens("".join(completion)))
+
+
+# -------------------------------
+# Utility: RetrievalQA answer with caching
+# -------------------------------
+def build_qa_chain(llm):
+    """The same "stuff" question-answering chain RetrievalQA builds, as a streamable runnable."""
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+
+    return create_stuff_documents_chain(llm, PROMPT_SELECTOR.get_prompt(llm))
 
-        if os.path.exists(save_path):
-            print(f"✅ Loading cached vectorstore for: {name}")
-            vectorstore = FAISS.load_local(save_path, embeddings, allow_dangerous_deserialization=True)
-        else:
-            loader = PyPDFLoader(path)
-            docs = loader.load()
-            chunks = smart_chunk_splitter(docs)
 
-            for chunk in chunks:
-                chunk.metadata["source"] = name
+async def answer_with_retrieval_qa(vectorstore: "VectorStore", query: str, file_id: str, stream: bool = False):
+    """Answer from an uploaded document's vectorstore, reusing cached answers.
+
+    Returns the endpoint response: a JSON dict, or an SSE stream when `stream` is set.
+    """
+    from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+
+    bm25 = await stage_pool.run("faiss", ensure_bm25, vectorstore, os.path.join(VECTORSTORE_DIR, file_id))
+    retriever = HybridRetriever(vectorstore, bm25)
+    ranked, query_embedding = await hybrid_retrieve(retriever, query, UPLOAD_TOP_K)
+
+    # Fit the retrieved chunks, best first, into the budget left after the "stuff" prompt itself
+    llm = get_llm()
+    qa_prompt = PROMPT_SELECTOR.get_prompt(llm)
+    with telemetry.span("prompt_assembly"):
+        context = prompt_assembler.fit(
+            "ask_context",
+            [(doc.page_content, doc) for doc, _ in retriever.documents(ranked)],
+            reserved_tokens=count_tokens(qa_prompt.format(context="", question=query))
+        )
+        docs = [Document(page_content=text, metadata=doc.metadata) for text, doc in context.chunks]
 
-            vectorstore = create_faiss_vectorstore_safe(chunks, embeddings, name)
+    chunk_ids = [AnswerCache.chunk_id(doc.page_content) for doc in docs]
+    cached_answer = answer_cache.get(query, chunk_ids, CHAT_MODEL, CHAT_TEMPERATURE,
+                                     source=file_id, query_embedding=query_embedding)
+    if cached_answer is not None:
+        if stream:
+            return sse_response(stream_cached_answer(cached_answer, {"file_id": file_id}))
+        return {"answer": cached_answer, "file_id": file_id}
 
-        if vectorstore:
-            legal_docs_store[name] = vectorstore
+    def remember(answer: str):
+        answer_cache.put(query, chunk_ids, CHAT_MODEL, CHAT_TEMPERATURE, answer,
+                         source=file_id, query_embedding=query_embedding)
+
+    qa_chain = build_qa_chain(llm)
+    inputs = {"context": docs, "question": query}
+    prompt_tokens = prompt_assembler.record("ask_context", qa_prompt.format(context="\n\n".join(context.texts), question=query), context)
+    if stream:
+        return sse_response(stream_cleaned_answer(stream_llm(qa_chain, inputs, "ask_context", prompt_tokens),
+                                                  {"file_id": file_id}, remember))
+
+    async with stage_pool.limit("llm"):
+        with telemetry.span("llm_generate"):
+            result = await qa_chain.ainvoke(inputs)
+            telemetry.llm_usage("ask_context", result, prompt_tokens)
+    with telemetry.span("clean_response"):
+        cleaned_result = clean_ai_response(result)
+    remember(cleaned_result)
+    return {"answer": cleaned_result, "file_id": file_id}
 
-    print("✅ Legal documents preloaded.")
 
 # -------------------------------
-# /ask-existing: Ask from preloaded legal docs
+# Utility: Hybrid (BM25 + dense) retrieval
 # -------------------------------
-@app.post("/ask-existing")
-async def ask_from_existing(query: str = Form(...)):
-    if not legal_docs_store:
-        return {"error": "Legal documents not loaded yet."}
+async def hybrid_retrieve(retriever: HybridRetriever, query: str, k: int, sources: Optional[List[str]] = None):
+    """Top-k (FAISS row, fused score) pairs from BM25 and k-NN rankings fused with RRF.
 
-    all_matches = []
-    for name, vectorstore in legal_docs_store.items():
-        results = vectorstore.similarity_search_with_score(query, k=5)
-        for doc, score in results:
-            if doc and score is not None:
-                all_matches.append({
-                    "source": doc.metadata.get("source", name),
-                    "content": doc.page_content,
-                    "score": score
-                })
-
-    if not all_matches:
-        return {"error": "No relevant information found."}
+    Identifier-only queries ("Section 420") that the sparse index can answer skip
+    the embedding call and the dense search; the query embedding is then None.
+    """
+    with telemetry.span("sparse_search"):
+        sparse = await stage_pool.run("faiss", retriever.sparse_search, query, HYBRID_CANDIDATES, sources)
+    if sparse and retriever.can_skip_dense(query):
+        return retriever.fuse([sparse], k), None
 
-    from collections import defaultdict
-    source_scores = defaultdict(list)
-    for match in all_matches:
-        source_scores[match["source"]].append(match["score"])
+    async with stage_pool.limit("embed"):
+        with telemetry.span("embed_query"):
+            query_embedding = await retriever.vectorstore.embedding_function.aembed_query(query)
+    with telemetry.span("dense_search"):
+        dense = await stage_pool.run("faiss", retriever.dense_search, query_embedding, HYBRID_CANDIDATES, sources)
+    return retriever.fuse([dense, sparse], k), query_embedding
 
-    best_source = min(source_scores, key=lambda s: sum(source_scores[s]) / len(source_scores[s]))
-    best_chunks = [m["content"] for m in all_matches if m["source"] == best_source]
-    combined_text = "\n\n".join(best_chunks)
 
-    prompt = f"""
+def iter_pdf_chunks(source, source_name: str = None):
+    """Lazily parse a PDF (path or bytes) and yield its chunks as they are cut, so consumers such
+    as the embedding pipeline start before the whole document has been parsed."""
+    pages = iter_pdf_pages(source, source_name=source_name)
+    yield from chunking_engine.split_documents(pages, workers=CHUNK_WORKERS)
+
+
+async def load_vectorstore(save_path: str, embeddings) -> "FAISS":
+    with telemetry.span("vectorstore_load", store=os.path.basename(save_path)):
+        return await _load_vectorstore(save_path, embeddings)
+
+
+async def _load_vectorstore(save_path: str, embeddings) -> "FAISS":
+    from langchain_community.vectorstores import FAISS
+
+    # Vectors from another model would be searched without error but return nonsense
+    check_embedding_info(save_path, embedding_backend)
+    if VECTORSTORE_MMAP:
+        # Pickled stores are converted to the compact layout on first load
+        vs = await stage_pool.run("faiss", load_or_convert, save_path, embeddings)
+    else:
+        vs = await stage_pool.run("faiss", FAISS.load_local, save_path, embeddings,
+                                  allow_dangerous_deserialization=True)
+    # Query-time parameters (nprobe, efSearch) as recorded when the index was built
+    configure_search(vs.index, (read_index_info(save_path) or {}).get("params", {}))
+    # Stores persisted before the sparse index existed get theirs now
+    await stage_pool.run("faiss", ensure_bm25, vs, save_path)
+    return vs
+
+
+def reindex_corpus_vectorstore(builder: CorpusBuilder, name: str, embeddings) -> Optional["FAISS"]:
+    """Rebuild a store's index as the configured type from its stored vectors (no embedding calls)."""
+    from langchain_community.vectorstores import FAISS
+
+    try:
+        # The pickled copy has an in-memory docstore that can be saved again
+        vectorstore = FAISS.load_local(builder.corpus_dir, embeddings, allow_dangerous_deserialization=True)
+        source = lossy_source(read_index_info(builder.corpus_dir))
+        info = apply_index_spec(vectorstore, builder.index_spec)
+        if source:
+            # Only reached without the source PDF (see plan_corpus); the new index inherits the approximation
+            print(f"⚠️ Re-indexing {name} from vectors reconstructed from its {source} index; "
+                  f"search stays as approximate as {source} until the store is rebuilt from its PDF")
+            info["lossy_source"] = source
+        vectorstore = persist_vectorstore(vectorstore, name, embeddings, info)
+        builder.commit_index()
+        print(f"✅ Re-indexed {name} as {info['type']} ({info['bytes_per_vector']} bytes/vector)")
+        return vectorstore
+    except Exception as e:
+        print(f"⚠️ Failed to re-index {name}: {e}")
+        telemetry.error("reindex_corpus_vectorstore", e)
+        return None
+
+
+def corpus_fingerprint(stores: Dict[str, "FAISS"]) -> str:
+    """Identifies the set and versions of the corpora that make up the unified index."""
+    digest = hashlib.sha256()
+    for name in sorted(stores):
+        index_path = os.path.join(VECTORSTORE_DIR, name, "index.faiss")
+        mtime = os.path.getmtime(index_path) if os.path.exists(index_path) else 0
+        digest.update(f"{name}\x00{stores[name].index.ntotal}\x00{mtime}\x00".encode("utf-8"))
+    digest.update(json.dumps(UNIFIED_INDEX_SPEC, sort_keys=True).encode("utf-8"))
+    digest.update(EMBEDDING_MODEL.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def calibrate_unified_index(vectorstore: "FAISS", bm25: BM25Index) -> CorpusCalibration:
+    """Per-corpus score statistics for the re-ranker, persisted next to the unified index."""
+    calibration = CorpusCalibration.from_vectorstore(vectorstore, bm25.sources, bm25.source_ids)
+    calibration.save(UNIFIED_STORE_DIR)
+    return calibration
+
+
+def build_unified_index(stores: Dict[str, "FAISS"], embeddings) -> Optional[Tuple["FAISS", HybridRetriever, CorpusCalibration]]:
+    """Merge every corpus into a unified index, reusing a persisted copy when it is up to date.
+
+    Returns the index with its retriever and re-ranker calibration (None if there are no
+    chunks); refresh_unified_index swaps all three in at once.
+    """
+    fingerprint = corpus_fingerprint(stores)
+    if VECTORSTORE_MMAP:
+        info = read_compact_info(UNIFIED_STORE_DIR)
+        if info and info.get("fingerprint") == fingerprint:
+            unified = load_compact(UNIFIED_STORE_DIR, embeddings)
+            configure_search(unified.index, (read_index_info(UNIFIED_STORE_DIR) or {}).get("params", {}))
+            retriever = HybridRetriever(unified, ensure_bm25(unified, UNIFIED_STORE_DIR))
+            calibration = CorpusCalibration.load(UNIFIED_STORE_DIR) or calibrate_unified_index(unified, retriever.bm25)
+            return unified, retriever, calibration
+
+    unified = None
+    for name, vectorstore in stores.items():
+        unified = add_to_unified_index(unified, name, vectorstore, embeddings)
+    if unified is None:
+        return None
+
+    bm25 = BM25Index.from_vectorstore(unified)
+    bm25.save(UNIFIED_STORE_DIR)
+    # Calibrate on the exact vectors, then compress the index if configured
+    calibration = calibrate_unified_index(unified, bm25)
+    index_info = apply_index_spec(unified, UNIFIED_INDEX_SPEC)
+    write_index_info(UNIFIED_STORE_DIR, index_info)
+    write_embedding_info(UNIFIED_STORE_DIR, embedding_backend.info())
+    print(f"✅ Unified index: {index_info['ntotal']} chunks from {len(stores)} corpora as {index_info['type']} "
+          f"({index_info['bytes_per_vector']} bytes/vector)")
+    if VECTORSTORE_MMAP:
+        # Persist it and swap the heap copy for a shared, memory-mapped one
+        save_compact(unified, UNIFIED_STORE_DIR, info={"fingerprint": fingerprint})
+        unified = load_compact(UNIFIED_STORE_DIR, embeddings)
+    return unified, HybridRetriever(unified, bm25), calibration
+
+
+async def refresh_unified_index(embeddings) -> None:
+    """Rebuild the unified index from the corpora ready so far and start serving it."""
+    global unified_legal_store, unified_retriever, unified_index_corpora
+    stores = dict(legal_docs_store)
+    if sorted(stores) == unified_index_corpora:
+        return
+    try:
+        built = await stage_pool.run("faiss", build_unified_index, stores, embeddings)
+    except Exception as e:
+        # Keep serving the previous index; the next corpus to become ready retries
+        print(f"⚠️ Failed to build the unified index: {e}")
+        telemetry.error("build_unified_index", e)
+        built = None
+    if built is not None:
+        # Swapped together on the event loop, so a request never pairs one index with another's retriever
+        unified_legal_store, unified_retriever, context_reranker.calibration = built
+    unified_index_corpora = sorted(stores)
+
+
+async def load_uploaded_vectorstore(file_id: str) -> Optional["FAISS"]:
+    """Lazy reload of an uploaded document's persisted vectorstore (None if it was never fully built)."""
+    save_path = os.path.join(VECTORSTORE_DIR, file_id)
+    if not is_persisted(file_id):
+        return None
+    try:
+        return await load_vectorstore(save_path, make_embeddings())
+    except EmbeddingMismatchError as e:
+        # /ask-upload re-ingests it with the current backend
+        print(f"⚠️ Not loading {file_id}: {e}")
+        return None
+    except Exception as e:
+        # Damaged on disk; treated as never ingested so /ask-upload builds it again
+        print(f"⚠️ Failed to load {file_id}: {e}")
+        telemetry.error("vectorstore_load", e)
+        return None
+
+# -------------------------------
+# Startup: Preload legal docs
+# -------------------------------
+# Name -> {"status": ..., plus chunks/seconds/error}; filled in by the background warm-up
+corpus_status: Dict[str, dict] = {}
+# Set whenever a corpus changes state; created per event loop by the startup hook
+corpus_progress: Optional[asyncio.Event] = None
+warm_up_task: Optional[asyncio.Task] = None
+
+
+def set_corpus_status(name: str, status: str, **detail) -> None:
+    corpus_status[name] = {"status": status, **detail}
+    if corpus_progress is not None:
+        corpus_progress.set()
+
+
+def plan_corpus(builder: CorpusBuilder, save_path: str, path: str) -> str:
+    """What a corpus needs before it can be served: "load", "reindex", "build" or "missing"."""
+    # A store embedded by another backend is never loaded; it is rebuilt from its PDF
+    same_embeddings = embedding_backend.matches(read_embedding_info(save_path))
+    if same_embeddings:
+        # Stores built before manifests existed are trusted once if they are complete
+        builder.adopt_existing()
+
+    if same_embeddings and builder.is_current():
+        return "load"
+    # Re-indexing reads the vectors back from index.faiss, which a PQ/SQ index only holds approximately,
+    # so such a store is rebuilt from its PDF (and unit checkpoints) whenever the PDF is there
+    if same_embeddings and builder.needs_reindex() and (
+            not os.path.exists(path) or lossy_source(read_index_info(save_path)) is None):
+        return "reindex"
+    if not os.path.exists(path):
+        return "missing"
+    return "build"
+
+
+async def open_corpus(name: str, path: str, embeddings) -> Optional["FAISS"]:
+    """Load, re-index or build one predefined corpus, reporting its progress in corpus_status."""
+    save_path = os.path.join(VECTORSTORE_DIR, name)
+    builder = CorpusBuilder(
+        save_path, path, embeddings, EMBEDDING_MODEL,
+        chunker=legal_chunking_engine if name in LEGAL_STRUCTURE_CORPORA else chunking_engine,
+        extra_metadata={"source": name},
+        pipeline=embedding_pipeline,
+        index_spec=CORPUS_INDEX_SPEC
+    )
+    # Hashes the PDF, so off the event loop
+    plan = await stage_pool.run("pdf", plan_corpus, builder, save_path, path)
+
+    if plan == "load":
+        print(f"✅ Loading cached vectorstore for: {name}")
+        return await load_vectorstore(save_path, embeddings)
+    if plan == "reindex":
+        print(f"🔨 Re-indexing vectorstore for: {name}")
+        set_corpus_status(name, CORPUS_BUILDING)
+        vectorstore = await stage_pool.run("faiss", reindex_corpus_vectorstore, builder, name, embeddings)
+        # Keep serving the index it already has if that failed
+        return vectorstore or await load_vectorstore(save_path, embeddings)
+    if plan == "missing":
+        print(f"⚠️ Source PDF missing for {name}: {path}")
+        set_corpus_status(name, CORPUS_MISSING, error=f"No vectorstore and no source PDF at {path}")
+        return None
+
+    print(f"🔨 Building vectorstore for: {name}")
+    set_corpus_status(name, CORPUS_BUILDING)
+    vectorstore = await stage_pool.run("embed", build_corpus_vectorstore, builder, name, embeddings)
+    if vectorstore is None:
+        set_corpus_status(name, CORPUS_FAILED, error="Building the vectorstore failed; see the server log.")
+    return vectorstore
+
+
+async def warm_up_corpus(name: str, path: str, embeddings) -> None:
+    """Bring one corpus up and register it in legal_docs_store as soon as it is ready."""
+    started = time.perf_counter()
+    set_corpus_status(name, CORPUS_LOADING)
+    try:
+        vectorstore = await open_corpus(name, path, embeddings)
+    except Exception as e:
+        print(f"⚠️ Failed to load {name}: {e}")
+        telemetry.error("warm_up_corpus", e)
+        set_corpus_status(name, CORPUS_FAILED, error=str(e))
+        return
+    if vectorstore is None:
+        if corpus_status[name]["status"] not in CORPUS_SETTLED:
+            set_corpus_status(name, CORPUS_FAILED, error="No vectorstore could be loaded; see the server log.")
+        return
+    legal_docs_store[name] = vectorstore
+    set_corpus_status(name, CORPUS_READY, chunks=vectorstore.index.ntotal,
+                      seconds=round(time.perf_counter() - started, 3))
+
+
+async def preload_legal_documents():
+    """Background warm-up: every corpus is loaded (or built) concurrently while the app already serves.
+
+    The unified index behind /ask-existing is first built once no corpus is still
+    being loaded from disk, then rebuilt whenever a corpus that had to be built or
+    re-indexed becomes ready.
+    """
+    print("🔍 Preloading legal documents...")
+    embeddings = make_embeddings()
+    corpora = [asyncio.create_task(warm_up_corpus(name, path, embeddings)) for name, path in PREDEFINED_CORPORA.items()]
+
+    while True:
+        await corpus_progress.wait()
+        corpus_progress.clear()
+        states = [state["status"] for state in corpus_status.values()]
+        if any(state in (CORPUS_PENDING, CORPUS_LOADING) for state in states):
+            continue
+        await refresh_unified_index(embeddings)
+        if all(state in CORPUS_SETTLED for state in states) and sorted(legal_docs_store) == unified_index_corpora:
+            break
+
+    await asyncio.gather(*corpora)
+    print(f"✅ Legal documents preloaded: {', '.join(unified_index_corpora) or 'none'}.")
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    # Returns at once: the port is bound while the corpora load, and /readyz reports their progress
+    global corpus_progress, warm_up_task
+    corpus_progress = asyncio.Event()
+    for name in PREDEFINED_CORPORA:
+        set_corpus_status(name, CORPUS_PENDING)
+    warm_up_task = asyncio.create_task(preload_legal_documents())
+
+
+@app.on_event("shutdown")
+async def persist_caches():
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    query_embedding_cache.save()
+    await ingestion_queue.shutdown()
+    stage_pool.shutdown()
+    model_registry.close()
+
+# -------------------------------
+# /ask-existing: Ask from preloaded legal docs
+# -------------------------------
+def build_existing_prompt(combined_text: str, query: str) -> str:
+    return f"""
 You are a legal assistant. Use the following legal document excerpts to answer the user's question.
 
 ---DOCUMENT EXCERPTS---
@@ -195,70 +757,179 @@ Question: {query}
 Provide a legally accurate, helpful, and context-aware answer.
 """
 
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-2.5-pro",
-        temperature=0.3,
-        google_api_key=GEMINI_API_KEY
+
+@app.post("/ask-existing")
+async def ask_from_existing(query: str = Form(...), sources: Optional[str] = Form(None), stream: bool = Form(False)):
+    # The warm-up may swap in a larger unified index at any await; this request stays on one
+    retriever = unified_retriever
+    if retriever is None:
+        return {"error": "Legal documents not loaded yet."}
+
+    # Optional comma-separated list of corpus names to restrict the search to
+    wanted = [s.strip() for s in sources.split(",") if s.strip()] if sources else None
+
+    # One BM25 lookup and (unless the query is only citations) one embedding and k-NN search
+    # over every corpus, fused by rank; the source restriction is applied inside both searches
+    ranked, query_embedding = await hybrid_retrieve(retriever, query, ASK_EXISTING_TOP_K, wanted)
+
+    # Pooled candidates from every corpus compete on calibrated scores; the prompt gets the
+    # most relevant, non-redundant chunks that fit the token budget
+    with telemetry.span("rerank", candidates=len(ranked)):
+        selection = await stage_pool.run("faiss", context_reranker.select, retriever.vectorstore, ranked, query_embedding)
+    if not selection:
+        return {"error": "No relevant information found."}
+
+    # Trim overlap between the chosen chunks and fit them around the prompt template
+    # (a few tokens per chunk are kept for its source label)
+    with telemetry.span("prompt_assembly"):
+        context = prompt_assembler.fit(
+            "ask_existing",
+            [(doc.page_content, (doc, score)) for doc, score in selection],
+            reserved_tokens=count_tokens(build_existing_prompt("", query)) + 8 * len(selection)
+        )
+    if not context.chunks:
+        return {"error": "No relevant information found."}
+
+    source_weights = Reranker.source_weights(context.payloads)
+    best_source = next(iter(source_weights))
+    used_sources = list(source_weights)
+    best_chunks = context.texts
+    combined_text = "\n\n".join(
+        f"[{doc.metadata.get('source', 'Unknown')}]\n{text}" for text, (doc, _) in context.chunks
     )
-    response = llm.invoke(prompt)
+    meta = {"source": best_source, "sources": used_sources}
+
+    chunk_ids = [AnswerCache.chunk_id(chunk) for chunk in best_chunks]
+    cached_answer = answer_cache.get(query, chunk_ids, CHAT_MODEL, CHAT_TEMPERATURE,
+                                     source=best_source, query_embedding=query_embedding)
+    if cached_answer is not None:
+        if stream:
+            return sse_response(stream_cached_answer(cached_answer, meta))
+        return {"answer": cached_answer, **meta}
+
+    prompt = build_existing_prompt(combined_text, query)
+    prompt_tokens = prompt_assembler.record("ask_existing", prompt, context)
+
+    def remember(answer: str):
+        answer_cache.put(query, chunk_ids, CHAT_MODEL, CHAT_TEMPERATURE, answer,
+                         source=best_source, query_embedding=query_embedding, sources=used_sources)
+
+    llm = get_llm()
+    if stream:
+        return sse_response(stream_cleaned_answer(stream_llm(llm, prompt, "ask_existing", prompt_tokens), meta, remember))
+
+    async with stage_pool.limit("llm"):
+        with telemetry.span("llm_generate"):
+            response = await llm.ainvoke(prompt)
+            telemetry.llm_usage("ask_existing", response, prompt_tokens)
     answer = response.content if hasattr(response, 'content') else str(response)
-    cleaned_answer = clean_ai_response(answer)
+    with telemetry.span("clean_response"):
+        cleaned_answer = clean_ai_response(answer)
+    remember(cleaned_answer)
 
-    return {"answer": cleaned_answer, "source": best_source}
+    return {"answer": cleaned_answer, **meta}
 
 # -------------------------------
 # /ask-upload: Upload PDF & Ask
 # -------------------------------
+async def ingest_upload(job: IngestionJob, file_bytes: bytes) -> None:
+    """Background ingestion of an uploaded PDF: parse, chunk, embed, persist and cache."""
+    with telemetry.span("ingest", file_id=job.file_id):
+        await _ingest_upload(job, file_bytes)
+
+
+async def _ingest_upload(job: IngestionJob, file_bytes: bytes) -> None:
+    job.set_status(PARSING)
+
+    def on_progress(done: int, seen: int):
+        # Parsing and embedding overlap; the job counts as embedding once the first batch is in
+        if job.status == PARSING:
+            job.set_status(EMBEDDING)
+        job.set_progress(done, seen)
+
+    # Pages are parsed from memory and chunked lazily while earlier batches are being embedded
+    chunks = iter_pdf_chunks(file_bytes, source_name=f"{job.file_id}.pdf")
+    vectorstore = await stage_pool.run("embed", create_faiss_vectorstore, chunks, make_embeddings(),
+                                       job.file_id, on_progress)
+    if vectorstore is None:
+        raise ValueError("No text could be extracted from the PDF.")
+    vectorstore_cache.put(job.file_id, vectorstore)
+
+
+async def wait_for_ingestion(file_id: str, wait: bool) -> Optional[dict]:
+    """Status payload if file_id is still being ingested (or failed), None once it can be queried."""
+    job = ingestion_queue.get(file_id)
+    if job is None:
+        return None
+    if not job.finished and wait:
+        await job.wait(INGEST_WAIT_TIMEOUT)
+    if job.status == FAILED:
+        return {"error": f"Document processing failed: {job.error}", "file_id": file_id, "job": job.to_dict()}
+    if not job.finished:
+        return {"file_id": file_id, "status": job.status, "job": job.to_dict()}
+    return None
+
+
 @app.post("/ask-upload")
-async def ask_from_uploaded(query: str = Form(...), file: UploadFile = None):
+async def ask_from_uploaded(query: str = Form(...), file: UploadFile = None, wait: bool = Form(False)):
+    """Answer from an uploaded PDF. A new PDF is queued for ingestion and its file_id returned
+    right away with the job status; poll /upload-status/{file_id}, then ask via /ask-context.
+    Pass wait=true to block until ingestion finishes and answer in the same request."""
     if file is None:
         return {"error": "No file uploaded."}
 
     file_bytes = await file.read()
     file_id = file_hash(file_bytes)
-    save_path = os.path.join(VECTORSTORE_DIR, file_id)
 
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=GEMINI_API_KEY
-    )
+    vectorstore = None
+    job = ingestion_queue.get(file_id)
+    if job is None or job.status == READY:
+        vectorstore = await vectorstore_cache.get_or_load(file_id, load_uploaded_vectorstore)
+        if vectorstore is None and job is not None:
+            # Ingested once but gone or unreadable since; the finished job must not absorb the re-upload
+            ingestion_queue.discard(file_id)
+    if vectorstore is None:
+        ingestion_queue.submit(file_id, lambda job: ingest_upload(job, file_bytes))
+        pending = await wait_for_ingestion(file_id, wait)
+        if pending is not None:
+            return pending
+        vectorstore = await vectorstore_cache.get_or_load(file_id, load_uploaded_vectorstore)
+        if vectorstore is None:
+            return {"error": "Document processing failed: the vectorstore could not be loaded.", "file_id": file_id}
 
-    if file_id in vectorstore_cache:
-        vectorstore = vectorstore_cache[file_id]
-    elif os.path.exists(save_path):
-        vectorstore = FAISS.load_local(save_path, embeddings, allow_dangerous_deserialization=True)
-        vectorstore_cache[file_id] = vectorstore
-    else:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(file_bytes)
-            tmp_file_path = tmp_file.name
-
-        loader = PyPDFLoader(tmp_file_path)
-        docs = loader.load()
-        chunks = smart_chunk_splitter(docs)
-
-        vectorstore = create_faiss_vectorstore_safe(chunks, embeddings, name=file_id)
-        if vectorstore:
-            vectorstore_cache[file_id] = vectorstore
-
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-2.5-pro",
-        temperature=0.3,
-        google_api_key=GEMINI_API_KEY
-    )
-    qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=vectorstore.as_retriever())
-    result = qa_chain.run(query)
-    cleaned_result = clean_ai_response(result)
+    return await answer_with_retrieval_qa(vectorstore, query, file_id)
 
-    return {"answer": cleaned_result, "file_id": file_id}
+
+# -------------------------------
+# /upload-status: Background ingestion progress
+# -------------------------------
+@app.get("/upload-status/{file_id}")
+async def upload_status(file_id: str):
+    job = ingestion_queue.get(file_id)
+    if job is not None:
+        return job.to_dict()
+    if file_id in vectorstore_cache or is_persisted(file_id):
+        return {"file_id": file_id, "status": "ready", "progress": 1.0}
+    return {"error": "Unknown file_id. Please upload the file first.", "file_id": file_id}
 
 # -------------------------------
 # /chat: General chat endpoint
 # -------------------------------
 @app.post("/chat")
-async def general_chat(query: str = Form(...)):
+async def general_chat(query: str = Form(...), stream: bool = Form(False)):
     """General chat endpoint for conversational AI without specific document context"""
-    
+    query_embedding = None
+    if answer_cache.semantic_enabled:
+        async with stage_pool.limit("embed"):
+            with telemetry.span("embed_query"):
+                query_embedding = await make_embeddings().aembed_query(query)
+    cached_answer = answer_cache.get(query, [], CHAT_MODEL, CHAT_TEMPERATURE,
+                                     source="chat", query_embedding=query_embedding)
+    if cached_answer is not None:
+        if stream:
+            return sse_response(stream_cached_answer(cached_answer, {}))
+        return {"response": cached_answer}
+
     prompt = f"""
 You are a helpful AI legal assistant. Provide professional, accurate, and helpful legal guidance.
 Be conversational but maintain professionalism. If a question requires specific legal documents 
@@ -268,15 +939,24 @@ User Question: {query}
 
 Provide a helpful, informative response:
 """
+    prompt_tokens = prompt_assembler.record("chat", prompt)
 
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-2.5-pro",
-        temperature=0.3,
-        google_api_key=GEMINI_API_KEY
-    )
-    response = llm.invoke(prompt)
+    def remember(answer: str):
+        answer_cache.put(query, [], CHAT_MODEL, CHAT_TEMPERATURE, answer,
+                         source="chat", query_embedding=query_embedding)
+
+    llm = get_llm()
+    if stream:
+        return sse_response(stream_cleaned_answer(stream_llm(llm, prompt, "chat", prompt_tokens), {}, remember))
+
+    async with stage_pool.limit("llm"):
+        with telemetry.span("llm_generate"):
+            response = await llm.ainvoke(prompt)
+            telemetry.llm_usage("chat", response, prompt_tokens)
     answer = response.content if hasattr(response, 'content') else str(response)
-    cleaned_answer = clean_ai_response(answer)
+    with telemetry.span("clean_response"):
+        cleaned_answer = clean_ai_response(answer)
+    remember(cleaned_answer)
 
     return {"response": cleaned_answer}
 
@@ -290,79 +970,167 @@ async def save_chat(chat_id: str = Form(...), user_message: str = Form(...), ai_
     # For now, we'll just return success - the actual saving is handled by the Next.js backend
     return {"success": True, "chat_id": chat_id}
 
+# -------------------------------
+# /cache-stats: Cache hit/miss counters
+# -------------------------------
+@app.get("/cache-stats")
+async def cache_stats():
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "answers": answer_cache.stats(),
+        "model_clients": model_registry.stats(),
+        "clause_extractions": extraction_cache.stats(),
+        "uploaded_vectorstores": vectorstore_cache.stats(),
+        "embedding_pipeline": embedding_pipeline.stats(),
+        "ingestion": ingestion_queue.stats(),
+        "prompts": prompt_assembler.stats()
+    }
+
+# -------------------------------
+# /metrics: Prometheus scrape endpoint
+# -------------------------------
+def component_samples():
+    """Cache and background-work counters, read from the components' own stats at scrape time."""
+    caches = {
+        "query_embeddings": query_embedding_cache.stats(),
+        "answers": answer_cache.stats(),
+        "clause_extractions": extraction_cache.stats(),
+        "uploaded_vectorstores": vectorstore_cache.stats()
+    }
+    for cache, stats in caches.items():
+        for result in ("hits", "semantic_hits", "misses"):
+            if result in stats:
+                yield ("cache_lookups_total", "counter", "Cache lookups by result.",
+                       {"cache": cache, "result": result}, stats[result])
+    pipeline = embedding_pipeline.stats()
+    for outcome in ("retries", "failures"):
+        yield ("embedding_batch_" + outcome + "_total", "counter", f"Embedding batch {outcome}.", {}, pipeline[outcome])
+    ingestion = ingestion_queue.stats()
+    for outcome in ("submitted", "completed", "failed"):
+        yield ("ingestion_jobs_total", "counter", "Upload ingestion jobs by outcome.", {"outcome": outcome},
+               ingestion[outcome])
+
+
+telemetry.register_collector(component_samples)
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
+# -------------------------------
+# /healthz and /readyz: Liveness and readiness probes
+# -------------------------------
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker is up and its event loop responds (corpora may still be loading)."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once /ask-existing can answer from at least one corpus, 503 before.
+
+    Per-corpus states show what is still loading or building and what is missing or failed.
+    """
+    retriever = unified_retriever
+    ready = retriever is not None
+    body = {
+        "ready": ready,
+        "warm_up_complete": warm_up_task is not None and warm_up_task.done(),
+        "corpora": corpus_status,
+        "unified_index": {
+            "corpora": sorted(retriever.bm25.sources) if ready else [],
+            "chunks": retriever.vectorstore.index.ntotal if ready else 0
+        }
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
 # -------------------------------
 # /ask-context: Ask using file_id
 # -------------------------------
 @app.post("/ask-context")
-async def ask_from_context(query: str = Form(...), file_id: str = Form(...)):
-    if file_id not in vectorstore_cache:
-        save_path = os.path.join(VECTORSTORE_DIR, file_id)
-        if os.path.exists(save_path):
-            embeddings = GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001",
-                google_api_key=GEMINI_API_KEY
-            )
-            vectorstore = FAISS.load_local(save_path, embeddings, allow_dangerous_deserialization=True)
-            vectorstore_cache[file_id] = vectorstore
-        else:
-            return {"error": "Context not found. Please upload the file first."}
+async def ask_from_context(query: str = Form(...), file_id: str = Form(...), stream: bool = Form(False),
+                           wait: bool = Form(False)):
+    pending = await wait_for_ingestion(file_id, wait)
+    if pending is not None:
+        return pending
 
-    vectorstore = vectorstore_cache[file_id]
+    vectorstore = await vectorstore_cache.get_or_load(file_id, load_uploaded_vectorstore)
+    if vectorstore is None:
+        return {"error": "Context not found. Please upload the file first."}
 
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-2.5-pro",
-        temperature=0.3,
-        google_api_key=GEMINI_API_KEY
-    )
-    qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=vectorstore.as_retriever())
-    result = qa_chain.run(query)
-    cleaned_result = clean_ai_response(result)
+    return await answer_with_retrieval_qa(vectorstore, query, file_id, stream=stream)
 
-    return {"answer": cleaned_result, "file_id": file_id}
+# -------------------------------
+# Utility: Clause extraction for uploaded PDF bytes
+# -------------------------------
+def load_pdf_bytes_text(file_bytes: bytes) -> str:
+    return ClauseExtractor.load_pdf_text(file_bytes)
+
+
+async def extract_clauses_from_pdf_bytes(extractor: ClauseExtractor, file_bytes: bytes, offline: bool = False) -> Dict:
+    """Parse the PDF in the stage pool, then run the extraction LLM call natively async."""
+    try:
+        with telemetry.span("pdf_parse", bytes=len(file_bytes)):
+            full_text = await stage_pool.run("pdf", load_pdf_bytes_text, file_bytes)
+    except Exception as e:
+        print(f"❌ Error processing PDF: {e}")
+        telemetry.error("pdf_parse", e)
+        return {"error": f"Failed to process PDF: {str(e)}"}
+
+    if offline:
+        with telemetry.span("offline_extraction"):
+            return await stage_pool.run("pdf", extractor.extract_clauses_offline, full_text)
+
+    # The extractor takes an "llm" stage slot per model call, one per chunk of a long document
+    with telemetry.span("clause_extraction", chars=len(full_text)):
+        return await extractor.aextract_clauses_from_text(full_text)
 
 # -------------------------------
 # /extract-clauses: Extract clauses from uploaded PDF
 # -------------------------------
 @app.post("/extract-clauses")
-async def extract_clauses_from_pdf(file: UploadFile = None):
+async def extract_clauses_from_pdf(file: UploadFile = None, offline: bool = Form(False)):
     """Extract clauses from uploaded PDF file"""
     if file is None:
         return {"error": "No file uploaded."}
 
     try:
-        # Save uploaded file temporarily
         file_bytes = await file.read()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(file_bytes)
-            tmp_file_path = tmp_file.name
 
         # Initialize clause extractor
-        extractor = ClauseExtractor(api_key=GEMINI_API_KEY)
-        result = extractor.extract_clauses_from_pdf(tmp_file_path)
-        
-        # Clean up temporary file
-        os.unlink(tmp_file_path)
+        extractor = get_clause_extractor()
+        result = await extract_clauses_from_pdf_bytes(extractor, file_bytes, offline=offline)
         
         return result
     except Exception as e:
+        telemetry.error("extract_clauses", e)
         return {"error": f"Failed to extract clauses: {str(e)}"}
 
 # -------------------------------
 # /extract-clauses-from-text: Extract clauses from text
 # -------------------------------
 @app.post("/extract-clauses-from-text")
-async def extract_clauses_from_text(document_text: str = Form(...)):
+async def extract_clauses_from_text(document_text: str = Form(...), offline: bool = Form(False)):
     """Extract clauses from document text"""
     if not document_text or not document_text.strip():
         return {"error": "No text provided."}
 
     try:
         # Initialize clause extractor
-        extractor = ClauseExtractor(api_key=GEMINI_API_KEY)
-        result = extractor.extract_clauses_from_text(document_text)
+        extractor = get_clause_extractor()
+        if offline:
+            # Keyword-only classification, no model call
+            with telemetry.span("offline_extraction"):
+                return await stage_pool.run("pdf", extractor.extract_clauses_offline, document_text)
+
+        with telemetry.span("clause_extraction", chars=len(document_text)):
+            result = await extractor.aextract_clauses_from_text(document_text)
         
         return result
     except Exception as e:
+        telemetry.error("extract_clauses", e)
         return {"error": f"Failed to extract clauses from text: {str(e)}"}
 
 # -------------------------------
@@ -376,37 +1144,26 @@ async def compare_clauses(file1: UploadFile = None, file2: UploadFile = None):
 
     try:
         # Initialize clause extractor
-        extractor = ClauseExtractor(api_key=GEMINI_API_KEY)
-        
-        # Process first file
-        file1_bytes = await file1.read()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file1:
-            tmp_file1.write(file1_bytes)
-            tmp_file1_path = tmp_file1.name
+        extractor = get_clause_extractor()
         
-        result1 = extractor.extract_clauses_from_pdf(tmp_file1_path)
-        os.unlink(tmp_file1_path)
+        # Extract both documents concurrently
+        file1_bytes, file2_bytes = await file1.read(), await file2.read()
+        result1, result2 = await asyncio.gather(
+            extract_clauses_from_pdf_bytes(extractor, file1_bytes),
+            extract_clauses_from_pdf_bytes(extractor, file2_bytes)
+        )
         
         if "error" in result1:
             return result1
-        
-        # Process second file
-        file2_bytes = await file2.read()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file2:
-            tmp_file2.write(file2_bytes)
-            tmp_file2_path = tmp_file2.name
-        
-        result2 = extractor.extract_clauses_from_pdf(tmp_file2_path)
-        os.unlink(tmp_file2_path)
-        
         if "error" in result2:
             return result2
         
         # Compare clauses
-        comparison = extractor.compare_clauses(
-            result1.get("clauses", []),
-            result2.get("clauses", [])
-        )
+        with telemetry.span("clause_comparison"):
+            comparison = await extractor.acompare_clauses(
+                result1.get("clauses", []),
+                result2.get("clauses", [])
+            )
         
         return {
             "document1": {
@@ -423,4 +1180,59 @@ async def compare_clauses(file1: UploadFile = None, file2: UploadFile = None):
         }
         
     except Exception as e:
+        telemetry.error("compare_clauses", e)
+        return {"error": f"Failed to compare clauses: {str(e)}"}
+
+# -------------------------------
+# /compare-clauses-multi: Compare a baseline PDF against many counterparties
+# -------------------------------
+@app.post("/compare-clauses-multi")
+async def compare_clauses_multi(baseline: UploadFile = None, counterparties: List[UploadFile] = File(None)):
+    """Compare one baseline contract against several counterparty contracts in one request"""
+    if not baseline or not counterparties:
+        return {"error": "A baseline file and at least one counterparty file are required."}
+
+    try:
+        extractor = get_clause_extractor()
+
+        # Extract every document concurrently
+        baseline_bytes = await baseline.read()
+        counterparty_bytes = [await file.read() for file in counterparties]
+        baseline_result, *counterparty_results = await asyncio.gather(
+            extract_clauses_from_pdf_bytes(extractor, baseline_bytes),
+            *(extract_clauses_from_pdf_bytes(extractor, file_bytes) for file_bytes in counterparty_bytes)
+        )
+
+        if "error" in baseline_result:
+            return baseline_result
+        baseline_clauses = baseline_result.get("clauses", [])
+
+        async def compare_with_baseline(result: Dict) -> Dict:
+            if "error" in result:
+                return result
+            with telemetry.span("clause_comparison"):
+                return await extractor.acompare_clauses(baseline_clauses, result.get("clauses", []))
+
+        # Then compare the baseline with each counterparty concurrently
+        comparisons = await asyncio.gather(*(compare_with_baseline(result) for result in counterparty_results))
+
+        return {
+            "baseline": {
+                "filename": baseline.filename,
+                "clauses": baseline_clauses,
+                "total_clauses": baseline_result.get("total_clauses", 0)
+            },
+            "counterparties": [
+                {
+                    "filename": file.filename,
+                    "clauses": result.get("clauses", []),
+                    "total_clauses": result.get("total_clauses", 0),
+                    "comparison": comparison
+                }
+                for file, result, comparison in zip(counterparties, counterparty_results, comparisons)
+            ]
+        }
+
+    except Exception as e:
+        telemetry.error("compare_clauses", e)
         return {"error": f"Failed to compare clauses: {str(e)}"}
@@ -0,0 +1,72 @@
+import asyncio
+from utils.clause_extractor import ClauseExtractor
+from utils.extraction_cache import ExtractionCache
+
+CLAUSE_RESPONSE = """CLAUSE_START
+Type: Payment
+Text: {text}
+Key Points: Payment is due monthly
+Risk Level: Low
+Analysis: Standard payment terms
+CLAUSE_END"""
+
+
+class FakeResponse:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FlakyLLM:
+    """Answers every extraction prompt except those containing `fail_marker`, which raise."""
+
+    model = "fake-llm"
+
+    def __init__(self, fail_marker: str):
+        self.fail_marker = fail_marker
+
+    def invoke(self, prompt: str):
+        if self.fail_marker in prompt:
+            raise RuntimeError("429 Resource exhausted")
+        return FakeResponse(CLAUSE_RESPONSE.format(text=prompt.split("Document Text:")[1].strip()[:60]))
+
+    async def ainvoke(self, prompt: str):
+        return self.invoke(prompt)
+
+
+def make_document() -> str:
+    return "\n\n".join(
+        f"{i}. Payment Section {i}\n" + f"The client shall pay invoice {i} within thirty days. " * 20
+        for i in range(1, 9)
+    )
+
+
+def make_extractor(tmp_path, fail_marker: str) -> ClauseExtractor:
+    return ClauseExtractor(
+        llm=FlakyLLM(fail_marker), chunk_chars=2000, chunk_overlap=0, prefilter=False,
+        offline_fallback=False, cache=ExtractionCache(str(tmp_path))
+    )
+
+
+def test_partially_failed_chunked_extraction_is_flagged_and_not_cached(tmp_path):
+    extractor = make_extractor(tmp_path, fail_marker="invoice 5 ")
+    document = make_document()
+
+    result = extractor.extract_clauses_from_text(document, chunked=True)
+    assert "error" not in result
+    assert result["partial"] is True
+    assert "some clauses may be missing" in result["warning"]
+    assert sum("error" in timing for timing in result["chunk_timings"]) == 1
+    assert extractor.cache.get(extractor.extraction_cache_key(document)) is None
+
+    result = asyncio.run(extractor.aextract_clauses_from_text(document, chunked=True))
+    assert result["partial"] is True
+    assert extractor.cache.get(extractor.extraction_cache_key(document)) is None
+
+
+def test_complete_chunked_extraction_is_cached(tmp_path):
+    extractor = make_extractor(tmp_path, fail_marker="never present")
+    document = make_document()
+
+    result = extractor.extract_clauses_from_text(document, chunked=True)
+    assert "partial" not in result
+    assert extractor.cache.get(extractor.extraction_cache_key(document)) == result
@@ -0,0 +1,46 @@
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from utils.embedding_backends import (
+    EmbeddingMismatchError, HashingEmbeddings, check_embedding_info, create_backend, write_embedding_info
+)
+
+DOCUMENTS = [
+    Document(page_content="Whoever commits murder shall be punished with death or imprisonment for life.",
+             metadata={"source": "IPC", "page": 301}),
+    Document(page_content="No person shall be deprived of his life or personal liberty except according to law.",
+             metadata={"source": "Constitution of India", "page": 21}),
+    Document(page_content="The buyer shall pay the invoiced amount within thirty days of delivery.",
+             metadata={"source": "legaldoc", "page": 4}),
+]
+
+
+def test_hashing_vectors_are_deterministic_unit_vectors():
+    embeddings = HashingEmbeddings(64)
+    first, again = embeddings.embed_query("right to life"), HashingEmbeddings(64).embed_query("right to life")
+    assert first == again
+    assert len(first) == 64
+    assert sum(x * x for x in first) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_store_built_with_the_hashing_backend_round_trips_a_query(tmp_path):
+    backend = create_backend("hashing:256")
+    store = FAISS.from_documents(DOCUMENTS, backend.embeddings())
+    store.save_local(str(tmp_path))
+    write_embedding_info(str(tmp_path), backend.info())
+
+    # A fresh backend with the same spec reopens and searches the persisted store
+    reopened = create_backend("hashing:256")
+    check_embedding_info(str(tmp_path), reopened)
+    loaded = FAISS.load_local(str(tmp_path), reopened.embeddings(), allow_dangerous_deserialization=True)
+
+    [best] = loaded.similarity_search("punished for murder", k=1)
+    assert best.metadata == {"source": "IPC", "page": 301}
+    [best] = loaded.similarity_search("pay within thirty days", k=1)
+    assert best.metadata["source"] == "legaldoc"
+
+
+def test_store_from_another_dimension_is_rejected(tmp_path):
+    write_embedding_info(str(tmp_path), create_backend("hashing:256").info())
+    with pytest.raises(EmbeddingMismatchError):
+        check_embedding_info(str(tmp_path), create_backend("hashing:128"))
@@ -0,0 +1,99 @@
+import time
+import threading
+import pytest
+from langchain_core.documents import Document
+from utils.embedding_backends import HashingEmbeddings
+from utils.embedding_pipeline import EmbeddingPipeline, EmbeddingPipelineError, TokenBucket
+
+
+class FakeEmbeddings(HashingEmbeddings):
+    """Deterministic vectors with injected latency and failures, standing in for the embedding service.
+
+    `delays` maps the first text of a batch to the seconds that request takes;
+    the first `failures` requests raise.
+    """
+
+    def __init__(self, dimension: int = 16, delays=None, failures: int = 0):
+        super().__init__(dimension)
+        self.delays = delays or {}
+        self.failures = failures
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.requests += 1
+            fail = self.requests <= self.failures
+        time.sleep(self.delays.get(texts[0], 0.0))
+        if fail:
+            raise RuntimeError("Simulated embedding service failure")
+        return super().embed_documents(texts)
+
+
+def make_pipeline(embeddings, **kwargs) -> EmbeddingPipeline:
+    kwargs.setdefault("backoff_seconds", 0.0)
+    return EmbeddingPipeline(lambda: embeddings, **kwargs)
+
+
+def test_token_bucket_spaces_requests_beyond_the_burst():
+    bucket = TokenBucket(rate=20.0, capacity=1.0)
+    assert bucket.acquire() == 0.0
+    started = time.monotonic()
+    waited = bucket.acquire()
+    assert waited > 0.02
+    assert time.monotonic() - started >= 0.04
+
+
+def test_token_bucket_without_a_rate_never_waits():
+    bucket = TokenBucket(rate=0.0)
+    assert all(bucket.acquire() == 0.0 for _ in range(100))
+
+
+def test_batches_completing_out_of_order_keep_input_order():
+    texts = [f"clause {i} of the agreement" for i in range(10)]
+    # The first batch is the slowest, so it completes last
+    embeddings = FakeEmbeddings(delays={texts[0]: 0.2})
+    pipeline = make_pipeline(embeddings, batch_size=2, concurrency=4)
+
+    completion_order = [index for index, _ in pipeline.run(pipeline.make_batches(texts))]
+    assert sorted(completion_order) == list(range(5))
+    assert completion_order[-1] == 0
+
+    assert pipeline.embed_documents(texts) == HashingEmbeddings(16).embed_documents(texts)
+
+
+def test_transient_failure_is_retried():
+    embeddings = FakeEmbeddings(failures=2)
+    pipeline = make_pipeline(embeddings, batch_size=4, concurrency=1, max_retries=3)
+
+    vectors = pipeline.embed_documents(["payment terms", "termination"])
+    assert vectors == HashingEmbeddings(16).embed_documents(["payment terms", "termination"])
+    assert pipeline.retries == 2
+    assert pipeline.failures == 0
+
+
+def test_persistent_failure_aborts_after_max_retries():
+    embeddings = FakeEmbeddings(failures=100)
+    pipeline = make_pipeline(embeddings, concurrency=1, max_retries=2)
+
+    with pytest.raises(EmbeddingPipelineError):
+        pipeline.embed_documents(["payment terms"])
+    assert embeddings.requests == 3
+    assert pipeline.failures == 1
+
+
+def test_build_vectorstore_keeps_each_chunk_with_its_vector_and_metadata():
+    documents = [Document(page_content=f"section {i} covers topic {i}", metadata={"page": i}) for i in range(7)]
+    embeddings = FakeEmbeddings(delays={documents[0].page_content: 0.1})
+    pipeline = make_pipeline(embeddings, batch_size=3, concurrency=3)
+    progress = []
+
+    store = pipeline.build_vectorstore(iter(documents), on_progress=lambda done, seen: progress.append(done))
+
+    assert store.index.ntotal == 7
+    assert progress[-1] == 7
+    for document in documents:
+        [(found, score)] = store.similarity_search_with_score(document.page_content, k=1)
+        assert found.page_content == document.page_content
+        assert found.metadata == document.metadata
+        assert score == pytest.approx(0.0, abs=1e-5)
@@ -0,0 +1,14 @@
+import numpy as np
+from utils.index_factory import build_index, lossy_source
+
+
+def test_lossy_source_follows_reconstructed_vectors_through_later_indexes():
+    vectors = np.random.default_rng(0).normal(size=(200, 16)).astype(np.float32)
+    _, flat = build_index(vectors, "flat")
+    _, sq8 = build_index(vectors, "sq8")
+
+    assert lossy_source(None) is None
+    assert lossy_source(flat) is None
+    assert lossy_source(sq8) == "sq8"
+    # A flat index rebuilt from the sq8 one still only holds approximations
+    assert lossy_source({**flat, "lossy_source": "sq8"}) == "sq8"
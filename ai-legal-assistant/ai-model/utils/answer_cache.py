@@ -0,0 +1,154 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any
+import numpy as np
+
+
+class AnswerCache:
+    """Caches LLM answers keyed by (normalized query, retrieved chunk IDs, model, temperature).
+
+    With a similarity threshold set, a miss on the exact key falls back to a
+    near-duplicate lookup: a cached answer over the same source is reused when
+    its query embedding is within the cosine threshold of the new query.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 6 * 3600,
+                 similarity_threshold: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        # key -> entry dict; ordered from least to most recently used
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold is not None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    @staticmethod
+    def chunk_id(content: str) -> str:
+        """Stable ID for a retrieved chunk, derived from its text."""
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def make_key(self, query: str, chunk_ids: List[str], model: str, temperature: float) -> str:
+        raw = "\x00".join([model, f"{temperature:.3f}", self.normalize(query), *sorted(chunk_ids)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return bool(self.ttl_seconds) and now - entry["created_at"] > self.ttl_seconds
+
+    def get(self, query: str, chunk_ids: List[str], model: str, temperature: float,
+            source: Optional[str] = None, query_embedding: Optional[List[float]] = None) -> Optional[str]:
+        key = self.make_key(query, chunk_ids, model, temperature)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["answer"]
+
+            if self.semantic_enabled and query_embedding is not None:
+                match_key = self._find_similar(query_embedding, source, model, temperature, now)
+                if match_key is not None:
+                    self._entries.move_to_end(match_key)
+                    self.semantic_hits += 1
+                    return self._entries[match_key]["answer"]
+
+            self.misses += 1
+            return None
+
+    def _find_similar(self, query_embedding: List[float], source: Optional[str], model: str,
+                      temperature: float, now: float) -> Optional[str]:
+        candidates = [
+            (key, entry) for key, entry in self._entries.items()
+            if entry["embedding"] is not None
+            and entry["source"] == source
+            and entry["model"] == model
+            and entry["temperature"] == temperature
+            and not self._expired(entry, now)
+        ]
+        if not candidates:
+            return None
+
+        query_vec = self._unit(query_embedding)
+        matrix = np.stack([entry["embedding"] for _, entry in candidates])
+        similarities = matrix @ query_vec
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            return candidates[best][0]
+        return None
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        arr = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(arr)
+        return arr / norm if norm else arr
+
+    def put(self, query: str, chunk_ids: List[str], model: str, temperature: float, answer: str,
+            source: Optional[str] = None, query_embedding: Optional[List[float]] = None,
+            sources: Optional[List[str]] = None) -> None:
+        """Store `answer`; `source` groups near-duplicate lookups, `sources` lists every corpus
+        the context was drawn from (defaults to `source`) so a rebuild of any of them drops it."""
+        key = self.make_key(query, chunk_ids, model, temperature)
+        entry = {
+            "answer": answer,
+            "source": source,
+            "sources": frozenset(sources or [source]),
+            "model": model,
+            "temperature": temperature,
+            "embedding": self._unit(query_embedding) if query_embedding is not None else None,
+            "created_at": time.time()
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, source: Optional[str] = None) -> int:
+        """Drop every answer whose context drew on `source` (or everything when no source is given)."""
+        with self._lock:
+            if source is None:
+                keys = list(self._entries)
+            else:
+                keys = [key for key, entry in self._entries.items() if source in entry["sources"]]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "similarity_threshold": self.similarity_threshold
+            }
@@ -0,0 +1,223 @@
+import re
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Tuple
+from langchain_core.documents import Document
+from utils.concurrency import process_pool
+
+if TYPE_CHECKING:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# (max unit length, chunk size, chunk overlap): short units get small chunks, long ones large chunks
+CHUNK_SIZE_TIERS = [(1000, 400, 50), (3000, 700, 100), (None, 1000, 120)]
+CHUNK_SEPARATORS = ["\n\n", "\n", ".", " ", ""]
+
+# Headings that open a new unit in "legal" mode: "PART III", "CHAPTER XVI", "SCHEDULE 2", "Article 21",
+# "Section 302", and numbered provisions such as "302. Punishment for murder" or "1[52A. “Harbour”"
+# (the leading "1[" is an amendment footnote marker)
+LEGAL_HEADING_PATTERN = re.compile(
+    r'^[ \t]*(?:\d+\[)?(?:'
+    r'(?:PART|CHAPTER|SCHEDULE|ARTICLE|SECTION|CLAUSE)\s+[\dIVXLC]+[A-Z]?\b'
+    r'|(?:Article|Section|Clause)\s+\d+[A-Z]*\b'
+    r'|\d{1,3}[A-Z]{0,2}\.\s+[A-Z“"]'
+    r')',
+    re.MULTILINE
+)
+
+# Legal-mode sections shorter than this are merged into the following one (running headers, stubs)
+MIN_SECTION_CHARS = 200
+# A unit is cut at a paragraph break once it grows past this, even without a heading
+MAX_UNIT_CHARS = 20000
+
+
+@lru_cache(maxsize=None)
+def get_splitter(chunk_size: int, chunk_overlap: int, separators: Tuple[str, ...]) -> "RecursiveCharacterTextSplitter":
+    """One splitter per configuration, built once per process (langchain's splitters load on first use)."""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=list(separators),
+        add_start_index=True
+    )
+
+
+# A line break that ends a sentence: the most natural place to end a unit when there is no blank line
+_SENTENCE_END_PATTERN = re.compile(r'[.:;!?]["”\')\]]?[ \t]*\n')
+
+
+def _last_paragraph_break(text: str, start: int = 0) -> int:
+    """Offset just past the last paragraph break at or after `start` (falling back to the last
+    sentence-ending line, then the last line break), or -1 if there is none."""
+    index = text.rfind("\n\n", start)
+    if index != -1:
+        return index + 2
+    last = None
+    for last in _SENTENCE_END_PATTERN.finditer(text, start):
+        pass
+    if last is not None:
+        return last.end()
+    index = text.rfind("\n", start)
+    return index + 1 if index != -1 else -1
+
+
+class ChunkingEngine:
+    """Splits a stream of pages into chunks that may span page boundaries.
+
+    Pages are concatenated into a running buffer with their start offsets
+    recorded, so every chunk still cites the page it starts on ("page") and
+    the page it ends on ("page_end"). The buffer is cut into units, and each
+    unit is split with the tier chosen by its length:
+
+    - "smart": a unit runs to the last paragraph break of the latest page, so
+      a paragraph continuing onto the next page stays in one unit.
+    - "legal": a unit is one Article/Section/Clause (or PART/CHAPTER), so
+      chunks never mix provisions and carry their heading as "section".
+    """
+
+    def __init__(self, mode: str = "smart", tiers=None, separators=None):
+        if mode not in ("smart", "legal"):
+            raise ValueError(f"Unknown chunking mode: {mode}")
+        self.mode = mode
+        self.tiers = [tuple(tier) for tier in (tiers or CHUNK_SIZE_TIERS)]
+        self.separators = tuple(separators or CHUNK_SEPARATORS)
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        """Everything that determines the chunks; recorded in corpus manifests."""
+        params = {"engine": "ChunkingEngine", "mode": self.mode, "tiers": self.tiers, "separators": self.separators}
+        if self.mode == "legal":
+            params["heading_pattern"] = LEGAL_HEADING_PATTERN.pattern
+            params["min_section_chars"] = MIN_SECTION_CHARS
+        return params
+
+    def splitter_for(self, length: int) -> "RecursiveCharacterTextSplitter":
+        for max_length, chunk_size, chunk_overlap in self.tiers:
+            if max_length is None or length < max_length:
+                break
+        return get_splitter(chunk_size, chunk_overlap, self.separators)
+
+    # -------------------------------
+    # Units
+    # -------------------------------
+    def _cut_points(self, text: str, searchable_from: int) -> List[int]:
+        """Offsets in `text` where complete units end; the text after the last one is carried over."""
+        cuts = []
+        if self.mode == "legal":
+            previous = 0
+            for match in LEGAL_HEADING_PATTERN.finditer(text):
+                if match.start() - previous >= MIN_SECTION_CHARS:
+                    cuts.append(match.start())
+                    previous = match.start()
+        else:
+            cut = _last_paragraph_break(text, searchable_from)
+            if cut > 0:
+                cuts.append(cut)
+
+        if len(text) - (cuts[-1] if cuts else 0) > MAX_UNIT_CHARS:
+            # No boundary for a long stretch; cut it anyway so the buffer stays bounded
+            start = cuts[-1] if cuts else 0
+            cut = _last_paragraph_break(text, start + MAX_UNIT_CHARS // 2)
+            cuts.append(cut if cut > start else len(text))
+        return cuts
+
+    def iter_units(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """Yield units as soon as they are complete, each with the page offsets inside it."""
+        buffer = ""
+        offsets: List[Tuple[int, Any]] = []  # (offset in buffer, page number), ascending
+        metadata: Dict[str, Any] = {}
+
+        def page_index(position: int) -> int:
+            return max(bisect_right([offset for offset, _ in offsets], position) - 1, 0)
+
+        def make_unit(start: int, end: int) -> Document:
+            text = buffer[start:end]
+            unit_offsets = [(max(offset - start, 0), page) for offset, page in offsets[page_index(start):]
+                            if offset < end]
+            unit_metadata = {**metadata, "page": unit_offsets[0][1], "page_offsets": unit_offsets}
+            if self.mode == "legal":
+                unit_metadata["section"] = text.strip().split("\n", 1)[0].strip()[:120]
+            return Document(page_content=text, metadata=unit_metadata)
+
+        def flush(cuts: List[int]) -> Iterator[Document]:
+            nonlocal buffer, offsets
+            previous = 0
+            for cut in cuts:
+                if buffer[previous:cut].strip():
+                    yield make_unit(previous, cut)
+                previous = cut
+            # Keep the remainder; the page it starts on moves to offset 0
+            offsets = [(max(offset - previous, 0), page) for offset, page in offsets[page_index(previous):]]
+            buffer = buffer[previous:]
+
+        for page in pages:
+            if not metadata:
+                metadata = {k: v for k, v in page.metadata.items() if k != "page"}
+            if buffer and not buffer.endswith("\n"):
+                buffer += "\n"
+            searchable_from = len(buffer)
+            offsets.append((len(buffer), page.metadata.get("page")))
+            buffer += page.page_content
+            yield from flush(self._cut_points(buffer, searchable_from))
+
+        if buffer.strip():
+            yield make_unit(0, len(buffer))
+
+    # -------------------------------
+    # Chunks
+    # -------------------------------
+    @staticmethod
+    def page_offsets(unit: Document) -> List[Tuple[int, Any]]:
+        """(offset in the unit, page number) of every page the unit spans."""
+        return unit.metadata.get("page_offsets") or [(0, unit.metadata.get("page"))]
+
+    @staticmethod
+    def cite_pages(offsets: List[Tuple[int, Any]], start: int, end: int) -> Dict[str, Any]:
+        """The first and last page of the unit text from `start` to `end` (inclusive)."""
+        starts = [offset for offset, _ in offsets]
+        return {
+            "page": offsets[max(bisect_right(starts, start) - 1, 0)][1],
+            "page_end": offsets[max(bisect_right(starts, end) - 1, 0)][1]
+        }
+
+    def split_unit_with_starts(self, unit: Document) -> List[Tuple[Document, int]]:
+        """split_unit, with each chunk's start offset in the unit so its pages can be re-cited later."""
+        offsets = self.page_offsets(unit)
+        base = {k: v for k, v in unit.metadata.items() if k != "page_offsets"}
+
+        chunks = []
+        for chunk in self.splitter_for(len(unit.page_content)).create_documents([unit.page_content]):
+            start = chunk.metadata.pop("start_index", 0)
+            end = start + len(chunk.page_content) - 1
+            chunks.append((
+                Document(page_content=chunk.page_content, metadata={**base, **self.cite_pages(offsets, start, end)}),
+                start
+            ))
+        return chunks
+
+    def split_unit(self, unit: Document) -> List[Document]:
+        """Split one unit, citing the first and last page each chunk touches."""
+        return [chunk for chunk, _ in self.split_unit_with_starts(unit)]
+
+    def split_documents(self, pages: Iterable[Document], workers: int = 1) -> Iterator[Document]:
+        """Lazily chunk a page stream; chunks of a unit are yielded as soon as the unit is complete.
+
+        With `workers` > 1, units are still cut in this process (cheap regex work) but split
+        by a process pool, a bounded window of units at a time; chunks come out in the same
+        order as the serial path.
+        """
+        if workers <= 1:
+            for unit in self.iter_units(pages):
+                yield from self.split_unit(unit)
+            return
+
+        with process_pool(workers) as executor:
+            window = deque()
+            for unit in self.iter_units(pages):
+                window.append(executor.submit(self.split_unit, unit))
+                if len(window) >= workers * 4:
+                    yield from window.popleft().result()
+            while window:
+                yield from window.popleft().result()
@@ -1,22 +1,48 @@
 import os
 import re
-from typing import Dict, List, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
+import json
+import time
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncContextManager, Callable, Dict, List, Any, Optional, Union
+from utils.clause_segmenter import CLAUSE_BOUNDARY_PATTERN, ClauseClassifier, segment_document
+from utils.extraction_cache import ExtractionCache
+from utils.pdf_loader import load_pdf_text as read_pdf_text
+from utils.prompt_budget import PromptAssembler, count_tokens
+from utils.telemetry import Telemetry
+
+
+@asynccontextmanager
+async def _unlimited():
+    yield
+
 
 class ClauseExtractor:
     """Extracts and analyzes clauses from legal documents."""
     
-    def __init__(self, api_key: str):
-        if not api_key:
-            raise ValueError("❌ Google Gemini API key is missing!")
-        
-        self.llm = ChatGoogleGenerativeAI(
-            model="models/gemini-2.5-pro",
-            temperature=0.2,
-            google_api_key=api_key
-        )
+    # Bump whenever the extraction prompt or response parsing changes so cached results are not reused
+    PROMPT_VERSION = "2"
+    
+    def __init__(self, api_key: str = None, llm=None, chunk_chars: int = 12000, chunk_overlap: int = 800,
+                 max_workers: int = 4, chunking_threshold: int = 30000, prefilter: bool = True,
+                 offline_fallback: bool = True, cache: Optional[ExtractionCache] = None,
+                 prompts: Optional[PromptAssembler] = None, telemetry: Optional[Telemetry] = None,
+                 llm_slot: Optional[Callable[[], AsyncContextManager]] = None):
+        # A shared client (e.g. from ModelRegistry) avoids building a new one per request
+        if llm is not None:
+            self.llm = llm
+        else:
+            if not api_key:
+                raise ValueError("❌ Google Gemini API key is missing!")
+            
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            self.llm = ChatGoogleGenerativeAI(
+                model="models/gemini-2.5-pro",
+                temperature=0.2,
+                google_api_key=api_key
+            )
         
         # Common clause types in legal documents
         self.clause_types = {
@@ -31,11 +57,52 @@ class ClauseExtractor:
             "warranties": ["warranty", "guarantee", "representation", "assurance"],
             "indemnification": ["indemnify", "hold harmless", "defend", "reimburse"]
         }
-    
-    def extract_clauses_from_text(self, document_text: str) -> Dict[str, Any]:
-        """Extract clauses from document text using AI."""
         
-        prompt = f"""
+        # Documents longer than chunking_threshold characters are extracted map-reduce style:
+        # split into ~chunk_chars pieces on clause boundaries, extracted by up to max_workers
+        # concurrent calls, then merged
+        self.chunk_chars = chunk_chars
+        self.chunk_overlap = chunk_overlap
+        self.max_workers = max_workers
+        self.chunking_threshold = chunking_threshold
+        
+        # Local keyword pre-pass: only typed segments are sent to the model, and a
+        # keyword-only result is returned when the model call fails
+        self.classifier = ClauseClassifier(self.clause_types)
+        self.prefilter = prefilter
+        self.offline_fallback = offline_fallback
+        
+        # Optional persistent cache of extraction results keyed by document content
+        self.cache = cache
+        
+        # Token budget and logging for comparison prompts
+        self.prompts = prompts or PromptAssembler()
+        
+        # Stage spans, token counts and errors (shared with the app's /metrics when passed in)
+        self.telemetry = telemetry or Telemetry()
+        
+        # Entered around every async model call (e.g. the app's "llm" stage limit), so a
+        # chunked extraction takes one slot per in-flight chunk rather than one per document
+        self.llm_slot = llm_slot or _unlimited
+    
+    def _invoke(self, prompt: str, purpose: str):
+        """One model call, timed as a span and counted in the token metrics."""
+        with self.telemetry.span("llm_generate", purpose=purpose):
+            response = self.llm.invoke(prompt)
+            self.telemetry.llm_usage(purpose, response, count_tokens(prompt))
+        return response
+    
+    async def _ainvoke(self, prompt: str, purpose: str):
+        """Async variant of _invoke, holding an llm_slot for the duration of the call."""
+        async with self.llm_slot():
+            with self.telemetry.span("llm_generate", purpose=purpose):
+                response = await self.llm.ainvoke(prompt)
+                self.telemetry.llm_usage(purpose, response, count_tokens(prompt))
+        return response
+    
+    def _build_extraction_prompt(self, document_text: str) -> str:
+        """Build the clause extraction prompt for a document."""
+        return f"""
         You are a legal document analysis expert. Analyze the following legal document and extract key clauses.
         
         For each clause found, provide the information in this EXACT format:
@@ -57,39 +124,296 @@ class ClauseExtractor:
         - Use simple sentences and avoid excessive formatting
         - Focus on the most important and legally significant clauses
         """
+
+    def _build_extraction_result(self, response) -> Dict[str, Any]:
+        """Parse the model response into the clauses/summary/total_clauses schema."""
+        analysis = response.content if hasattr(response, 'content') else str(response)
         
-        try:
-            response = self.llm.invoke(prompt)
-            analysis = response.content if hasattr(response, 'content') else str(response)
-            
-            # Parse the AI response and structure it
+        # Parse the AI response and structure it
+        with self.telemetry.span("parse_response"):
             structured_clauses = self._parse_ai_response(analysis)
+        
+        return {
+            "clauses": structured_clauses,
+            "summary": self._generate_clause_summary(structured_clauses),
+            "total_clauses": len(structured_clauses)
+        }
+
+    def extraction_cache_key(self, document_text: str) -> str:
+        """Cache key for a document under the current prompt version, settings and model."""
+        settings = f"v{self.PROMPT_VERSION}|prefilter={self.prefilter}|chunk={self.chunk_chars}/{self.chunk_overlap}"
+        model = getattr(self.llm, "model", type(self.llm).__name__)
+        return ExtractionCache.make_key(document_text, settings, str(model))
+
+    def _store_in_cache(self, key: str, result: Dict[str, Any]) -> None:
+        # Failures, keyword-only fallbacks and partial chunked results are not worth keeping
+        if self.cache is not None and "error" not in result and not result.get("offline") and not result.get("partial"):
+            self.cache.put(key, result)
+
+    def extract_clauses_from_text(self, document_text: str, chunked: Optional[bool] = None) -> Dict[str, Any]:
+        """Extract clauses from document text using AI.
+
+        Long documents go through extract_clauses_chunked unless `chunked` says otherwise.
+        """
+        if self.cache is None:
+            return self._extract_clauses_uncached(document_text, chunked)
+
+        key = self.extraction_cache_key(document_text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        result = self._extract_clauses_uncached(document_text, chunked)
+        self._store_in_cache(key, result)
+        return result
+
+    async def aextract_clauses_from_text(self, document_text: str, chunked: Optional[bool] = None) -> Dict[str, Any]:
+        """Async variant of extract_clauses_from_text using the model's native async API."""
+        if self.cache is None:
+            return await self._aextract_clauses_uncached(document_text, chunked)
+
+        key = self.extraction_cache_key(document_text)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return cached
+        result = await self._aextract_clauses_uncached(document_text, chunked)
+        await asyncio.to_thread(self._store_in_cache, key, result)
+        return result
+
+    def _extract_clauses_uncached(self, document_text: str, chunked: Optional[bool]) -> Dict[str, Any]:
+        llm_text = self._prepare_llm_text(document_text)
+        if self._should_chunk(llm_text, chunked):
+            return self._with_offline_fallback(self.extract_clauses_chunked(llm_text), document_text)
+
+        try:
+            response = self._invoke(self._build_extraction_prompt(llm_text), "extract_clauses")
+            return self._build_extraction_result(response)
             
-            return {
-                "clauses": structured_clauses,
-                "summary": self._generate_clause_summary(structured_clauses),
-                "total_clauses": len(structured_clauses)
-            }
+        except Exception as e:
+            print(f"❌ Error in clause extraction: {e}")
+            self.telemetry.error("clause_extraction", e)
+            return self._with_offline_fallback({"error": f"Failed to extract clauses: {str(e)}"}, document_text)
+
+    async def _aextract_clauses_uncached(self, document_text: str, chunked: Optional[bool]) -> Dict[str, Any]:
+        llm_text = self._prepare_llm_text(document_text)
+        if self._should_chunk(llm_text, chunked):
+            return self._with_offline_fallback(await self.aextract_clauses_chunked(llm_text), document_text)
+
+        try:
+            response = await self._ainvoke(self._build_extraction_prompt(llm_text), "extract_clauses")
+            return self._build_extraction_result(response)
             
         except Exception as e:
             print(f"❌ Error in clause extraction: {e}")
-            return {"error": f"Failed to extract clauses: {str(e)}"}
+            self.telemetry.error("clause_extraction", e)
+            return self._with_offline_fallback({"error": f"Failed to extract clauses: {str(e)}"}, document_text)
+
+    def preclassify(self, document_text: str) -> List[Dict[str, Any]]:
+        """Segment a document into clauses/sections and tag each with its likely clause types."""
+        return self.classifier.classify_segments(segment_document(document_text))
+
+    def _prepare_llm_text(self, document_text: str) -> str:
+        """Reduce a document to its typed segments, labelled with their likely types."""
+        if not self.prefilter:
+            return document_text
+
+        with self.telemetry.span("prefilter", chars=len(document_text)):
+            segments = self.preclassify(document_text)
+        typed = [segment for segment in segments if segment["types"]]
+        # Unstructured text (or nothing recognisable) is sent as-is
+        if len(segments) < 3 or not typed:
+            return document_text
+
+        return "\n\n".join(
+            f"[Likely type: {', '.join(segment['types'][:3])}]\n{segment['text']}" for segment in typed
+        )
+
+    def extract_clauses_offline(self, document_text: str, reason: Optional[str] = None) -> Dict[str, Any]:
+        """Keyword-only clause extraction that needs no model call."""
+        clauses = []
+        for segment in self.preclassify(document_text):
+            if not segment["types"]:
+                continue
+            primary, *others = segment["types"]
+            clauses.append({
+                "type": primary.replace("_", " ").title(),
+                "text": self._truncate(segment["text"], 1500),
+                "key_points": f"Also relevant to: {', '.join(t.replace('_', ' ') for t in others)}" if others else "Not specified",
+                "risk_level": "Not assessed",
+                "analysis": "Identified by local keyword classification; AI risk analysis was not run."
+            })
+
+        result = {
+            "clauses": clauses,
+            "summary": self._generate_clause_summary(clauses),
+            "total_clauses": len(clauses),
+            "offline": True
+        }
+        if reason:
+            result["warning"] = f"AI extraction unavailable ({reason}); returned keyword-based classification."
+        return result
+
+    def _with_offline_fallback(self, result: Dict[str, Any], document_text: str) -> Dict[str, Any]:
+        if "error" in result and self.offline_fallback:
+            return self.extract_clauses_offline(document_text, reason=result["error"])
+        return result
     
+    def _should_chunk(self, document_text: str, chunked: Optional[bool]) -> bool:
+        if chunked is None:
+            return len(document_text) > self.chunking_threshold
+        return chunked
+
+    def split_into_chunks(self, document_text: str) -> List[str]:
+        """Split a document into chunks of at most ~chunk_chars, cutting on clause boundaries.
+
+        Each chunk after the first is prefixed with the last chunk_overlap characters of
+        the previous one so a clause straddling a cut is seen whole by at least one call.
+        """
+        if len(document_text) <= self.chunk_chars:
+            return [document_text]
+
+        boundaries = [m.start() for m in CLAUSE_BOUNDARY_PATTERN.finditer(document_text)]
+        chunks = []
+        start = 0
+        while start < len(document_text):
+            limit = start + self.chunk_chars
+            if limit >= len(document_text):
+                end = len(document_text)
+            else:
+                # Prefer the last clause heading in the window, then a paragraph break, then a hard cut
+                candidates = [b for b in boundaries if start + self.chunk_chars // 2 < b <= limit]
+                if candidates:
+                    end = candidates[-1]
+                else:
+                    paragraph = document_text.rfind("\n\n", start + self.chunk_chars // 2, limit)
+                    end = paragraph if paragraph != -1 else limit
+
+            overlap_start = max(0, start - self.chunk_overlap) if chunks else start
+            chunks.append(document_text[overlap_start:end])
+            start = end
+        return chunks
+
+    def _timed_chunk_result(self, index: int, chunk: str, started: float, response=None, error=None) -> Dict[str, Any]:
+        timing = {"chunk": index, "chars": len(chunk), "seconds": round(time.perf_counter() - started, 3)}
+        if error is not None:
+            print(f"❌ Error extracting clauses from chunk {index}: {error}")
+            self.telemetry.error("clause_extraction_chunk", error)
+            timing["error"] = str(error)
+            return {"clauses": [], "timing": timing}
+
+        analysis = response.content if hasattr(response, 'content') else str(response)
+        with self.telemetry.span("parse_response", chunk=index):
+            clauses = self._parse_ai_response(analysis)
+        timing["clauses"] = len(clauses)
+        return {"clauses": clauses, "timing": timing}
+
+    def _extract_chunk(self, index: int, chunk: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            response = self._invoke(self._build_extraction_prompt(chunk), "extract_clauses")
+        except Exception as e:
+            return self._timed_chunk_result(index, chunk, started, error=e)
+        return self._timed_chunk_result(index, chunk, started, response=response)
+
+    async def _aextract_chunk(self, index: int, chunk: str, semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await self._ainvoke(self._build_extraction_prompt(chunk), "extract_clauses")
+            except Exception as e:
+                return self._timed_chunk_result(index, chunk, started, error=e)
+            return self._timed_chunk_result(index, chunk, started, response=response)
+
+    def _merge_chunk_results(self, chunk_results: List[Dict[str, Any]], started: float) -> Dict[str, Any]:
+        timings = [result["timing"] for result in chunk_results]
+        if all("error" in timing for timing in timings):
+            return {"error": f"Failed to extract clauses: {timings[0]['error']}", "chunk_timings": timings}
+
+        clauses = self._deduplicate_clauses([clause for result in chunk_results for clause in result["clauses"]])
+        merged = {
+            "clauses": clauses,
+            "summary": self._generate_clause_summary(clauses),
+            "total_clauses": len(clauses),
+            "chunk_timings": timings,
+            "total_seconds": round(time.perf_counter() - started, 3)
+        }
+        # Clauses from failed chunks are missing, so the result must not be mistaken for a full one
+        failed = [timing["chunk"] for timing in timings if "error" in timing]
+        if failed:
+            merged["partial"] = True
+            merged["warning"] = (f"Extraction failed for {len(failed)} of {len(timings)} chunks "
+                                 f"({', '.join(map(str, failed))}); some clauses may be missing.")
+        return merged
+
+    @staticmethod
+    def _clause_signature(clause: Dict[str, Any]) -> tuple:
+        clause_type = re.sub(r'\W+', ' ', clause.get('type', '').lower()).strip()
+        text = re.sub(r'\W+', ' ', clause.get('text', '').lower()).strip()
+        return clause_type, text
+
+    def _deduplicate_clauses(self, clauses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop clauses extracted twice from chunk overlaps (same type, same or contained text)."""
+        kept: List[Dict[str, Any]] = []
+        signatures: List[tuple] = []
+        for clause in clauses:
+            clause_type, text = self._clause_signature(clause)
+            duplicate = False
+            for i, (kept_type, kept_text) in enumerate(signatures):
+                if clause_type != kept_type or not text or not kept_text:
+                    continue
+                if text in kept_text:
+                    duplicate = True
+                    break
+                if kept_text in text:
+                    # Keep the more complete copy of the clause
+                    kept[i] = clause
+                    signatures[i] = (clause_type, text)
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(clause)
+                signatures.append((clause_type, text))
+        return kept
+
+    def extract_clauses_chunked(self, document_text: str, max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """Map-reduce clause extraction: extract chunks concurrently, then merge and deduplicate."""
+        started = time.perf_counter()
+        chunks = self.split_into_chunks(document_text)
+        # One copy of the caller's context per chunk keeps the chunk spans in the caller's trace
+        contexts = [contextvars.copy_context() for _ in chunks]
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            chunk_results = list(executor.map(
+                lambda context, index, chunk: context.run(self._extract_chunk, index, chunk),
+                contexts, range(len(chunks)), chunks
+            ))
+        return self._merge_chunk_results(chunk_results, started)
+
+    async def aextract_clauses_chunked(self, document_text: str, max_workers: Optional[int] = None) -> Dict[str, Any]:
+        """Async variant of extract_clauses_chunked."""
+        started = time.perf_counter()
+        chunks = self.split_into_chunks(document_text)
+        semaphore = asyncio.Semaphore(max_workers or self.max_workers)
+        chunk_results = await asyncio.gather(
+            *(self._aextract_chunk(i, chunk, semaphore) for i, chunk in enumerate(chunks))
+        )
+        return self._merge_chunk_results(list(chunk_results), started)
+
+    @staticmethod
+    def load_pdf_text(pdf_source: Union[str, bytes]) -> str:
+        """Load a PDF (path or in-memory bytes) and join all of its pages into one string."""
+        return read_pdf_text(pdf_source)
+
     def extract_clauses_from_pdf(self, pdf_path: str) -> Dict[str, Any]:
         """Extract clauses from a PDF file."""
         try:
-            # Load PDF
-            loader = PyPDFLoader(pdf_path)
-            documents = loader.load()
-            
-            # Combine all pages
-            full_text = "\n\n".join([doc.page_content for doc in documents])
+            # Load PDF and combine all pages
+            full_text = self.load_pdf_text(pdf_path)
             
             # Extract clauses
             return self.extract_clauses_from_text(full_text)
             
         except Exception as e:
             print(f"❌ Error processing PDF: {e}")
+            self.telemetry.error("pdf_parse", e)
             return {"error": f"Failed to process PDF: {str(e)}"}
     
     def _parse_ai_response(self, ai_response: str) -> List[Dict[str, Any]]:
@@ -241,35 +565,86 @@ class ClauseExtractor:
         
         return risk_analysis
     
-    def compare_clauses(self, document1_clauses: List[Dict], document2_clauses: List[Dict]) -> Dict[str, Any]:
-        """Compare clauses between two documents."""
-        
-        comparison_prompt = f"""
+    @staticmethod
+    def _truncate(text: str, limit: int) -> str:
+        text = re.sub(r'\s+', ' ', text or '').strip()
+        return text if len(text) <= limit else text[:limit].rsplit(' ', 1)[0] + "..."
+
+    def group_clauses_by_type(self, clauses: List[Dict[str, Any]], text_limit: int = 400) -> Dict[str, List[Dict[str, str]]]:
+        """Compact view of extracted clauses for comparison prompts, grouped by clause type."""
+        grouped: Dict[str, List[Dict[str, str]]] = {}
+        for clause in clauses:
+            clause_type = clause.get('type', 'Unknown').strip() or 'Unknown'
+            entry = {
+                "text": self._truncate(clause.get('text', ''), text_limit),
+                "risk": clause.get('risk_level', 'Unknown')
+            }
+            key_points = clause.get('key_points')
+            if key_points and key_points != 'Not specified':
+                entry["key_points"] = self._truncate(key_points, text_limit // 2)
+            grouped.setdefault(clause_type, []).append(entry)
+        return grouped
+
+    def _build_comparison_prompt(self, document1_clauses: List[Dict], document2_clauses: List[Dict]) -> str:
+        # Clause texts are shortened until the prompt fits the comparison budget
+        budget = self.prompts.budget("compare_clauses")
+        text_limit = 400
+        while True:
+            prompt = self._comparison_prompt(document1_clauses, document2_clauses, text_limit)
+            if text_limit <= 50 or count_tokens(prompt) <= budget:
+                break
+            text_limit //= 2
+        self.prompts.record("compare_clauses", prompt)
+        return prompt
+
+    def _comparison_prompt(self, document1_clauses: List[Dict], document2_clauses: List[Dict], text_limit: int) -> str:
+        # Compact JSON grouped by clause type keeps the prompt small and lines up matching clauses
+        document1_json = json.dumps(self.group_clauses_by_type(document1_clauses, text_limit), separators=(',', ':'), ensure_ascii=False)
+        document2_json = json.dumps(self.group_clauses_by_type(document2_clauses, text_limit), separators=(',', ':'), ensure_ascii=False)
+        return f"""
         Compare the following clauses from two different legal documents and provide:
         1. Common clause types
         2. Differences in terms
         3. Risk comparison
         4. Recommendations for alignment
         
+        Clauses are given as JSON grouped by clause type.
+        
         Document 1 Clauses:
-        {document1_clauses}
+        {document1_json}
         
         Document 2 Clauses:
-        {document2_clauses}
+        {document2_json}
         
         Provide a detailed comparison analysis.
         """
+
+    def _build_comparison_result(self, response, document1_clauses: List[Dict], document2_clauses: List[Dict]) -> Dict[str, Any]:
+        analysis = response.content if hasattr(response, 'content') else str(response)
+        cleaned_analysis = self._clean_ai_response(analysis)
         
+        return {
+            "comparison_analysis": cleaned_analysis,
+            "doc1_clause_count": len(document1_clauses),
+            "doc2_clause_count": len(document2_clauses)
+        }
+
+    def compare_clauses(self, document1_clauses: List[Dict], document2_clauses: List[Dict]) -> Dict[str, Any]:
+        """Compare clauses between two documents."""
         try:
-            response = self.llm.invoke(comparison_prompt)
-            analysis = response.content if hasattr(response, 'content') else str(response)
-            cleaned_analysis = self._clean_ai_response(analysis)
+            response = self._invoke(self._build_comparison_prompt(document1_clauses, document2_clauses), "compare_clauses")
+            return self._build_comparison_result(response, document1_clauses, document2_clauses)
             
-            return {
-                "comparison_analysis": cleaned_analysis,
-                "doc1_clause_count": len(document1_clauses),
-                "doc2_clause_count": len(document2_clauses)
-            }
+        except Exception as e:
+            self.telemetry.error("clause_comparison", e)
+            return {"error": f"Failed to compare clauses: {str(e)}"}
+
+    async def acompare_clauses(self, document1_clauses: List[Dict], document2_clauses: List[Dict]) -> Dict[str, Any]:
+        """Async variant of compare_clauses."""
+        try:
+            response = await self._ainvoke(self._build_comparison_prompt(document1_clauses, document2_clauses), "compare_clauses")
+            return self._build_comparison_result(response, document1_clauses, document2_clauses)
             
         except Exception as e:
+            self.telemetry.error("clause_comparison", e)
             return {"error": f"Failed to compare clauses: {str(e)}"}
@@ -0,0 +1,94 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Any, Tuple
+
+# Lines that open a new clause/section: "Article 5", "SECTION 12", "Clause 3.1", "7.", "7.2)", "IV."
+CLAUSE_BOUNDARY_PATTERN = re.compile(
+    r'^[ \t]*(?:(?:article|section|clause|schedule|annexure)\s+[\dIVXLCivxlc]+|\d+(?:\.\d+)*[.)]\s|[IVXLC]+\.\s)',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Short all-caps lines such as "CONFIDENTIALITY" or "GOVERNING LAW AND JURISDICTION"
+CAPS_HEADING_PATTERN = re.compile(r'^[ \t]*[A-Z][A-Z0-9 ,&/\'()-]{2,60}[ \t]*$', re.MULTILINE)
+
+# Segments shorter than this are merged into the following one (stray headings, page numbers)
+MIN_SEGMENT_CHARS = 40
+
+
+def segment_document(text: str) -> List[Dict[str, Any]]:
+    """Split a document into numbered clauses/sections using heading heuristics."""
+    starts = {m.start() for m in CLAUSE_BOUNDARY_PATTERN.finditer(text)}
+    starts.update(m.start() for m in CAPS_HEADING_PATTERN.finditer(text))
+    starts.add(0)
+    starts = sorted(starts)
+
+    segments = []
+    carry_start = None
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        if carry_start is not None:
+            start = carry_start
+        body = text[start:end].strip()
+        if not body:
+            carry_start = None
+            continue
+        if len(body) < MIN_SEGMENT_CHARS and end < len(text):
+            carry_start = start
+            continue
+        carry_start = None
+
+        heading = body.split("\n", 1)[0].strip()
+        segments.append({
+            "index": len(segments),
+            "heading": heading[:120],
+            "text": body,
+            "start": start,
+            "end": end
+        })
+    return segments
+
+
+@lru_cache(maxsize=16)
+def _compile_keyword_matcher(keyword_items: Tuple[Tuple[str, Tuple[str, ...]], ...]):
+    """One combined, case-insensitive regex over every keyword, plus a keyword -> types map."""
+    keyword_types: Dict[str, List[str]] = {}
+    for clause_type, keywords in keyword_items:
+        for keyword in keywords:
+            keyword_types.setdefault(keyword.lower(), []).append(clause_type)
+
+    # Longest keywords first so "intellectual property" wins over "property"-like prefixes
+    alternatives = sorted(keyword_types, key=len, reverse=True)
+    pattern = re.compile(
+        r'\b(?:' + '|'.join(re.escape(keyword).replace(' ', r'\s+') for keyword in alternatives) + r')\b',
+        re.IGNORECASE
+    )
+    return pattern, keyword_types
+
+
+class ClauseClassifier:
+    """Classifies text segments against a clause-type keyword map with a single compiled regex."""
+
+    # Keywords found in a segment's heading count this many times more than body hits
+    HEADING_WEIGHT = 3
+
+    def __init__(self, clause_types: Dict[str, List[str]]):
+        key = tuple((clause_type, tuple(keywords)) for clause_type, keywords in clause_types.items())
+        self.pattern, self.keyword_types = _compile_keyword_matcher(key)
+
+    def score(self, text: str, heading: str = "") -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        for source, weight in ((heading, self.HEADING_WEIGHT), (text, 1)):
+            for match in self.pattern.finditer(source):
+                keyword = re.sub(r'\s+', ' ', match.group(0).lower())
+                for clause_type in self.keyword_types.get(keyword, []):
+                    scores[clause_type] = scores.get(clause_type, 0) + weight
+        return scores
+
+    def classify_segments(self, segments: List[Dict[str, Any]], min_score: float = 1) -> List[Dict[str, Any]]:
+        """Annotate segments with their likely clause types; untyped segments get an empty list."""
+        classified = []
+        for segment in segments:
+            scores = self.score(segment["text"], segment["heading"])
+            types = sorted((t for t, s in scores.items() if s >= min_score), key=lambda t: -scores[t])
+            classified.append({**segment, "types": types, "scores": scores})
+        return classified
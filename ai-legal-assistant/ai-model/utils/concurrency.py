@@ -0,0 +1,94 @@
+import os
+import asyncio
+import contextvars
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional, Any
+
+# Default number of requests allowed inside each pipeline stage at once.
+# Override per stage with STAGE_LIMIT_<STAGE>, e.g. STAGE_LIMIT_LLM=64.
+DEFAULT_STAGE_LIMITS = {
+    "llm": 32,     # Gemini chat calls (native async)
+    "embed": 16,   # Embedding calls and index builds that embed chunks
+    "pdf": 4,      # PDF parsing and chunking (CPU-bound)
+    "faiss": 8,    # FAISS load/search/merge (CPU-bound)
+}
+
+
+def _process_context():
+    """"forkserver" where the platform has it, else "spawn"; never a plain fork."""
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    # Imported once by the fork server, so each worker starts without re-importing them
+    context.set_forkserver_preload(["utils.pdf_loader", "utils.chunking"])
+    return context
+
+
+def process_pool(max_workers: int, **kwargs) -> ProcessPoolExecutor:
+    """A process pool that is safe to start from a worker thread.
+
+    Workers are not forked from the app itself: it starts pools from the ingestion
+    queue and StagePool threads, and a child forked while another thread holds a
+    lock (in logging, a C library's allocator, ...) can deadlock on it. They come
+    from a single-threaded fork server instead, or are spawned where there is none.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=_process_context(), **kwargs)
+
+
+class StagePool:
+    """Bounded thread pool for blocking work plus a concurrency limit per pipeline stage."""
+
+    def __init__(self, max_workers: Optional[int] = None, limits: Optional[Dict[str, int]] = None):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.limits = dict(DEFAULT_STAGE_LIMITS)
+        if limits:
+            self.limits.update(limits)
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_env(cls) -> "StagePool":
+        limits = {}
+        for stage in DEFAULT_STAGE_LIMITS:
+            value = os.environ.get(f"STAGE_LIMIT_{stage.upper()}")
+            if value:
+                limits[stage] = int(value)
+        workers = os.environ.get("EXECUTOR_WORKERS")
+        return cls(max_workers=int(workers) if workers else None, limits=limits)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage")
+        return self._executor
+
+    def _semaphore(self, stage: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(stage)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limits.get(stage, self.max_workers))
+            self._semaphores[stage] = semaphore
+        return semaphore
+
+    @asynccontextmanager
+    async def limit(self, stage: str):
+        """Hold a slot in `stage` for the duration of a native async call."""
+        async with self._semaphore(stage):
+            yield
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable in the bounded executor, within `stage`'s limit."""
+        async with self._semaphore(stage):
+            loop = asyncio.get_running_loop()
+            # The caller's context (e.g. its telemetry span) carries over into the worker thread
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self.executor, partial(context.run, fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._semaphores.clear()
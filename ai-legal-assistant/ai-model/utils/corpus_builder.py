@@ -0,0 +1,315 @@
+import os
+import json
+import hashlib
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from utils.chunking import ChunkingEngine
+from utils.pdf_loader import iter_pdf_pages
+from utils.index_factory import apply_index_spec
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+MANIFEST_FILE = "manifest.json"
+UNITS_DIR = "units"  # Per-unit checkpoints: <key>.npy (vectors) + <key>.json (chunks, written last)
+MANIFEST_VERSION = 3
+# Index type of stores whose manifest predates index options
+FLAT_INDEX_SPEC = {"type": "flat", "params": {}}
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(corpus_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(corpus_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class CorpusBuilder:
+    """Incremental, resumable build of one predefined corpus' vectorstore.
+
+    A manifest in the corpus directory records the source PDF hash, the chunker
+    parameters and the embedding model, plus a key per chunking unit (a section
+    or a run of paragraphs, see ChunkingEngine). Chunks and vectors are
+    checkpointed per unit under `units/`, keyed by the unit's text and the
+    build parameters, so an interrupted build resumes with the units it has not
+    yet embedded and a changed PDF only re-chunks and re-embeds the units whose
+    text changed. Page numbers are not part of the key: a reused unit's chunks
+    are re-cited against the pages the unit sits on now, so inserting a page
+    early in the PDF does not re-embed everything after it.
+
+    The store's FAISS index type (see index_factory) is recorded too; changing
+    it re-assembles the index from the checkpoints without embedding anything.
+    """
+
+    def __init__(
+        self,
+        corpus_dir: str,
+        source_path: str,
+        embeddings,
+        embedding_model: str,
+        chunker: ChunkingEngine,
+        batch_size: int = 64,
+        extra_metadata: Optional[Dict[str, Any]] = None,
+        pipeline=None,
+        index_spec: Optional[Dict[str, Any]] = None
+    ):
+        self.corpus_dir = corpus_dir
+        self.source_path = source_path
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.chunker = chunker
+        # Normalised through JSON so it compares equal to the copy read back from the manifest
+        self.chunker_params = json.loads(json.dumps(chunker.params))
+        # An EmbeddingPipeline embeds batches concurrently under its rate limit
+        self.pipeline = pipeline
+        self.batch_size = pipeline.batch_size if pipeline is not None else batch_size
+        self.extra_metadata = extra_metadata or {}
+        self.index_spec = json.loads(json.dumps(index_spec or FLAT_INDEX_SPEC))
+        self.index_info: Optional[Dict[str, Any]] = None
+        self.units_dir = os.path.join(corpus_dir, UNITS_DIR)
+
+        self._source_hash: Optional[str] = None
+        self._units: List[Dict[str, Any]] = []
+        # Page offsets of each entry of _units in the current PDF (kept out of the manifest)
+        self._unit_offsets: List[List] = []
+        self.stats = self._empty_stats()
+
+    @property
+    def source_hash(self) -> str:
+        if self._source_hash is None:
+            self._source_hash = file_sha256(self.source_path)
+        return self._source_hash
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, int]:
+        return {"pages": 0, "units": 0, "units_reused": 0, "units_embedded": 0, "chunks": 0}
+
+    def _build_params(self) -> Dict[str, Any]:
+        return {"chunker": self.chunker_params, "embedding_model": self.embedding_model}
+
+    def has_index(self) -> bool:
+        return os.path.exists(os.path.join(self.corpus_dir, "index.faiss"))
+
+    def _content_is_current(self, manifest: Optional[Dict[str, Any]]) -> bool:
+        if not manifest or not manifest.get("complete") or not self.has_index():
+            return False
+        if not os.path.exists(self.source_path):
+            # Nothing to compare against; keep serving what was built
+            return True
+        return (
+            manifest.get("source_hash") == self.source_hash
+            and manifest.get("chunker") == self.chunker_params
+            and manifest.get("embedding_model") == self.embedding_model
+        )
+
+    def is_current(self) -> bool:
+        """Whether the persisted store is a finished build of the current PDF with the current parameters."""
+        manifest = read_manifest(self.corpus_dir)
+        return self._content_is_current(manifest) and manifest.get("index", FLAT_INDEX_SPEC) == self.index_spec
+
+    def needs_reindex(self) -> bool:
+        """Whether only the index type changed and the store has to be re-indexed from its own vectors
+        (it has no unit checkpoints to re-assemble from, or its PDF is gone)."""
+        manifest = read_manifest(self.corpus_dir)
+        return (
+            self._content_is_current(manifest)
+            and manifest.get("index", FLAT_INDEX_SPEC) != self.index_spec
+            and (not manifest.get("units") or not os.path.exists(self.source_path))
+        )
+
+    def commit_index(self) -> None:
+        """Record the current index type for a store that was re-indexed in place."""
+        manifest = read_manifest(self.corpus_dir) or {}
+        manifest["index"] = self.index_spec
+        write_json_atomic(os.path.join(self.corpus_dir, MANIFEST_FILE), manifest)
+
+    def adopt_existing(self) -> bool:
+        """Write a manifest for a complete store built before manifests existed.
+
+        Such a store has no unit checkpoints, so the next change to its PDF
+        rebuilds it in full. Returns False if the store is incomplete.
+        """
+        if read_manifest(self.corpus_dir) is not None or not self.has_index():
+            return False
+        if not os.path.exists(os.path.join(self.corpus_dir, "index.pkl")):
+            return False
+        self._write_manifest(complete=True, units=[], adopted=True)
+        return True
+
+    def _unit_key(self, unit: Document) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps(self._build_params(), sort_keys=True).encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(unit.page_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _unit_paths(self, key: str):
+        base = os.path.join(self.units_dir, key)
+        return f"{base}.npy", f"{base}.json"
+
+    def _has_checkpoint(self, key: str) -> bool:
+        return os.path.exists(self._unit_paths(key)[1])
+
+    def _write_checkpoint(self, key: str, offsets: List, chunks: List[tuple], vectors: List[List[float]]) -> None:
+        """Persist a unit's (chunk, start offset) pairs and vectors, with the page offsets they were cited from."""
+        vectors_path, chunks_path = self._unit_paths(key)
+        tmp_path = f"{vectors_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(vectors, dtype=np.float32))
+        os.replace(tmp_path, vectors_path)
+        # The chunk file is the commit point of a unit checkpoint
+        write_json_atomic(chunks_path, {
+            "page_offsets": offsets,
+            "chunks": [{"text": c.page_content, "start": start, "metadata": c.metadata} for c, start in chunks]
+        })
+
+    def _read_checkpoint(self, key: str, offsets: List):
+        """A unit's chunks and vectors, with each chunk's pages re-cited from the unit's current `offsets`."""
+        vectors_path, chunks_path = self._unit_paths(key)
+        with open(chunks_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        chunks = checkpoint["chunks"]
+        if checkpoint["page_offsets"] != offsets:
+            for chunk in chunks:
+                end = chunk["start"] + len(chunk["text"]) - 1
+                chunk["metadata"].update(self.chunker.cite_pages(offsets, chunk["start"], end))
+        vectors = np.load(vectors_path) if chunks else np.zeros((0, 0), dtype=np.float32)
+        return chunks, vectors
+
+    def _write_manifest(self, complete: bool, units: List[Dict[str, Any]], adopted: bool = False) -> None:
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "source_path": self.source_path,
+            "source_hash": self.source_hash if os.path.exists(self.source_path) else None,
+            "chunker": self.chunker_params,
+            "embedding_model": self.embedding_model,
+            "index": self.index_spec,
+            "complete": complete,
+            "units": units
+        }
+        if adopted:
+            manifest["adopted"] = True
+        write_json_atomic(os.path.join(self.corpus_dir, MANIFEST_FILE), manifest)
+
+    def _counted(self, pages: Iterator[Document]) -> Iterator[Document]:
+        for page in pages:
+            self.stats["pages"] += 1
+            yield page
+
+    def _pending_batches(self, pages: Iterator[Document]) -> Iterator[List[tuple]]:
+        """Cut the page stream into units, skip checkpointed ones, and group the chunks of the
+        rest into batches of whole units with at most `batch_size` chunks."""
+        batch: List[tuple] = []
+        batch_chunks = 0
+        queued = set()
+        for unit in self.chunker.iter_units(self._counted(pages)):
+            key = self._unit_key(unit)
+            # Round-tripped through JSON so it compares equal to the copy in a checkpoint
+            offsets = json.loads(json.dumps(self.chunker.page_offsets(unit), default=str))
+            self._units.append({"page": unit.metadata.get("page"), "key": key})
+            self._unit_offsets.append(offsets)
+            self.stats["units"] += 1
+            # A repeated unit (e.g. the same boilerplate on several pages) is embedded once
+            if key in queued or self._has_checkpoint(key):
+                self.stats["units_reused"] += 1
+                continue
+
+            queued.add(key)
+            chunks = self.chunker.split_unit_with_starts(unit)
+            if batch and batch_chunks + len(chunks) > self.batch_size:
+                yield batch
+                batch, batch_chunks = [], 0
+            batch.append((key, offsets, chunks))
+            batch_chunks += len(chunks)
+        if batch:
+            yield batch
+
+    def _checkpoint_batch(self, batch: List[tuple], vectors: List[List[float]]) -> None:
+        offset = 0
+        for unit_key, unit_offsets, unit_chunks in batch:
+            self._write_checkpoint(unit_key, unit_offsets, unit_chunks, vectors[offset:offset + len(unit_chunks)])
+            offset += len(unit_chunks)
+        self.stats["units_embedded"] += len(batch)
+
+    def _embed_pending(self, pages: Iterator[Document]) -> None:
+        """Embed units that have no checkpoint yet, checkpointing every batch as soon as its vectors arrive.
+
+        Pages are consumed lazily, so embedding starts while the rest of the PDF is still being parsed.
+        """
+        batches: List[List[tuple]] = []
+
+        def text_batches():
+            for batch in self._pending_batches(pages):
+                batches.append(batch)
+                texts = [c.page_content for _, _, unit_chunks in batch for c, _ in unit_chunks]
+                if not texts:
+                    # Units without any chunk complete without an embedding request
+                    self._checkpoint_batch(batch, [])
+                yield texts
+
+        if self.pipeline is not None:
+            for index, vectors in self.pipeline.run(text_batches()):
+                self._checkpoint_batch(batches[index], vectors)
+        else:
+            for texts in text_batches():
+                if texts:
+                    self._checkpoint_batch(batches[-1], self.embeddings.embed_documents(texts))
+
+    def build(self) -> Optional["FAISS"]:
+        """Bring the unit checkpoints up to date with the PDF and assemble an in-memory FAISS store.
+
+        The caller persists the store and then calls commit(); until then the
+        manifest is marked incomplete so a crash never leaves a build that looks cached.
+        """
+        from langchain_community.vectorstores import FAISS
+
+        os.makedirs(self.units_dir, exist_ok=True)
+        self._write_manifest(complete=False, units=[])
+
+        self._units = []
+        self._unit_offsets = []
+        self.stats = self._empty_stats()
+        self._embed_pending(iter_pdf_pages(self.source_path))
+
+        text_embeddings, metadatas = [], []
+        for unit, offsets in zip(self._units, self._unit_offsets):
+            chunks, vectors = self._read_checkpoint(unit["key"], offsets)
+            for chunk, vector in zip(chunks, vectors):
+                text_embeddings.append((chunk["text"], vector.tolist()))
+                metadatas.append({**chunk["metadata"], **self.extra_metadata})
+        self.stats["chunks"] = len(text_embeddings)
+        if not text_embeddings:
+            return None
+        vectorstore = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas)
+        self.index_info = apply_index_spec(vectorstore, self.index_spec)
+        return vectorstore
+
+    def commit(self) -> None:
+        """Mark the build complete and drop checkpoints of units that no longer exist."""
+        self._write_manifest(complete=True, units=self._units)
+
+        live = {unit["key"] for unit in self._units}
+        for name in os.listdir(self.units_dir):
+            key = name.split(".", 1)[0]
+            if key not in live:
+                try:
+                    os.remove(os.path.join(self.units_dir, name))
+                except OSError:
+                    pass
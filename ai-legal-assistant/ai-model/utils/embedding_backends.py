@@ -0,0 +1,285 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+except ImportError:
+    # Only the local backend needs them: pip install onnxruntime tokenizers
+    ort = None
+    Tokenizer = None
+
+EMBEDDING_INFO_FILE = "embeddings.json"  # Backend and model the store's vectors came from, next to index.faiss
+GEMINI_EMBEDDING_MODEL = "models/embedding-001"
+# Stores persisted before embeddings.json existed were all embedded by Gemini
+LEGACY_EMBEDDING_INFO = {"backend": "gemini", "model": GEMINI_EMBEDDING_MODEL}
+
+# Local encoder files looked up in the model directory, the quantized export first
+ONNX_MODEL_FILES = ("model_quantized.onnx", "model_int8.onnx", "model.onnx")
+TOKENIZER_FILE = "tokenizer.json"
+
+_HASHING_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class EmbeddingMismatchError(ValueError):
+    """A persisted store was embedded by a different backend or model than the one configured."""
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic, dependency-free embeddings for tests: signed feature hashing of words and word pairs.
+
+    Texts sharing words get similar vectors, so retrieval behaves plausibly
+    without any model; the same text always maps to the same unit vector.
+    """
+
+    def __init__(self, dimension: int = 768):
+        self.dimension = dimension
+
+    def _vector(self, text: str) -> List[float]:
+        words = _HASHING_TOKEN_PATTERN.findall(text.lower())
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:7], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[7] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence encoder exported to ONNX (ideally int8-quantized), run on the CPU.
+
+    `model_dir` holds the ONNX graph and a Hugging Face `tokenizer.json`. Texts
+    are sorted by length and encoded `batch_size` at a time so little padding is
+    computed; tokenization runs in the tokenizer's native thread pool and each
+    batch uses `threads` intra-op threads. The session is thread-safe, so the
+    embedding pipeline may run several batches at once.
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = 32, threads: Optional[int] = None,
+                 max_length: int = 256):
+        if ort is None or Tokenizer is None:
+            raise ImportError("The local embedding backend needs onnxruntime and tokenizers "
+                              "(pip install onnxruntime tokenizers).")
+        model_file = next((os.path.join(model_dir, name) for name in ONNX_MODEL_FILES
+                           if os.path.exists(os.path.join(model_dir, name))), None)
+        if model_file is None:
+            raise FileNotFoundError(f"No ONNX model ({', '.join(ONNX_MODEL_FILES)}) in {model_dir}")
+
+        self.model_file = model_file
+        self.batch_size = max(1, batch_size)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or os.cpu_count() or 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id("[PAD]") or 0)
+
+        output_shape = self.session.get_outputs()[0].shape
+        self.dimension: Optional[int] = output_shape[-1] if isinstance(output_shape[-1], int) else None
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        output = self.session.run(None, {name: value for name, value in feeds.items() if name in self._input_names})[0]
+
+        if output.ndim == 3:
+            # Token embeddings: mean over the real (unpadded) tokens
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        output = output.astype(np.float32)
+        return output / np.maximum(np.linalg.norm(output, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            for i, vector in zip(batch, self._encode([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        if self.dimension is None:
+            self.dimension = len(vectors[0])
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+class EmbeddingBackend:
+    """Where embeddings come from, and the identity recorded with every store built from them.
+
+    `model_id` keys corpus manifests and the query embedding cache;
+    `info()` is persisted next to each index so a store is never searched
+    with vectors from a different model.
+    """
+
+    name = ""
+    # Calls go over the network and count against a provider quota
+    remote = False
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return None
+
+    def embeddings(self) -> Embeddings:
+        raise NotImplementedError
+
+    def info(self) -> Dict[str, Any]:
+        info = {"backend": self.name, "model": self.model}
+        if self.dimension:
+            info["dimension"] = self.dimension
+        return info
+
+    def matches(self, info: Dict[str, Any]) -> bool:
+        if info.get("backend") != self.name or info.get("model") != self.model:
+            return False
+        return not (info.get("dimension") and self.dimension and info["dimension"] != self.dimension)
+
+
+class GeminiBackend(EmbeddingBackend):
+    """Gemini's embedding API, through the shared ModelRegistry pool when one is given."""
+
+    name = "gemini"
+    remote = True
+
+    def __init__(self, model: str = GEMINI_EMBEDDING_MODEL, registry=None, api_key: Optional[str] = None):
+        super().__init__(model)
+        self.registry = registry
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def model_id(self) -> str:
+        # The bare model name, as manifests and caches recorded it before backends existed
+        return self.model
+
+    def embeddings(self) -> Embeddings:
+        if self.registry is not None:
+            return self.registry.embeddings(self.model)
+        if self._client is None:
+            if not self.api_key:
+                raise ValueError("❌ Google Gemini API key is missing!")
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+            self._client = GoogleGenerativeAIEmbeddings(model=self.model, google_api_key=self.api_key)
+        return self._client
+
+
+class LocalBackend(EmbeddingBackend):
+    """An ONNX sentence encoder on the CPU; no network round trips and no quota."""
+
+    name = "local"
+
+    def __init__(self, model_dir: str, batch_size: int = 32, threads: Optional[int] = None, max_length: int = 256):
+        self._embeddings = OnnxEmbeddings(model_dir, batch_size=batch_size, threads=threads, max_length=max_length)
+        # Directory and graph file name, so a quantized and a full-precision export are told apart
+        super().__init__(f"{os.path.basename(os.path.normpath(model_dir))}/{os.path.basename(self._embeddings.model_file)}")
+        self._lock = threading.Lock()
+
+    @property
+    def dimension(self) -> Optional[int]:
+        if self._embeddings.dimension is None:
+            with self._lock:
+                if self._embeddings.dimension is None:
+                    self._embeddings.embed_query("dimension probe")
+        return self._embeddings.dimension
+
+    def embeddings(self) -> Embeddings:
+        # One session for the whole process; it is thread-safe and expensive to create
+        return self._embeddings
+
+
+class HashingBackend(EmbeddingBackend):
+    """Deterministic feature-hashing vectors, for tests and offline development."""
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 768):
+        super().__init__(str(dimension))
+        self._embeddings = HashingEmbeddings(dimension)
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._embeddings.dimension
+
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+
+def create_backend(spec: Optional[str] = None, registry=None, api_key: Optional[str] = None,
+                   batch_size: int = 32, threads: Optional[int] = None) -> EmbeddingBackend:
+    """Backend for "gemini[:model]", "local:<model dir>" or "hashing[:dimension]"."""
+    name, _, argument = (spec or "gemini").strip().partition(":")
+    name = name.lower()
+    if name == "gemini":
+        return GeminiBackend(argument or GEMINI_EMBEDDING_MODEL, registry=registry, api_key=api_key)
+    if name == "local":
+        if not argument:
+            raise ValueError("The local embedding backend needs a model directory, e.g. local:models/all-MiniLM-L6-v2")
+        return LocalBackend(argument, batch_size=batch_size, threads=threads)
+    if name == "hashing":
+        return HashingBackend(int(argument) if argument else 768)
+    raise ValueError(f"Unknown embedding backend: {name} (expected gemini, local or hashing)")
+
+
+# -------------------------------
+# Store metadata
+# -------------------------------
+def write_embedding_info(path: str, info: Dict[str, Any]) -> None:
+    target = os.path.join(path, EMBEDDING_INFO_FILE)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_path, target)
+
+
+def read_embedding_info(path: str) -> Dict[str, Any]:
+    """The store's embedding info; stores without one are assumed to be legacy Gemini builds."""
+    try:
+        with open(os.path.join(path, EMBEDDING_INFO_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict(LEGACY_EMBEDDING_INFO)
+
+
+def check_embedding_info(path: str, backend: EmbeddingBackend) -> None:
+    """Raise EmbeddingMismatchError unless the store at `path` was embedded by `backend`."""
+    info = read_embedding_info(path)
+    if not backend.matches(info):
+        raise EmbeddingMismatchError(
+            f"{path} was embedded with {info.get('backend')}:{info.get('model')}, "
+            f"but the configured backend is {backend.model_id}"
+        )
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingCache:
+    """Bounded in-process cache of query embeddings with LRU + TTL eviction."""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 24 * 3600, persist_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+
+        # key -> (inserted_at, vector); ordered from least to most recently used
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if persist_path:
+            self.load()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize query text so trivially different spellings share an entry."""
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    def make_key(self, text: str, model: str) -> str:
+        return hashlib.sha256(f"{model}\x00{self.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = self.make_key(text, model)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            inserted_at, vector = entry
+            if self.ttl_seconds and time.time() - inserted_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, model: str, vector: List[float]) -> None:
+        key = self.make_key(text, model)
+        with self._lock:
+            self._entries[key] = (time.time(), list(vector))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def save(self) -> None:
+        """Persist the cache to disk atomically (no-op without a persist path)."""
+        if not self.persist_path:
+            return
+
+        with self._lock:
+            payload = {key: [inserted_at, vector] for key, (inserted_at, vector) in self._entries.items()}
+
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.persist_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self.persist_path)
+
+    def load(self) -> None:
+        """Load a previously persisted cache, dropping entries that have already expired."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not load embedding cache from {self.persist_path}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, (inserted_at, vector) in payload.items():
+                if self.ttl_seconds and now - inserted_at > self.ttl_seconds:
+                    continue
+                self._entries[key] = (inserted_at, vector)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings model so query embeddings are served from a shared EmbeddingCache."""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Document chunks are embedded once at ingest time, so they bypass the cache
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text, self.model_name)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(text, self.model_name, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(text, self.model_name)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.put(text, self.model_name, vector)
+        return vector
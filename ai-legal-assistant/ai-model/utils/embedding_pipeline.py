@@ -0,0 +1,226 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+# Gemini's batchEmbedContents accepts at most 100 texts per request
+MAX_PROVIDER_BATCH = 100
+
+
+class EmbeddingPipelineError(RuntimeError):
+    """A batch still failed after every retry; the build is aborted instead of silently dropping it."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available; returns the seconds spent waiting."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class EmbeddingPipeline:
+    """Embeds document chunks in provider-sized batches, several batches at a time.
+
+    Every request first takes a token from a shared bucket, so concurrent builds
+    stay under the provider's requests-per-minute quota together. Failed batches
+    are retried with exponential backoff and jitter; results are yielded as soon
+    as each batch completes so callers can stream vectors into an index.
+    `embeddings_factory` is called per request, so pooled clients are recycled as usual.
+    """
+
+    def __init__(
+        self,
+        embeddings_factory: Callable[[], Embeddings],
+        batch_size: int = MAX_PROVIDER_BATCH,
+        concurrency: int = 4,
+        requests_per_minute: float = 0,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0
+    ):
+        self.embeddings_factory = embeddings_factory
+        self.batch_size = max(1, min(batch_size, MAX_PROVIDER_BATCH))
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.bucket = TokenBucket(requests_per_minute / 60.0)
+
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.batches = 0
+        self.retries = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.throttled_seconds = 0.0
+        self.last_run: Dict[str, Any] = {}
+
+    def make_batches(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            try:
+                vectors = self.embeddings_factory().embed_documents(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"expected {len(texts)} vectors, got {len(vectors)}")
+                with self._lock:
+                    self.throttled_seconds += waited
+                return vectors
+            except Exception as e:
+                attempt += 1
+                with self._lock:
+                    self.throttled_seconds += waited
+                    if attempt > self.max_retries:
+                        self.failures += 1
+                        raise EmbeddingPipelineError(
+                            f"Embedding batch of {len(texts)} chunks failed after {self.max_retries} retries: {e}"
+                        ) from e
+                    self.retries += 1
+                delay = self.backoff_seconds * (2 ** (attempt - 1))
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+    def run(self, batches: Iterable[List[str]]) -> Iterator[Tuple[int, List[List[float]]]]:
+        """Embed `batches` concurrently, yielding (batch index, vectors) in completion order.
+
+        `batches` may be a lazy iterator (e.g. fed by a PDF parser): each batch is
+        submitted as soon as it is produced, with at most twice `concurrency`
+        batches in flight, so embedding overlaps with producing the rest.
+        """
+        started = time.perf_counter()
+        done_chunks = 0
+        submitted = 0
+        pending: Dict[Any, int] = {}
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+
+        def collect(block: bool):
+            nonlocal done_chunks
+            finished, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = pending.pop(future)
+                vectors = future.result()
+                done_chunks += len(vectors)
+                yield index, vectors
+
+        try:
+            for index, batch in enumerate(batches):
+                submitted += 1
+                if batch:
+                    pending[executor.submit(self._embed_batch, batch)] = index
+                yield from collect(block=len(pending) >= self.concurrency * 2)
+            while pending:
+                yield from collect(block=True)
+        finally:
+            # On failure, drop batches that have not started yet
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._record_run(done_chunks, submitted, time.perf_counter() - started)
+
+    def _record_run(self, chunks: int, batches: int, seconds: float) -> None:
+        with self._lock:
+            self.chunks += chunks
+            self.batches += batches
+            self.seconds += seconds
+            self.last_run = {
+                "chunks": chunks,
+                "batches": batches,
+                "seconds": round(seconds, 3),
+                "chunks_per_second": round(chunks / seconds, 1) if seconds else 0.0
+            }
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed `texts` through the pipeline, returning vectors in input order."""
+        batches = self.make_batches(texts)
+        results: List[Optional[List[List[float]]]] = [None] * len(batches)
+        for index, vectors in self.run(batches):
+            results[index] = vectors
+        return [vector for batch in results for vector in batch]
+
+    def build_vectorstore(
+        self,
+        documents: Iterable[Document],
+        embedding_function: Optional[Embeddings] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> Optional["FAISS"]:
+        """Build a FAISS store, adding each batch's vectors to the index as soon as they arrive.
+
+        `documents` may be a lazy iterator; batches are embedded while it is still
+        being consumed. `on_progress(chunks_done, chunks_seen)` is called after every batch.
+        """
+        from langchain_community.vectorstores import FAISS
+
+        embedding_function = embedding_function or self.embeddings_factory()
+        done = 0
+        seen = 0
+        batches: List[List[Document]] = []
+
+        def text_batches():
+            nonlocal seen
+            batch: List[Document] = []
+            for doc in documents:
+                batch.append(doc)
+                if len(batch) == self.batch_size:
+                    batches.append(batch)
+                    seen += len(batch)
+                    yield [d.page_content for d in batch]
+                    batch = []
+            if batch:
+                batches.append(batch)
+                seen += len(batch)
+                yield [d.page_content for d in batch]
+
+        vectorstore: Optional["FAISS"] = None
+        for index, vectors in self.run(text_batches()):
+            batch = batches[index]
+            text_embeddings = list(zip([doc.page_content for doc in batch], vectors))
+            metadatas = [doc.metadata for doc in batch]
+            if vectorstore is None:
+                vectorstore = FAISS.from_embeddings(text_embeddings, embedding_function, metadatas=metadatas)
+            else:
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+            done += len(batch)
+            if on_progress:
+                on_progress(done, seen)
+        return vectorstore
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "batch_size": self.batch_size,
+                "concurrency": self.concurrency,
+                "requests_per_minute": self.bucket.rate * 60,
+                "chunks": self.chunks,
+                "batches": self.batches,
+                "retries": self.retries,
+                "failures": self.failures,
+                "chunks_per_second": round(self.chunks / self.seconds, 1) if self.seconds else 0.0,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "last_run": dict(self.last_run)
+            }
+
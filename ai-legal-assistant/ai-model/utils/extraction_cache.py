@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Optional, Any
+
+
+class ExtractionCache:
+    """Content-addressed on-disk cache of clause-extraction results.
+
+    Entries are JSON files named by a hash of the document text plus the prompt
+    version and model, sharded into two-character subdirectories. File mtimes
+    double as LRU timestamps: a hit touches the file, and once the cache grows
+    past `max_bytes` or `max_entries` the least recently used files are removed.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, max_entries: int = 10000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # key -> (size in bytes, last used); rebuilt from disk so limits hold across restarts
+        self._index: Dict[str, tuple] = {}
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scan()
+
+    @staticmethod
+    def make_key(document_text: str, prompt_version: str, model: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{prompt_version}\x00{model}\x00".encode("utf-8"))
+        digest.update(document_text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _scan(self) -> None:
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                self._index[name[:-5]] = (stat.st_size, stat.st_mtime)
+                self._total_bytes += stat.st_size
+
+    def _known(self, key: str) -> bool:
+        """Whether `key` has an entry, picking up entries other workers wrote since the scan."""
+        if key in self._index:
+            return True
+        try:
+            stat = os.stat(self._path(key))
+        except OSError:
+            return False
+        self._index[key] = (stat.st_size, stat.st_mtime)
+        self._total_bytes += stat.st_size
+        return True
+
+    def contains(self, key: str) -> bool:
+        """Cheap existence check that does not read the entry or count as a lookup."""
+        with self._lock:
+            return self._known(key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        with self._lock:
+            if not self._known(key):
+                self.misses += 1
+                return None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    result = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                # Removed or corrupted behind our back
+                self._forget(key)
+                self.misses += 1
+                return None
+
+            size, _ = self._index[key]
+            self._index[key] = (size, os.path.getmtime(path))
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        path = self._path(key)
+        payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+            if key in self._index:
+                self._total_bytes -= self._index[key][0]
+            self._index[key] = (len(payload), os.path.getmtime(path))
+            self._total_bytes += len(payload)
+            self._evict()
+
+    def _forget(self, key: str) -> None:
+        size, _ = self._index.pop(key, (0, 0))
+        self._total_bytes -= size
+
+    def _evict(self) -> None:
+        if self._total_bytes <= self.max_bytes and len(self._index) <= self.max_entries:
+            return
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes and len(self._index) <= self.max_entries:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self._forget(key)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions
+            }
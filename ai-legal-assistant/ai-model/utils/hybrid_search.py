@@ -0,0 +1,349 @@
+import os
+import re
+import json
+from collections import Counter
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from utils.index_factory import search_parameters
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+# Files of the sparse index, written next to index.faiss
+BM25_ARRAYS_FILE = "bm25.npz"   # CSR postings, document lengths, idf and per-row source ids
+BM25_META_FILE = "bm25.json"    # Vocabulary (term id = position), parameters and source labels; written last
+BM25_VERSION = 1
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Reciprocal-rank fusion constant from the original RRF paper
+RRF_K = 60
+
+# Legal citations: "Section 420", "S. 498A", "Article 21", "Art. 370", "Order XXXIX", "Rule 5", "PART III"
+_IDENTIFIER_PATTERN = re.compile(
+    r'\b(section|sec|article|art|order|rule|clause|schedule|chapter|part|regulation)\.?\s*'
+    r'(\d{1,4}[a-z]{0,2}|[ivxlcdm]{1,8})\b',
+    re.IGNORECASE
+)
+# Numbered provision heading as cut by the legal chunker: "302. Punishment for murder", "1[52A. ..."
+_NUMBERED_HEADING_PATTERN = re.compile(r'^\s*(?:\d+\[)?(\d{1,3}[A-Z]{0,2})\.\s')
+_ROMAN_PATTERN = re.compile(r'^m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})$')
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+_KIND_ALIASES = {"sec": "section", "art": "article"}
+# Kinds whose number names a single provision; "Section 302" also matches the heading "302. ..."
+_PROVISION_KINDS = {"section", "article", "clause", "regulation"}
+_ROMAN_VALUES = {"i": 1, "v": 5, "x": 10, "l": 50, "c": 100, "d": 500, "m": 1000}
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me of on or please say says tell
+that the their this to under what whats which who with about explain define meaning mean means
+""".split())
+
+
+def _roman_to_int(numeral: str) -> int:
+    total = 0
+    for i, char in enumerate(numeral):
+        value = _ROMAN_VALUES[char]
+        if i + 1 < len(numeral) and _ROMAN_VALUES[numeral[i + 1]] > value:
+            total -= value
+        else:
+            total += value
+    return total
+
+
+def _canonical_number(number: str) -> Optional[str]:
+    number = number.lower()
+    if number[0].isdigit():
+        return number
+    if _ROMAN_PATTERN.match(number):
+        return str(_roman_to_int(number))
+    return None  # "Order civil" is not a citation
+
+
+def identifier_tokens(text: str) -> List[str]:
+    """Citation tokens such as "section:420" and "provision:420"; Roman numerals are normalised."""
+    tokens = []
+    for match in _IDENTIFIER_PATTERN.finditer(text):
+        number = _canonical_number(match.group(2))
+        if number is None:
+            continue
+        kind = match.group(1).lower()
+        kind = _KIND_ALIASES.get(kind, kind)
+        tokens.append(f"{kind}:{number}")
+        if kind in _PROVISION_KINDS:
+            tokens.append(f"provision:{number}")
+    return tokens
+
+
+def tokenize(text: str, heading: Optional[str] = None) -> List[str]:
+    """Lower-cased words without stopwords, plus citation tokens (and the heading's provision number)."""
+    lowered = text.lower()
+    tokens = [word for word in _WORD_PATTERN.findall(lowered) if word not in STOPWORDS]
+    tokens.extend(identifier_tokens(lowered))
+    if heading:
+        match = _NUMBERED_HEADING_PATTERN.match(heading)
+        if match:
+            tokens.append(f"provision:{match.group(1).lower()}")
+        tokens.extend(identifier_tokens(heading))
+    return tokens
+
+
+def is_identifier_query(query: str) -> bool:
+    """True when the query is only citations ("Section 420", "what is Article 21?"), nothing to embed."""
+    if not identifier_tokens(query):
+        return False
+    rest = _IDENTIFIER_PATTERN.sub(" ", query.lower())
+    return not [word for word in _WORD_PATTERN.findall(rest) if word not in STOPWORDS]
+
+
+def rrf_fuse(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Reciprocal-rank fusion of ranked row lists: score(row) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """Okapi BM25 over the rows of a FAISS store; row i is the chunk at FAISS id i.
+
+    Postings are kept as CSR arrays (term -> rows and term frequencies) so a
+    query is a handful of vectorised numpy updates over a score array, with no
+    embedding call. Each row also records its "source" so searches can be
+    restricted to some corpora of the unified index.
+    """
+
+    def __init__(self, terms: List[str], indptr: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, sources: List[str], source_ids: np.ndarray,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.sources = sources
+        self.source_ids = source_ids
+        self.k1 = k1
+        self.b = b
+
+        size = len(doc_lengths)
+        document_frequency = np.diff(indptr).astype(np.float32)
+        self.idf = np.log1p((size - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        average = float(doc_lengths.mean()) if size else 0.0
+        self._length_norm = (k1 * (1 - b + b * doc_lengths / average)).astype(np.float32) if average \
+            else np.full(size, k1, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths: List[int] = []
+        sources: Dict[str, int] = {}
+        source_ids: List[int] = []
+        for row, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.page_content, doc.metadata.get("section")))
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((row, count))
+            doc_lengths.append(sum(counts.values()))
+            source = str(doc.metadata.get("source", ""))
+            source_ids.append(sources.setdefault(source, len(sources)))
+
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            indptr[i + 1] = indptr[i] + len(postings[term])
+        doc_ids = np.empty(indptr[-1], dtype=np.int32)
+        tfs = np.empty(indptr[-1], dtype=np.float32)
+        for i, term in enumerate(terms):
+            rows = postings[term]
+            doc_ids[indptr[i]:indptr[i + 1]] = [row for row, _ in rows]
+            tfs[indptr[i]:indptr[i + 1]] = [count for _, count in rows]
+
+        return cls(terms, indptr, doc_ids, tfs, np.asarray(doc_lengths, dtype=np.float32),
+                   list(sources), np.asarray(source_ids, dtype=np.int32), k1, b)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore: "FAISS") -> "BM25Index":
+        """Index every row of a FAISS store in FAISS id order."""
+        def rows():
+            for i in range(vectorstore.index.ntotal):
+                yield vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+        return cls.from_documents(rows())
+
+    # -------------------------------
+    # Persistence
+    # -------------------------------
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, BM25_META_FILE)
+        # Drop the metadata first so a half-written index is never loaded
+        try:
+            os.remove(meta_path)
+        except FileNotFoundError:
+            pass
+
+        arrays_path = os.path.join(path, BM25_ARRAYS_FILE)
+        tmp_path = f"{arrays_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, indptr=self.indptr, doc_ids=self.doc_ids, tfs=self.tfs,
+                     doc_lengths=self.doc_lengths, source_ids=self.source_ids)
+        os.replace(tmp_path, arrays_path)
+
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": BM25_VERSION, "k1": self.k1, "b": self.b, "size": len(self),
+                       "sources": self.sources, "terms": self.terms}, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """The persisted index at `path`, or None if it is missing, incomplete or from another version."""
+        try:
+            with open(os.path.join(path, BM25_META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != BM25_VERSION:
+                return None
+            with np.load(os.path.join(path, BM25_ARRAYS_FILE)) as arrays:
+                return cls(meta["terms"], arrays["indptr"], arrays["doc_ids"], arrays["tfs"],
+                           arrays["doc_lengths"], meta["sources"], arrays["source_ids"], meta["k1"], meta["b"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # -------------------------------
+    # Search
+    # -------------------------------
+    def row_mask(self, sources: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        """Boolean mask of the rows whose source is in `sources` (None = every row)."""
+        if not sources:
+            return None
+        sources = set(sources)
+        wanted = [i for i, source in enumerate(self.sources) if source in sources]
+        return np.isin(self.source_ids, wanted)
+
+    def document_frequency(self, term: str) -> int:
+        i = self.vocabulary.get(term)
+        return 0 if i is None else int(self.indptr[i + 1] - self.indptr[i])
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-k (row, score) pairs, best first; rows without any query term are never returned."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            i = self.vocabulary.get(term)
+            if i is None:
+                continue
+            start, end = self.indptr[i], self.indptr[i + 1]
+            rows = self.doc_ids[start:end]
+            tfs = self.tfs[start:end]
+            scores[rows] += self.idf[i] * tfs * (self.k1 + 1) / (tfs + self._length_norm[rows])
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(row), float(scores[row])) for row in hits]
+
+
+@lru_cache(maxsize=64)
+def _load_cached(path: str, mtime: float) -> Optional[BM25Index]:
+    return BM25Index.load(path)
+
+
+def load_bm25(path: str) -> Optional[BM25Index]:
+    """Load a persisted index, reusing the copy already in memory while the file is unchanged."""
+    try:
+        mtime = os.path.getmtime(os.path.join(path, BM25_META_FILE))
+    except OSError:
+        return None
+    return _load_cached(path, mtime)
+
+
+def ensure_bm25(vectorstore: "FAISS", path: str) -> BM25Index:
+    """The sparse index persisted for the store at `path`, built and saved first if it is missing or stale."""
+    index = load_bm25(path)
+    if index is None or len(index) != vectorstore.index.ntotal:
+        index = BM25Index.from_vectorstore(vectorstore)
+        index.save(path)
+    return index
+
+
+class HybridRetriever:
+    """Fuses BM25 and dense k-NN results over one FAISS store with reciprocal-rank fusion.
+
+    Both searches return FAISS rows, so fusion needs no document lookups and a
+    source restriction is applied inside the searches (a FAISS ID selector on
+    the dense side) rather than after fetching. Identifier-only queries can be
+    answered from the sparse side alone, skipping the embedding call.
+    """
+
+    def __init__(self, vectorstore: "FAISS", bm25: BM25Index, rrf_k: int = RRF_K):
+        self.vectorstore = vectorstore
+        self.bm25 = bm25
+        self.rrf_k = rrf_k
+        # One mask per known source, so the cache is bounded by the corpora in the index
+        # however requests combine them; unknown names from request input are never cached
+        self._known_sources = set(bm25.sources)
+        self._source_masks: Dict[str, np.ndarray] = {}
+
+    def row_mask(self, sources: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        """Rows whose source is in `sources` (None = every row), OR-ed from the per-source masks."""
+        if not sources:
+            return None
+        mask = np.zeros(len(self.bm25), dtype=bool)
+        for source in set(sources) & self._known_sources:
+            source_mask = self._source_masks.get(source)
+            if source_mask is None:
+                source_mask = self._source_masks[source] = self.bm25.row_mask([source])
+            mask |= source_mask
+        return mask
+
+    def can_skip_dense(self, query: str) -> bool:
+        """Identifier-only query whose citations appear in the index."""
+        return is_identifier_query(query) and any(
+            self.bm25.document_frequency(token) for token in identifier_tokens(query.lower())
+        )
+
+    def sparse_search(self, query: str, k: int, sources: Optional[Iterable[str]] = None) -> List[int]:
+        return [row for row, _ in self.bm25.search(query, k, self.row_mask(sources))]
+
+    def dense_search(self, query_embedding: List[float], k: int, sources: Optional[Iterable[str]] = None) -> List[int]:
+        index = self.vectorstore.index
+        vector = np.asarray([query_embedding], dtype=np.float32)
+        if self.vectorstore._normalize_L2:
+            faiss.normalize_L2(vector)
+        mask = self.row_mask(sources)
+        if mask is None:
+            _, rows = index.search(vector, k)
+        else:
+            allowed = np.flatnonzero(mask).astype(np.int64)
+            if not len(allowed):
+                return []
+            try:
+                selector = faiss.IDSelectorBatch(allowed)
+                _, rows = index.search(vector, k, params=search_parameters(index, selector))
+            except (RuntimeError, TypeError, AttributeError):
+                # Index type without selector support: over-fetch and filter
+                _, rows = index.search(vector, min(index.ntotal, k * 8))
+                rows = np.asarray([[row for row in rows[0] if row >= 0 and mask[row]][:k]])
+        return [int(row) for row in rows[0] if row >= 0]
+
+    def fuse(self, rankings: Sequence[Sequence[int]], k: int) -> List[Tuple[int, float]]:
+        return rrf_fuse(rankings, self.rrf_k)[:k]
+
+    def documents(self, ranked: Sequence[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        """(Document, fused score) pairs for ranked rows; higher scores are better."""
+        results = []
+        for row, score in ranked:
+            doc = self.vectorstore.docstore.search(self.vectorstore.index_to_docstore_id[row])
+            if isinstance(doc, Document):
+                results.append((doc, score))
+        return results
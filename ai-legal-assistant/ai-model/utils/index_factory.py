@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import argparse
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+INDEX_INFO_FILE = "index.json"  # Type and parameters of index.faiss, written next to it
+
+# Supported index types and their default parameters; anything not given is derived from the corpus size
+INDEX_TYPES = {
+    "flat": {},
+    "hnsw": {"m": 32, "ef_construction": 80, "ef_search": 64},
+    "sq8": {},
+    "ivf-sq8": {"nlist": None, "nprobe": 16},
+    "ivf-pq": {"nlist": None, "nprobe": 16, "m": None, "nbits": 8},
+}
+# Types that store codes rather than the vectors, so reading vectors back from them is approximate
+LOSSY_INDEX_TYPES = ("sq8", "ivf-sq8", "ivf-pq")
+# faiss wants about this many training points per centroid
+TRAINING_POINTS_PER_CENTROID = 39
+# Below this many vectors an IVF index cannot be trained usefully and a flat index is built instead
+MIN_IVF_VECTORS = 1000
+
+
+def parse_index_spec(spec: Optional[str]) -> Dict[str, Any]:
+    """Parse "type" or "type:key=value,..." (e.g. "ivf-pq:nlist=1024,m=64") into {"type", "params"}."""
+    spec = (spec or "flat").strip().lower()
+    index_type, _, raw_params = spec.partition(":")
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+    params: Dict[str, Any] = {}
+    for item in filter(None, raw_params.split(",")):
+        key, _, value = item.partition("=")
+        key = key.strip().replace("-", "_")
+        if key not in INDEX_TYPES[index_type]:
+            raise ValueError(f"Unknown parameter for {index_type}: {key}")
+        params[key] = int(value)
+    return {"type": index_type, "params": params}
+
+
+def _largest_divisor(dimension: int, at_most: int) -> int:
+    for m in range(max(1, min(at_most, dimension)), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def resolve_params(index_type: str, ntotal: int, dimension: int, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fill in defaults for an index over `ntotal` vectors, sizing IVF lists and PQ codes to the corpus."""
+    resolved = {**INDEX_TYPES[index_type], **(params or {})}
+    if index_type.startswith("ivf"):
+        if not resolved.get("nlist"):
+            # ~4·sqrt(n) lists, but never more than the training set supports
+            resolved["nlist"] = int(4 * np.sqrt(ntotal))
+        resolved["nlist"] = max(1, min(resolved["nlist"], ntotal // TRAINING_POINTS_PER_CENTROID))
+        resolved["nprobe"] = max(1, min(resolved["nprobe"], resolved["nlist"]))
+    if index_type == "ivf-pq":
+        # One 8-bit code per 8 dimensions (768 floats -> 96 bytes), a divisor of the dimension
+        resolved["m"] = _largest_divisor(dimension, resolved.get("m") or max(1, dimension // 8))
+        # PQ codebooks need 2^nbits centroids trained from the corpus
+        while resolved["nbits"] > 4 and ntotal < (2 ** resolved["nbits"]) * TRAINING_POINTS_PER_CENTROID:
+            resolved["nbits"] -= 1
+    return resolved
+
+
+def factory_string(index_type: str, params: Dict[str, Any]) -> str:
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{params['m']}"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "ivf-sq8":
+        return f"IVF{params['nlist']},SQ8"
+    return f"IVF{params['nlist']},PQ{params['m']}x{params['nbits']}"
+
+
+def configure_search(index: faiss.Index, params: Dict[str, Any]) -> None:
+    """Apply query-time parameters (nprobe, efSearch) and the id map IVF reconstruction needs."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = params.get("nprobe", ivf.nprobe)
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params.get("ef_search", index.hnsw.efSearch)
+
+
+def build_index(vectors: np.ndarray, index_type: str = "flat", params: Optional[Dict[str, Any]] = None,
+                metric: int = faiss.METRIC_L2) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """Train (from `vectors` themselves) and fill an index; row i keeps FAISS id i.
+
+    Returns the index and a description of what was built. Corpora too small
+    for the requested IVF index get a flat one, which the description records.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ntotal, dimension = vectors.shape
+    requested = index_type
+    if index_type.startswith("ivf") and ntotal < MIN_IVF_VECTORS:
+        index_type = "flat"
+    resolved = resolve_params(index_type, ntotal, dimension, params if index_type == requested else None)
+
+    started = time.perf_counter()
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, resolved["m"], metric)
+        index.hnsw.efConstruction = resolved["ef_construction"]
+    else:
+        index = faiss.index_factory(dimension, factory_string(index_type, resolved), metric)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    configure_search(index, resolved)
+
+    info = describe_index(index)
+    info.update({
+        "type": index_type,
+        "requested_type": requested,
+        "params": resolved,
+        "trained_on": ntotal,
+        "build_seconds": round(time.perf_counter() - started, 3)
+    })
+    return index, info
+
+
+def describe_index(index: faiss.Index) -> Dict[str, Any]:
+    size = len(faiss.serialize_index(index))
+    return {
+        "faiss_class": type(index).__name__,
+        "ntotal": index.ntotal,
+        "dimension": index.d,
+        "bytes": size,
+        "bytes_per_vector": round(size / index.ntotal, 1) if index.ntotal else 0.0
+    }
+
+
+def search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search parameters restricting results to `selector`, keeping the index's own nprobe/efSearch."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def all_vectors(index: faiss.Index) -> np.ndarray:
+    configure_search(index, {})
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def apply_index_spec(vectorstore: "FAISS", spec: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace the store's index with one of `spec`'s type, built from its current vectors; returns the index info."""
+    if spec["type"] == "flat" and isinstance(vectorstore.index, faiss.IndexFlat):
+        return {**describe_index(vectorstore.index), "type": "flat", "requested_type": "flat", "params": {}}
+    index, info = build_index(all_vectors(vectorstore.index), spec["type"], spec.get("params"),
+                              vectorstore.index.metric_type)
+    vectorstore.index = index
+    return info
+
+
+def lossy_source(info: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The lossy index type whose reconstructed vectors an index described by `info` was built from, if any."""
+    if not info:
+        return None
+    if info.get("lossy_source"):
+        return info["lossy_source"]
+    return info.get("type") if info.get("type") in LOSSY_INDEX_TYPES else None
+
+
+def write_index_info(path: str, info: Dict[str, Any]) -> None:
+    target = os.path.join(path, INDEX_INFO_FILE)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_path, target)
+
+
+def read_index_info(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(path, INDEX_INFO_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# -------------------------------
+# Recall vs latency report
+# -------------------------------
+def index_report(vectors: np.ndarray, specs: Sequence[str], k: int = 10, queries: int = 200,
+                 seed: int = 0) -> List[Dict[str, Any]]:
+    """Recall@k and per-query latency of each index spec against an exact flat index.
+
+    Queries are stored vectors plus a little noise, so each has a known
+    neighbourhood without needing real query embeddings.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), min(queries, len(vectors)), replace=False)
+    scale = float(np.linalg.norm(vectors, axis=1).mean()) * 0.05 / np.sqrt(vectors.shape[1])
+    query_vectors = vectors[picks] + rng.normal(0, scale, (len(picks), vectors.shape[1])).astype(np.float32)
+
+    baseline = faiss.IndexFlatL2(vectors.shape[1])
+    baseline.add(vectors)
+    _, truth = baseline.search(query_vectors, k)
+
+    rows = []
+    for spec_text in specs:
+        spec = parse_index_spec(spec_text)
+        index, info = build_index(vectors, spec["type"], spec["params"])
+        latencies = []
+        found = np.empty_like(truth)
+        for i, query in enumerate(query_vectors):
+            started = time.perf_counter()
+            _, ids = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found[i] = ids[0]
+        recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(truth))])
+        rows.append({
+            "spec": spec_text,
+            "type": info["type"],
+            "params": info["params"],
+            f"recall@{k}": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "bytes_per_vector": info["bytes_per_vector"],
+            "bytes": info["bytes"],
+            "build_seconds": info["build_seconds"]
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recall vs latency of compressed indexes against the flat baseline.")
+    parser.add_argument("store", help="Vectorstore directory containing index.faiss, e.g. vectorstores/IPC")
+    parser.add_argument("--types", nargs="+", default=["flat", "hnsw", "sq8", "ivf-sq8", "ivf-pq"],
+                        help='Index specs, space-separated (a spec\'s own parameters are comma-separated, '
+                             'e.g. "ivf-pq:nlist=1024,m=64")')
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    index = faiss.read_index(os.path.join(args.store, "index.faiss"))
+    rows = index_report(all_vectors(index), args.types, k=args.k, queries=args.queries)
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+        return
+
+    print(f"{args.store}: {index.ntotal} vectors, d={index.d}, k={args.k}")
+    print(f"{'spec':<28}{'built as':<10}{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}{'B/vec':>9}{'MB':>8}{'build s':>9}")
+    for row in rows:
+        print(f"{row['spec']:<28}{row['type']:<10}{row[f'recall@{args.k}']:>8.3f}{row['p50_ms']:>9.3f}{row['p95_ms']:>9.3f}"
+              f"{row['bytes_per_vector']:>9.0f}{row['bytes'] / 1e6:>8.2f}{row['build_seconds']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Job lifecycle: queued -> parsing -> embedding -> ready, or failed from any stage
+QUEUED = "queued"
+PARSING = "parsing"
+EMBEDDING = "embedding"
+READY = "ready"
+FAILED = "failed"
+
+
+class IngestionJob:
+    """Progress of one uploaded document's parse/chunk/embed run."""
+
+    def __init__(self, file_id: str):
+        self.file_id = file_id
+        self.status = QUEUED
+        self.chunks_total = 0
+        self.chunks_done = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.subscribers = 1  # Uploads coalesced onto this job
+        self._done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (READY, FAILED)
+
+    def set_status(self, status: str) -> None:
+        self.status = status
+        self.updated_at = time.time()
+
+    def set_progress(self, done: int, total: int) -> None:
+        self.chunks_done = done
+        self.chunks_total = total
+        self.updated_at = time.time()
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.error = error
+        self.set_status(FAILED if error else READY)
+        self._done.set()
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the job to finish; returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.status == READY:
+            progress = 1.0
+        elif self.chunks_total:
+            progress = self.chunks_done / self.chunks_total
+        else:
+            progress = 0.0
+        return {
+            "file_id": self.file_id,
+            "status": self.status,
+            "progress": round(progress, 3),
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "error": self.error,
+            "elapsed_seconds": round(self.updated_at - self.created_at, 3),
+            "subscribers": self.subscribers
+        }
+
+
+class IngestionQueue:
+    """Runs document ingestion in the background with at most `workers` jobs at a time.
+
+    Jobs are keyed by file_id (the upload's content hash), so concurrent uploads
+    of the same file share one job. Finished jobs are kept for status queries,
+    up to `max_finished`; a failed job is replaced by the next upload of that file.
+    """
+
+    def __init__(self, workers: int = 2, max_finished: int = 256):
+        self.workers = max(1, workers)
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+
+    def get(self, file_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(file_id)
+
+    def submit(self, file_id: str, run: Callable[[IngestionJob], Awaitable[Any]]) -> IngestionJob:
+        """Queue `run(job)` for file_id unless a queued, running or finished job already covers it."""
+        job = self._jobs.get(file_id)
+        if job is not None and job.status != FAILED:
+            job.subscribers += 1
+            self.coalesced += 1
+            return job
+
+        job = IngestionJob(file_id)
+        self._jobs[file_id] = job
+        self._jobs.move_to_end(file_id)
+        self._tasks[file_id] = asyncio.create_task(self._run(job, run))
+        self.submitted += 1
+        self._prune()
+        return job
+
+    async def _run(self, job: IngestionJob, run: Callable[[IngestionJob], Awaitable[Any]]) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        try:
+            async with self._slots:
+                await run(job)
+            job.finish()
+            self.completed += 1
+        except asyncio.CancelledError:
+            job.finish(error="Ingestion was cancelled.")
+            raise
+        except Exception as e:
+            print(f"❌ Ingestion failed for {job.file_id}: {e}")
+            job.finish(error=str(e))
+            self.failed += 1
+        finally:
+            self._tasks.pop(job.file_id, None)
+
+    def discard(self, file_id: str) -> None:
+        """Forget a finished job, e.g. when its stored result turned out to be unusable."""
+        job = self._jobs.get(file_id)
+        if job is not None and job.finished:
+            del self._jobs[file_id]
+
+    def _prune(self) -> None:
+        finished = [file_id for file_id, job in self._jobs.items() if job.finished]
+        for file_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[file_id]
+
+    async def shutdown(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "jobs": statuses,
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed
+        }
@@ -0,0 +1,175 @@
+import os
+import json
+import mmap
+from collections.abc import Mapping
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_community.docstore.base import Docstore
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+# Files of the compact layout, written next to index.faiss/index.pkl
+TEXT_BLOB_FILE = "docstore.bin"        # Every chunk's text, UTF-8, back to back
+OFFSETS_FILE = "docstore.offsets.npy"  # int64 [n, 2] byte ranges into the blob, row i = FAISS id i
+METADATA_FILE = "docstore.meta.json"   # List of per-chunk metadata dicts
+COMPACT_MARKER = "compact.json"        # Written last; its presence means the layout is complete
+
+# Flag for memory-mapping the vectors of flat/SQ/PQ indexes (IndexFlatCodes), added in faiss 1.11
+# (requirements.txt pins at least that); older builds only map IVF inverted lists, so flat and
+# HNSW vectors are read into the heap
+INDEX_VECTORS_MAPPED = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+_MMAP_FLAG = faiss.IO_FLAG_MMAP_IFC if INDEX_VECTORS_MAPPED else faiss.IO_FLAG_MMAP
+if not INDEX_VECTORS_MAPPED:
+    print(f"⚠️ faiss {faiss.__version__} cannot memory-map flat/HNSW index vectors; "
+          f"compact stores load their vectors into RAM (upgrade to faiss-cpu>=1.11)")
+
+
+class PositionalIds(Mapping):
+    """index_to_docstore_id for compact stores: FAISS row i maps to docstore id "i"."""
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < self._size:
+            raise KeyError(i)
+        return str(i)
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class MmapDocstore(Docstore):
+    """Read-only docstore over a memory-mapped text blob, an offsets table and a metadata table.
+
+    The blob and offsets are mapped from disk, so workers that open the same store
+    share those pages through the OS page cache instead of each unpickling a copy.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, TEXT_BLOB_FILE), "rb") as f:
+            # mmap cannot map an empty file
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self._offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as f:
+            self._metadata: List[Dict] = json.load(f)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def nbytes(self) -> int:
+        """Bytes behind this docstore: the mapped text blob and offsets plus the in-heap metadata."""
+        metadata_bytes = sum(len(str(k)) + len(str(v)) for row in self._metadata for k, v in row.items())
+        return len(self._blob) + self._offsets.nbytes + metadata_bytes
+
+    def search(self, search: str) -> Union[str, Document]:
+        try:
+            row = int(search)
+            start, end = self._offsets[row]
+        except (ValueError, IndexError):
+            return f"ID {search} not found."
+        text = self._blob[int(start):int(end)].decode("utf-8")
+        return Document(page_content=text, metadata=dict(self._metadata[row]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        raise NotImplementedError("MmapDocstore is read-only; rebuild the store to add documents.")
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("MmapDocstore is read-only; rebuild the store to delete documents.")
+
+
+def has_compact(path: str) -> bool:
+    return os.path.exists(os.path.join(path, COMPACT_MARKER))
+
+
+def read_compact_info(path: str) -> Optional[Dict]:
+    """Contents of the completion marker, or None if the compact layout is missing or unreadable."""
+    try:
+        with open(os.path.join(path, COMPACT_MARKER), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path: str, write) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_compact(vectorstore: "FAISS", path: str, info: Optional[Dict] = None) -> None:
+    """Write a FAISS store in the compact, mmap-friendly layout (index.faiss + docstore files).
+
+    `info` is stored in the completion marker, e.g. a fingerprint of the inputs the store was built from.
+    """
+    os.makedirs(path, exist_ok=True)
+    # Drop the marker first so nobody maps a half-rewritten store
+    try:
+        os.remove(os.path.join(path, COMPACT_MARKER))
+    except FileNotFoundError:
+        pass
+    ntotal = vectorstore.index.ntotal
+
+    offsets = np.zeros((ntotal, 2), dtype=np.int64)
+    metadata = []
+
+    def write_blob(tmp_path):
+        position = 0
+        with open(tmp_path, "wb") as f:
+            for i in range(ntotal):
+                doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+                data = doc.page_content.encode("utf-8")
+                f.write(data)
+                offsets[i] = (position, position + len(data))
+                position += len(data)
+                metadata.append(doc.metadata)
+
+    def write_offsets(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, offsets)
+
+    def write_metadata(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, default=str)
+
+    def write_marker(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**(info or {}), "ntotal": ntotal, "dimension": vectorstore.index.d}, f)
+
+    _write_atomic(os.path.join(path, "index.faiss"), lambda p: faiss.write_index(vectorstore.index, p))
+    _write_atomic(os.path.join(path, TEXT_BLOB_FILE), write_blob)
+    _write_atomic(os.path.join(path, OFFSETS_FILE), write_offsets)
+    _write_atomic(os.path.join(path, METADATA_FILE), write_metadata)
+    _write_atomic(os.path.join(path, COMPACT_MARKER), write_marker)
+
+
+def load_compact(path: str, embeddings, mmap_index: bool = True) -> "FAISS":
+    """Open a compact store, memory-mapping the index vectors and the docstore text read-only."""
+    from langchain_community.vectorstores import FAISS
+
+    flags = (_MMAP_FLAG | faiss.IO_FLAG_READ_ONLY) if mmap_index else 0
+    index = faiss.read_index(os.path.join(path, "index.faiss"), flags)
+    docstore = MmapDocstore(path)
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=PositionalIds(index.ntotal)
+    )
+
+
+def load_or_convert(path: str, embeddings) -> "FAISS":
+    """Load `path` memory-mapped, converting a pickled (index.pkl) store to the compact layout first."""
+    from langchain_community.vectorstores import FAISS
+
+    if not has_compact(path):
+        pickled = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        save_compact(pickled, path)
+        del pickled
+    return load_compact(path, embeddings)
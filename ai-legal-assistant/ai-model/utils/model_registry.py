@@ -0,0 +1,102 @@
+import time
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Any
+
+if TYPE_CHECKING:
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+
+
+class ModelRegistry:
+    """Process-wide pool of Gemini chat and embedding clients.
+
+    Clients are created once per (kind, model, temperature) key and reused by
+    every request, so the underlying gRPC/HTTP channels and TLS sessions stay
+    open. Each key holds up to `pool_size` clients handed out round-robin; a
+    client left idle for longer than `keepalive_seconds` is rebuilt on its next
+    use instead of reusing a connection the server may already have dropped.
+    """
+
+    def __init__(self, api_key: str, pool_size: int = 1, keepalive_seconds: float = 300,
+                 transport: Optional[str] = None, endpoint: Optional[str] = None):
+        if not api_key:
+            raise ValueError("❌ Google Gemini API key is missing!")
+
+        self.api_key = api_key
+        self.pool_size = max(1, pool_size)
+        self.keepalive_seconds = keepalive_seconds
+        self.transport = transport
+        # host:port of the Gemini API to call instead of the public one
+        self.endpoint = endpoint
+
+        # key -> list of [client, last_used]; key -> next slot to hand out
+        self._pools: Dict[tuple, List[list]] = {}
+        self._cursors: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        kwargs = {"google_api_key": self.api_key}
+        if self.transport:
+            kwargs["transport"] = self.transport
+        if self.endpoint:
+            kwargs["client_options"] = {"api_endpoint": self.endpoint}
+        return kwargs
+
+    def _acquire(self, key: tuple, factory):
+        now = time.time()
+        with self._lock:
+            pool = self._pools.setdefault(key, [])
+
+            if len(pool) < self.pool_size:
+                client = factory()
+                pool.append([client, now])
+                self.created += 1
+                return client
+
+            index = self._cursors.get(key, 0) % len(pool)
+            self._cursors[key] = index + 1
+            slot = pool[index]
+
+            if self.keepalive_seconds and now - slot[1] > self.keepalive_seconds:
+                slot[0] = factory()
+                self.recycled += 1
+            else:
+                self.reused += 1
+            slot[1] = now
+            return slot[0]
+
+    def chat(self, model: str = "models/gemini-2.5-pro", temperature: float = 0.3) -> "ChatGoogleGenerativeAI":
+        # The Gemini SDK takes about a second to import; workers load it on their first client
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return self._acquire(
+            ("chat", model, temperature),
+            lambda: ChatGoogleGenerativeAI(model=model, temperature=temperature, **self._client_kwargs())
+        )
+
+    def embeddings(self, model: str = "models/embedding-001") -> "GoogleGenerativeAIEmbeddings":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        return self._acquire(
+            ("embeddings", model, None),
+            lambda: GoogleGenerativeAIEmbeddings(model=model, **self._client_kwargs())
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pools": {"/".join(str(part) for part in key if part is not None): len(pool)
+                          for key, pool in self._pools.items()},
+                "pool_size": self.pool_size,
+                "created": self.created,
+                "reused": self.reused,
+                "recycled": self.recycled
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._pools.clear()
+            self._cursors.clear()
@@ -0,0 +1,153 @@
+import io
+import os
+from functools import lru_cache
+from typing import Iterator, List, Optional, Tuple, Union
+from langchain_core.documents import Document
+from utils.concurrency import process_pool
+
+
+# "auto" prefers PyMuPDF and falls back to pypdf; "pymupdf" or "pypdf" force one backend
+PDF_BACKEND = os.environ.get("PDF_BACKEND", "auto")
+# Documents with at least this many pages are parsed across processes
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "200"))
+PDF_PARSE_WORKERS = int(os.environ.get("PDF_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages handed to a worker process at a time
+PDF_PAGES_PER_TASK = 32
+
+PdfSource = Union[str, bytes]
+
+
+@lru_cache(maxsize=None)
+def _fitz():
+    """PyMuPDF, imported on the first parse rather than at app start; None if it is not installed."""
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        # pypdf (through langchain's PyPDFLoader dependency) remains available as the fallback
+        return None
+    return fitz
+
+
+def _resolve_backend(backend: Optional[str]) -> str:
+    backend = backend or PDF_BACKEND
+    if backend == "auto":
+        return "pymupdf" if _fitz() is not None else "pypdf"
+    if backend == "pymupdf" and _fitz() is None:
+        raise ImportError("PDF_BACKEND=pymupdf but PyMuPDF is not installed.")
+    return backend
+
+
+def _open_pymupdf(source: PdfSource):
+    if isinstance(source, bytes):
+        return _fitz().open(stream=source, filetype="pdf")
+    return _fitz().open(source)
+
+
+def _open_pypdf(source: PdfSource):
+    from pypdf import PdfReader
+    return PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def _page_texts(source: PdfSource, backend: str, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+    """Yield the text of pages [start, stop) one page at a time."""
+    if backend == "pymupdf":
+        doc = _open_pymupdf(source)
+        try:
+            for number in range(start, doc.page_count if stop is None else min(stop, doc.page_count)):
+                yield doc.load_page(number).get_text()
+        finally:
+            doc.close()
+    else:
+        reader = _open_pypdf(source)
+        pages = reader.pages
+        for number in range(start, len(pages) if stop is None else min(stop, len(pages))):
+            yield pages[number].extract_text()
+
+
+# The PDF a parsing worker process reads from, set once per process by _init_worker
+_worker_source: Optional[PdfSource] = None
+
+
+def _init_worker(source: PdfSource) -> None:
+    global _worker_source
+    _worker_source = source
+
+
+def _page_range_texts(backend: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker process
+    return list(_page_texts(_worker_source, backend, start, stop))
+
+
+def count_pages(source: PdfSource, backend: Optional[str] = None) -> int:
+    backend = _resolve_backend(backend)
+    if backend == "pymupdf":
+        doc = _open_pymupdf(source)
+        try:
+            return doc.page_count
+        finally:
+            doc.close()
+    return len(_open_pypdf(source).pages)
+
+
+def _iter_serial(source: PdfSource, backend: str) -> Iterator[Tuple[int, str]]:
+    yield from enumerate(_page_texts(source, backend))
+
+
+def _iter_parallel(source: PdfSource, backend: str, page_count: int, workers: int) -> Iterator[Tuple[int, str]]:
+    """Parse page ranges in worker processes, yielding pages in order as soon as each range is done.
+
+    The PDF (path or bytes) is handed to each worker once, when it starts, rather than with every range.
+    """
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    with process_pool(workers, initializer=_init_worker, initargs=(source,)) as executor:
+        futures = [executor.submit(_page_range_texts, backend, start, stop) for start, stop in ranges]
+        try:
+            for (start, _), future in zip(ranges, futures):
+                for offset, text in enumerate(future.result()):
+                    yield start + offset, text
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def iter_pdf_pages(
+    source: PdfSource,
+    source_name: Optional[str] = None,
+    backend: Optional[str] = None,
+    workers: Optional[int] = None
+) -> Iterator[Document]:
+    """Lazily yield one Document per page from a PDF path or in-memory bytes.
+
+    Metadata matches PyPDFLoader ("source", 0-based "page"), so chunks look the
+    same whichever backend parsed them. With the "auto" backend a PDF PyMuPDF
+    cannot open is retried with pypdf. Large documents are parsed by up to
+    `workers` processes.
+    """
+    requested = backend or PDF_BACKEND
+    backend = _resolve_backend(backend)
+    if source_name is None:
+        source_name = source if isinstance(source, str) else "upload.pdf"
+    workers = PDF_PARSE_WORKERS if workers is None else workers
+
+    try:
+        page_count = count_pages(source, backend)
+    except Exception as e:
+        if requested != "auto" or backend != "pymupdf":
+            raise
+        print(f"⚠️ PyMuPDF could not open {source_name}, falling back to pypdf: {e}")
+        backend = "pypdf"
+        page_count = count_pages(source, backend)
+
+    if workers > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        pages = _iter_parallel(source, backend, page_count, workers)
+    else:
+        pages = _iter_serial(source, backend)
+
+    for number, text in pages:
+        yield Document(page_content=text, metadata={"source": source_name, "page": number})
+
+
+def load_pdf_text(source: PdfSource, backend: Optional[str] = None) -> str:
+    """Join every page of a PDF into one string."""
+    return "\n\n".join(doc.page_content for doc in iter_pdf_pages(source, backend=backend))
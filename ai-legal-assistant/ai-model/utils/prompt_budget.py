@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+# Default prompt budget in tokens per endpoint (template, question and context together).
+# Override per endpoint with PROMPT_BUDGET_<ENDPOINT>, e.g. PROMPT_BUDGET_ASK_CONTEXT=6000.
+DEFAULT_PROMPT_BUDGETS = {
+    "ask_existing": 3000,
+    "ask_context": 3000,
+    "compare_clauses": 6000,
+    "chat": 1000,
+}
+
+# Word pieces and single punctuation marks; long words count one token per four characters,
+# which tracks SentencePiece-style tokenizers closely enough for budgeting
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_PATTERN = re.compile(r'(?<=[.!?;:])\s+|\n+')
+_WORD_PATTERN = re.compile(r'\w+')
+
+# Word n-grams used to spot text already present in the prompt (e.g. the overlap between neighbouring chunks)
+SHINGLE_SIZE = 5
+# A sentence whose shingles are mostly already in the prompt is dropped from its chunk
+REDUNDANT_SENTENCE_OVERLAP = 0.8
+# A chunk left with less than this share of its text after trimming is dropped as redundant
+MIN_CHUNK_REMAINDER = 0.3
+# Chunks are only cut down to fit the budget if at least this many tokens of them fit
+MIN_CHUNK_TOKENS = 40
+
+
+def count_tokens(text: str) -> int:
+    """Local token count of `text`, without a round trip to the model's countTokens API."""
+    return sum((len(piece) + 3) // 4 if piece[0].isalnum() else 1 for piece in _TOKEN_PATTERN.findall(text))
+
+
+def _sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+
+def _shingles(sentence: str) -> Set[Tuple[str, ...]]:
+    words = _WORD_PATTERN.findall(sentence.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+class AssembledContext:
+    """Chunks that made it into a prompt, in input order, with the text actually used for each."""
+
+    def __init__(self):
+        self.chunks: List[Tuple[str, Any]] = []  # (text, payload)
+        self.tokens = 0
+        self.trimmed = 0
+        self.dropped = 0
+
+    @property
+    def payloads(self) -> List[Any]:
+        return [payload for _, payload in self.chunks]
+
+    @property
+    def texts(self) -> List[str]:
+        return [text for text, _ in self.chunks]
+
+
+class PromptAssembler:
+    """Fits retrieved context into a per-endpoint token budget and logs prompt sizes.
+
+    Chunks are taken in the order given (best first). Sentences whose word
+    shingles are already in the prompt are trimmed, a chunk that is mostly
+    redundant is dropped, and a chunk that does not fit the remaining budget is
+    cut at a sentence boundary or dropped, so lower-ranked chunks give way first.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None):
+        self.budgets = dict(DEFAULT_PROMPT_BUDGETS)
+        if budgets:
+            self.budgets.update(budgets)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> "PromptAssembler":
+        budgets = {}
+        for endpoint in DEFAULT_PROMPT_BUDGETS:
+            value = os.environ.get(f"PROMPT_BUDGET_{endpoint.upper()}")
+            if value:
+                budgets[endpoint] = int(value)
+        return cls(budgets)
+
+    def budget(self, endpoint: str) -> int:
+        return self.budgets[endpoint]
+
+    def fit(self, endpoint: str, chunks: Sequence[Tuple[str, Any]], reserved_tokens: int = 0) -> AssembledContext:
+        """Select and trim (text, payload) chunks to fit the endpoint's budget minus `reserved_tokens`
+        (the template and question around the context)."""
+        remaining = self.budget(endpoint) - reserved_tokens
+        context = AssembledContext()
+        seen: Set[Tuple[str, ...]] = set()
+
+        for text, payload in chunks:
+            sentences = []
+            for sentence in _sentences(text):
+                shingles = _shingles(sentence)
+                if shingles and len(shingles & seen) >= REDUNDANT_SENTENCE_OVERLAP * len(shingles):
+                    continue
+                sentences.append((sentence, shingles, count_tokens(sentence)))
+            kept_tokens = sum(tokens for _, _, tokens in sentences)
+            if not sentences or kept_tokens < MIN_CHUNK_REMAINDER * count_tokens(text):
+                context.dropped += 1
+                continue
+
+            trimmed = len(sentences) < len(_sentences(text))
+            if kept_tokens > remaining:
+                if remaining < MIN_CHUNK_TOKENS:
+                    context.dropped += 1
+                    continue
+                fitted, used = [], 0
+                for sentence in sentences:
+                    if used + sentence[2] > remaining:
+                        break
+                    fitted.append(sentence)
+                    used += sentence[2]
+                if used < MIN_CHUNK_TOKENS:
+                    context.dropped += 1
+                    continue
+                sentences, kept_tokens, trimmed = fitted, used, True
+
+            context.chunks.append((" ".join(sentence for sentence, _, _ in sentences) if trimmed else text, payload))
+            for _, shingles, _ in sentences:
+                seen |= shingles
+            context.tokens += kept_tokens
+            context.trimmed += int(trimmed)
+            remaining -= kept_tokens
+        return context
+
+    def record(self, endpoint: str, prompt: str, context: Optional[AssembledContext] = None) -> int:
+        """Count and log the tokens of the prompt about to be sent; returns the count."""
+        tokens = count_tokens(prompt)
+        detail = ""
+        if context is not None:
+            detail = f", {len(context.chunks)} chunks, {context.trimmed} trimmed, {context.dropped} dropped"
+        print(f"🧮 {endpoint} prompt: {tokens} tokens (budget {self.budgets.get(endpoint, '-')}{detail})")
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {"requests": 0, "tokens": 0, "max_tokens": 0,
+                                                      "chunks_trimmed": 0, "chunks_dropped": 0})
+            stats["requests"] += 1
+            stats["tokens"] += tokens
+            stats["max_tokens"] = max(stats["max_tokens"], tokens)
+            if context is not None:
+                stats["chunks_trimmed"] += context.trimmed
+                stats["chunks_dropped"] += context.dropped
+        return tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budgets": dict(self.budgets),
+                "endpoints": {
+                    endpoint: {**stats, "avg_tokens": round(stats["tokens"] / stats["requests"], 1)}
+                    for endpoint, stats in self._stats.items()
+                }
+            }
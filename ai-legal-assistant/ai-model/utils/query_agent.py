@@ -1,25 +1,24 @@
 import os
 from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from utils.embedding_backends import create_backend
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from utils.pdf_loader import iter_pdf_pages
 
 
 class QueryAgent:
     """Handles retrieving legal information from PDFs."""
     
-    def __init__(self, pdf_path, name, api_key):
+    def __init__(self, pdf_path, name, api_key, embeddings=None, backend=None):
         self.pdf_path = pdf_path
         self.name = name
 
-        if not api_key:
-            raise ValueError("❌ Google Gemini API key is missing!")
-
-        # Create embeddings object using provided key
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=api_key
-        )
+        if embeddings is not None:
+            # Shared embeddings client (e.g. from ModelRegistry)
+            self.embeddings = embeddings
+        else:
+            # "gemini" (needs the API key), "local:<model dir>" or "hashing"; see utils.embedding_backends
+            backend = create_backend(backend or os.environ.get("EMBEDDING_BACKEND"), api_key=api_key)
+            self.embeddings = backend.embeddings()
 
         # Build vectorstore
         self.vectorstore = self._create_vectorstore()
@@ -27,11 +26,10 @@ class QueryAgent:
 
     def _create_vectorstore(self):
         """Loads PDF, splits text, and stores it in FAISS."""
-        loader = PyPDFLoader(self.pdf_path)
-        documents = loader.load()
-
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        texts = text_splitter.split_documents(documents)
+        texts = []
+        for page in iter_pdf_pages(self.pdf_path):
+            texts.extend(text_splitter.split_documents([page]))
 
         vectorstore = FAISS.from_documents(texts, self.embeddings)
         return vectorstore
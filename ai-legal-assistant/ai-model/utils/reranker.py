@@ -0,0 +1,163 @@
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from utils.prompt_budget import count_tokens
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+
+CALIBRATION_FILE = "calibration.npz"
+# Rows per corpus used to estimate its score distribution
+CALIBRATION_SAMPLE = 20000
+# Candidates this similar to one already selected are dropped as duplicates
+DUPLICATE_SIMILARITY = 0.95
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _min_max(values: np.ndarray) -> np.ndarray:
+    spread = values.max() - values.min() if len(values) else 0.0
+    if spread <= 0:
+        return np.ones_like(values)
+    return (values - values.min()) / spread
+
+
+class CorpusCalibration:
+    """Per-corpus distribution of cosine scores, so scores from different corpora compare.
+
+    For each corpus the mean and covariance of its unit-length chunk vectors are
+    kept; for a unit query q the corpus' cosine scores then have mean q·μ and
+    variance qᵀΣq, and a candidate's z-score says how far it stands out from
+    its own corpus rather than how dense that corpus' embedding region is.
+    """
+
+    def __init__(self, sources: List[str], means: np.ndarray, covariances: np.ndarray):
+        self.sources = list(sources)
+        self.means = means.astype(np.float32)
+        self.covariances = covariances.astype(np.float32)
+        self._positions = {source: i for i, source in enumerate(self.sources)}
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore: "FAISS", sources: List[str], source_ids: np.ndarray,
+                         sample: int = CALIBRATION_SAMPLE, seed: int = 0) -> "CorpusCalibration":
+        """Estimate every corpus' statistics from (a sample of) its rows; `source_ids[i]` indexes `sources`."""
+        rng = np.random.default_rng(seed)
+        dimension = vectorstore.index.d
+        means = np.zeros((len(sources), dimension), dtype=np.float32)
+        covariances = np.zeros((len(sources), dimension, dimension), dtype=np.float32)
+        for i in range(len(sources)):
+            rows = np.flatnonzero(source_ids == i)
+            if len(rows) > sample:
+                rows = np.sort(rng.choice(rows, sample, replace=False))
+            if not len(rows):
+                continue
+            vectors = _unit_rows(np.vstack([vectorstore.index.reconstruct(int(row)) for row in rows]))
+            means[i] = vectors.mean(axis=0)
+            if len(rows) > 1:
+                covariances[i] = np.cov(vectors, rowvar=False)
+        return cls(sources, means, covariances)
+
+    def save(self, path: str) -> None:
+        target = os.path.join(path, CALIBRATION_FILE)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, sources=np.asarray(self.sources, dtype=str), means=self.means, covariances=self.covariances)
+        os.replace(tmp_path, target)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["CorpusCalibration"]:
+        try:
+            with np.load(os.path.join(path, CALIBRATION_FILE)) as arrays:
+                return cls(arrays["sources"].tolist(), arrays["means"], arrays["covariances"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def zscores(self, query_unit: np.ndarray, cosines: np.ndarray, sources: Sequence[str]) -> np.ndarray:
+        """Calibrated scores for candidates from `sources`; corpora without statistics pass through."""
+        means = self.means @ query_unit
+        deviations = np.sqrt(np.maximum(np.einsum("i,sij,j->s", query_unit, self.covariances, query_unit), 1e-8))
+        scores = cosines.astype(np.float32).copy()
+        for i, source in enumerate(sources):
+            position = self._positions.get(source)
+            if position is not None:
+                scores[i] = (cosines[i] - means[position]) / deviations[position]
+        return scores
+
+
+class Reranker:
+    """Re-ranks pooled candidates and picks the chunks that go into the prompt.
+
+    Candidates are scored by cosine similarity to the query, calibrated per
+    corpus and blended with their fused (BM25 + dense) rank score. Maximal
+    marginal relevance then picks chunks that are relevant but not redundant,
+    near-duplicates are dropped, and selection stops at `max_chunks` or when
+    the token budget is spent, so context may come from several corpora.
+    """
+
+    def __init__(self, calibration: Optional[CorpusCalibration] = None, mmr_lambda: float = 0.7,
+                 sparse_weight: float = 0.3, max_chunks: int = 8, token_budget: int = 3000):
+        self.calibration = calibration
+        self.mmr_lambda = mmr_lambda
+        self.sparse_weight = sparse_weight
+        self.max_chunks = max_chunks
+        self.token_budget = token_budget
+
+    def relevance(self, query_embedding: Optional[List[float]], vectors: np.ndarray,
+                  sources: Sequence[str], fused: np.ndarray) -> np.ndarray:
+        """Relevance in [0, 1] per candidate; only the fused rank score when there is no query embedding."""
+        fused_norm = fused / fused.max() if len(fused) and fused.max() > 0 else np.ones_like(fused)
+        if query_embedding is None:
+            return fused_norm
+        query_unit = _unit_rows(np.asarray([query_embedding], dtype=np.float32))[0]
+        cosines = vectors @ query_unit
+        dense = self.calibration.zscores(query_unit, cosines, sources) if self.calibration else cosines
+        return (1 - self.sparse_weight) * _min_max(dense) + self.sparse_weight * fused_norm
+
+    def select(self, vectorstore: "FAISS", ranked: Sequence[Tuple[int, float]],
+               query_embedding: Optional[List[float]]) -> List[Tuple[Document, float]]:
+        """(Document, relevance) pairs in selection order from (FAISS row, fused score) candidates."""
+        docs, rows, fused = [], [], []
+        for row, score in ranked:
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[row])
+            if isinstance(doc, Document):
+                docs.append(doc)
+                rows.append(row)
+                fused.append(score)
+        if not docs:
+            return []
+
+        vectors = _unit_rows(np.vstack([vectorstore.index.reconstruct(int(row)) for row in rows]))
+        sources = [doc.metadata.get("source", "Unknown") for doc in docs]
+        relevance = self.relevance(query_embedding, vectors, sources, np.asarray(fused, dtype=np.float32))
+        similarity = vectors @ vectors.T
+        tokens = np.asarray([count_tokens(doc.page_content) for doc in docs])
+
+        selected: List[int] = []
+        available = np.ones(len(docs), dtype=bool)
+        # Highest similarity of every candidate to anything selected so far
+        redundancy = np.full(len(docs), -1.0, dtype=np.float32)
+        spent = 0
+        while available.any() and len(selected) < self.max_chunks:
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * np.maximum(redundancy, 0)
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            available[best] = False
+            if selected and (redundancy[best] >= DUPLICATE_SIMILARITY or spent + tokens[best] > self.token_budget):
+                continue
+            selected.append(best)
+            spent += int(tokens[best])
+            redundancy = np.maximum(redundancy, similarity[best])
+        return [(docs[i], float(relevance[i])) for i in selected]
+
+    @staticmethod
+    def source_weights(selection: Sequence[Tuple[Document, float]]) -> Dict[str, float]:
+        """Summed relevance of the selected chunks per corpus, best first."""
+        weights: Dict[str, float] = {}
+        for doc, score in selection:
+            source = doc.metadata.get("source", "Unknown")
+            weights[source] = weights.get(source, 0.0) + score
+        return dict(sorted(weights.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,163 @@
+import re
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+# Characters that may open markdown the cleaner has to strip; text is held back from the
+# first of these until the line completes so the rules always see a whole construct.
+_MARKUP_CHARS = "*`#"
+_BULLET_CHARS = "*-•"
+
+
+def _clean_line_body(text: str) -> str:
+    """Inline rules of clean_ai_response, applied to a single line."""
+    cleaned = re.sub(r'\*{2,}', '', text)  # Remove multiple asterisks
+    cleaned = re.sub(r'\*([^\*]+)\*', r'\1', cleaned)  # Remove single asterisk emphasis
+    cleaned = re.sub(r'#{1,6}\s*', '', cleaned)  # Remove markdown headers
+    cleaned = re.sub(r'`([^`]+)`', r'\1', cleaned)  # Remove code formatting
+    return cleaned
+
+
+class IncrementalResponseCleaner:
+    """Streaming counterpart of clean_ai_response.
+
+    Feed it model tokens as they arrive and it returns the cleaned text that is
+    safe to emit so far. Only the current line is ever buffered, and plain text
+    on that line is released as soon as it is known not to start a bullet or
+    contain markdown. Blank lines are collapsed and leading/trailing whitespace
+    of the whole answer is dropped, matching the batch cleaner.
+    """
+
+    def __init__(self):
+        self._line = ""              # Unemitted remainder of the current line
+        self._line_started = False   # Whether part of the current line was emitted
+        self._pending_newlines = 0   # Newlines seen since the last emitted content
+        self._emitted_any = False
+        self._held = ""              # Trailing whitespace held until more content follows
+
+    def _release(self, text: str) -> str:
+        """Emit `text`, holding back trailing whitespace in case the answer ends here."""
+        body = text.rstrip()
+        if not body:
+            self._held += text
+            return ""
+        out = self._held + body
+        self._held = text[len(body):]
+        return out
+
+    def _separator(self, is_bullet: bool) -> str:
+        if not self._emitted_any:
+            return ""
+        # Bullet removal swallows preceding blank lines; otherwise cap at one blank line
+        return "\n" * (1 if is_bullet else min(self._pending_newlines, 2))
+
+    def _start_line(self, text: str, complete: bool) -> Optional[tuple]:
+        """Resolve the start of a line; returns None while that is still undecided."""
+        stripped = re.sub(r'\*{2,}', '', text).lstrip()
+        if not stripped:
+            return None
+
+        is_bullet = stripped[0] in _BULLET_CHARS
+        if not complete and (is_bullet or stripped[0] in _MARKUP_CHARS):
+            return None
+
+        if is_bullet:
+            text = re.sub(r'^\s*[\*\-\•]\s*', '', re.sub(r'\*{2,}', '', text))
+        elif not self._emitted_any:
+            text = text.lstrip()
+
+        separator = self._separator(is_bullet)
+        self._line_started = True
+        self._emitted_any = True
+        self._pending_newlines = 0
+        return separator, text
+
+    def _finish_line(self) -> str:
+        text, self._line = self._line, ""
+        out = ""
+        if not self._line_started:
+            started = self._start_line(text, complete=True)
+            if started is None:
+                self._pending_newlines += 1
+                return ""
+            out, text = started
+        out += _clean_line_body(text)
+        self._line_started = False
+        self._pending_newlines = 1
+        return self._release(out)
+
+    def _emit_partial(self) -> str:
+        out = ""
+        if not self._line_started:
+            started = self._start_line(self._line, complete=False)
+            if started is None:
+                return ""
+            out, self._line = started
+
+        # Release everything before the first character that might open markdown
+        cut = len(self._line)
+        for char in _MARKUP_CHARS:
+            index = self._line.find(char)
+            if index != -1:
+                cut = min(cut, index)
+        out += self._line[:cut]
+        self._line = self._line[cut:]
+        return self._release(out)
+
+    def feed(self, text: str) -> str:
+        out = []
+        *complete_lines, remainder = text.split("\n")
+        for line in complete_lines:
+            self._line += line
+            out.append(self._finish_line())
+        self._line += remainder
+        out.append(self._emit_partial())
+        return "".join(out)
+
+    def flush(self) -> str:
+        """Emit whatever is still buffered once the stream has ended."""
+        out = self._finish_line() if self._line else ""
+        self._held = ""
+        return out
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_cleaned_answer(
+    chunks: AsyncIterator[Any],
+    done_payload: Dict[str, Any],
+    on_complete: Optional[Callable[[str], None]] = None
+) -> AsyncIterator[str]:
+    """Turn a model token stream into SSE `token` events followed by a final `done` event.
+
+    `on_complete` receives the full cleaned answer once the stream finishes.
+    """
+    cleaner = IncrementalResponseCleaner()
+    parts = []
+    try:
+        async for chunk in chunks:
+            content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            text = cleaner.feed(content)
+            if text:
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+
+        text = cleaner.flush()
+        if text:
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+
+        if on_complete:
+            on_complete("".join(parts))
+        yield sse_event("done", done_payload)
+    except Exception as e:
+        print(f"❌ Error while streaming answer: {e}")
+        yield sse_event("error", {"error": str(e)})
+
+
+async def stream_cached_answer(answer: str, done_payload: Dict[str, Any]) -> AsyncIterator[str]:
+    """Replay an already-cleaned answer (e.g. a cache hit) as a single token event."""
+    yield sse_event("token", {"text": answer})
+    yield sse_event("done", done_payload)
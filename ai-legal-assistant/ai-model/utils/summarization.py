@@ -6,8 +6,9 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 class SummarizationAgent:
     """Summarizes legal information retrieved from PDFs."""
     
-    def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(api_key=API_KEY, model="gemini-2.5-pro", temperature=0.3)
+    def __init__(self, llm=None):
+        # Reuse a shared client when one is provided instead of building a new one
+        self.llm = llm or ChatGoogleGenerativeAI(api_key=API_KEY, model="gemini-2.5-pro", temperature=0.3)
 
     def summarize(self, text):
         """Simplifies legal content into user-friendly answers."""
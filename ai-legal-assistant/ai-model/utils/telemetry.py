@@ -0,0 +1,428 @@
+import os
+import json
+import time
+import queue
+import random
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from utils.prompt_budget import count_tokens
+
+METRIC_PREFIX = "legal_assistant"
+# Seconds; request and stage latencies from sub-millisecond searches to multi-minute extractions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Most spans per POST to the collector, and the longest a finished trace waits to be sent
+EXPORT_BATCH_SPANS = 512
+EXPORT_INTERVAL_SECONDS = 2.0
+
+# The span that new spans are children of; copied into executor threads by StagePool.run
+_current_span: contextvars.ContextVar = contextvars.ContextVar("telemetry_span", default=None)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _exception_event(component: str, error: BaseException) -> Dict[str, Any]:
+    return {"name": "exception", "time_ns": time.time_ns(),
+            "attributes": {"component": component, "exception.type": type(error).__name__,
+                           "exception.message": str(error)[:500]}}
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (non-cumulative, last is +Inf), sum, count]
+        self.values: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        entry[0][index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"' if bound == "+Inf" else f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Span:
+    """One timed stage of a request; the root span of a request holds every span of its trace."""
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.root: "Span" = parent.root if parent is not None else self
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.duration = 0.0
+        self._started = time.perf_counter()
+        # Only the root keeps the list, and only the root decides whether the trace is exported
+        self.spans: List["Span"] = []
+        self.sampled = parent.sampled if parent is not None else False
+        self.root.spans.append(self)
+
+    @property
+    def endpoint(self) -> str:
+        return self.root.attributes.get("endpoint", "background")
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def to_dict(self) -> Dict[str, Any]:
+        entry = {"name": self.name, "ms": round(self.duration * 1000, 3)}
+        if self.attributes:
+            entry["attributes"] = self.attributes
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: total milliseconds per stage of this (root) span's trace."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span is not self and span.end_ns is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+class OtlpExporter:
+    """Sends finished traces to an OpenTelemetry collector as OTLP/HTTP JSON from a background thread.
+
+    Traces queue up to `max_queue` and are posted in batches; if the collector
+    is down they are dropped (and counted) rather than slowing requests.
+    """
+
+    def __init__(self, url: str, service_name: str = "ai-legal-assistant", max_queue: int = 1000,
+                 timeout: float = 2.0):
+        self.url = url
+        self.service_name = service_name
+        self.timeout = timeout
+        self.exported = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=max_queue)
+        self._last_warning = 0.0
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: List[Span]) -> None:
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += len(spans)
+
+    @staticmethod
+    def _attribute(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def _encode(self, span: Span) -> Dict[str, Any]:
+        encoded = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            # SERVER for the request itself, INTERNAL for its stages
+            "kind": 2 if span.parent is None else 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": [self._attribute(key, value) for key, value in span.attributes.items()],
+            "events": [
+                {"name": event["name"], "timeUnixNano": str(event["time_ns"]),
+                 "attributes": [self._attribute(key, value) for key, value in event["attributes"].items()]}
+                for event in span.events
+            ],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent is not None:
+            encoded["parentSpanId"] = span.parent.span_id
+        return encoded
+
+    def _post(self, spans: List[Span]) -> None:
+        body = {"resourceSpans": [{
+            "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "utils.telemetry"}, "spans": [self._encode(span) for span in spans]}]
+        }]}
+        request = urllib.request.Request(self.url, data=json.dumps(body).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+            self.exported += len(spans)
+        except Exception as e:
+            self.dropped += len(spans)
+            if time.time() - self._last_warning > 60:
+                self._last_warning = time.time()
+                print(f"⚠️ Trace export to {self.url} failed: {e}")
+
+    def _run(self) -> None:
+        while True:
+            batch = self._queue.get()
+            deadline = time.monotonic() + EXPORT_INTERVAL_SECONDS
+            while len(batch) < EXPORT_BATCH_SPANS:
+                try:
+                    batch.extend(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._post(batch)
+
+
+class Telemetry:
+    """Per-request timing spans, Prometheus metrics and optional trace export.
+
+    `request()` opens the root span of an HTTP request and `span()` times a
+    pipeline stage inside it (also across StagePool threads). Every span feeds
+    a per-endpoint, per-stage latency histogram; token, error and cache
+    counters are rendered alongside in the Prometheus text format by
+    `render()`. A sampled share of request traces is exported to an OTLP
+    collector and/or logged as one JSON line each.
+    """
+
+    def __init__(self, exporter: Optional[OtlpExporter] = None, sample_rate: float = 1.0, log_traces: bool = False,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.log_traces = log_traces
+        self._lock = threading.Lock()
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+
+        self.request_seconds = Histogram(f"{METRIC_PREFIX}_request_seconds", "HTTP request latency.",
+                                         ["endpoint", "method", "status"], buckets)
+        self.stage_seconds = Histogram(f"{METRIC_PREFIX}_stage_seconds", "Latency of one pipeline stage.",
+                                       ["endpoint", "stage"], buckets)
+        self.tokens_total = Counter(f"{METRIC_PREFIX}_llm_tokens_total", "Gemini prompt and completion tokens.",
+                                    ["purpose", "kind"])
+        self.llm_calls_total = Counter(f"{METRIC_PREFIX}_llm_calls_total", "Gemini generation calls.", ["purpose"])
+        self.errors_total = Counter(f"{METRIC_PREFIX}_errors_total", "Errors, including ones handled and logged.",
+                                    ["component", "error"])
+
+    @classmethod
+    def from_env(cls) -> "Telemetry":
+        url = os.environ.get("TRACE_EXPORT_URL")
+        exporter = OtlpExporter(url, os.environ.get("TRACE_SERVICE_NAME", "ai-legal-assistant")) if url else None
+        return cls(exporter=exporter, sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "1.0")),
+                   log_traces=os.environ.get("TRACE_LOG", "0") == "1")
+
+    # -------------------------------
+    # Spans
+    # -------------------------------
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def request(self, endpoint: str, method: str = "POST"):
+        """Root span of one request; yields it so the caller can set its status."""
+        root = Span(endpoint, attributes={"endpoint": endpoint, "method": method})
+        root.sampled = (self.exporter is not None or self.log_traces) and random.random() < self.sample_rate
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = f"{type(e).__name__}: {e}"
+            root.set(status=500)
+            self.error(endpoint, e)
+            raise
+        finally:
+            _current_span.reset(token)
+            root.finish()
+            with self._lock:
+                self.request_seconds.observe((endpoint, method, str(root.attributes.get("status", 200))), root.duration)
+            if root.sampled:
+                self._finish_trace(root)
+
+    @contextmanager
+    def span(self, stage: str, **attributes):
+        """Time one pipeline stage; an exception marks the span as failed and is re-raised."""
+        parent = _current_span.get()
+        span = Span(stage, parent, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            # Counted once, by whoever handles it (or by the request span if nobody does)
+            span.error = f"{type(e).__name__}: {e}"
+            span.events.append(_exception_event(stage, e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            self.observe(stage, span.duration, span.endpoint)
+
+    def observe(self, stage: str, seconds: float, endpoint: Optional[str] = None) -> None:
+        """Record a stage timed outside span(), e.g. a streamed generation."""
+        if endpoint is None:
+            current = _current_span.get()
+            endpoint = current.endpoint if current else "background"
+        with self._lock:
+            self.stage_seconds.observe((endpoint, stage), seconds)
+
+    def _finish_trace(self, root: Span) -> None:
+        spans = [span for span in root.spans if span.end_ns is not None]
+        if self.exporter is not None:
+            self.exporter.export(spans)
+        if self.log_traces:
+            print(json.dumps({
+                "trace_id": root.trace_id,
+                "endpoint": root.name,
+                "status": root.attributes.get("status"),
+                "ms": round(root.duration * 1000, 3),
+                "spans": [span.to_dict() for span in spans if span is not root]
+            }))
+
+    # -------------------------------
+    # Counters
+    # -------------------------------
+    def error(self, component: str, error: BaseException) -> None:
+        """Count an error (also one that is handled and turned into a response) and note it on the current span."""
+        with self._lock:
+            self.errors_total.inc((component, type(error).__name__))
+        current = _current_span.get()
+        if current is not None:
+            current.events.append(_exception_event(component, error))
+
+    def tokens(self, purpose: str, prompt_tokens: int, completion_tokens: int) -> None:
+        """Count one generation's tokens under its prompt's purpose (the prompt budget name, e.g. "ask_existing")."""
+        with self._lock:
+            self.llm_calls_total.inc((purpose,))
+            self.tokens_total.inc((purpose, "prompt"), prompt_tokens)
+            self.tokens_total.inc((purpose, "completion"), completion_tokens)
+        current = _current_span.get()
+        if current is not None:
+            current.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def llm_usage(self, purpose: str, response: Any, prompt_tokens: int) -> None:
+        """Count a generation's tokens: Gemini's usage metadata when present, else a local count."""
+        usage = getattr(response, "usage_metadata", None) or {}
+        text = response.content if hasattr(response, "content") else response
+        self.tokens(purpose, usage.get("input_tokens") or prompt_tokens,
+                    usage.get("output_tokens") or count_tokens(text if isinstance(text, str) else str(text)))
+
+    # -------------------------------
+    # Exposition
+    # -------------------------------
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]) -> None:
+        """Add samples computed at scrape time: (name, type, help, labels, value) tuples."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for metric in (self.request_seconds, self.stage_seconds, self.tokens_total, self.llm_calls_total,
+                           self.errors_total):
+                lines.extend(metric.render())
+
+        families: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collector in self._collectors:
+            for name, kind, help_text, labels, value in collector():
+                name = f"{METRIC_PREFIX}_{name}"
+                family = families.setdefault(name, (kind, help_text, []))
+                family[2].append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        for name, (kind, help_text, samples) in families.items():
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *samples])
+        if self.exporter is not None:
+            lines.extend([
+                f"# HELP {METRIC_PREFIX}_trace_spans_total Spans handed to the trace collector.",
+                f"# TYPE {METRIC_PREFIX}_trace_spans_total counter",
+                f'{METRIC_PREFIX}_trace_spans_total{{result="exported"}} {self.exporter.exported}',
+                f'{METRIC_PREFIX}_trace_spans_total{{result="dropped"}} {self.exporter.dropped}',
+            ])
+        return "\n".join(lines) + "\n"
+
+
+class TelemetryMiddleware:
+    """ASGI middleware that runs every HTTP request inside a root span.
+
+    Requests are labelled by route template ("/upload-status/{file_id}") so
+    metric labels stay bounded; responses carry a Server-Timing header with
+    the time spent per stage and the trace id.
+    """
+
+    def __init__(self, app, telemetry: Telemetry):
+        self.app = app
+        self.telemetry = telemetry
+
+    @staticmethod
+    def _route(scope) -> str:
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with self.telemetry.request(self._route(scope), scope["method"]) as root:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    root.set(status=message["status"])
+                    headers = MutableHeaders(scope=message)
+                    timing = root.server_timing()
+                    if timing:
+                        headers.append("Server-Timing", timing)
+                    headers.append("X-Trace-Id", root.trace_id)
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
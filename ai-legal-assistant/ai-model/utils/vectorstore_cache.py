@@ -0,0 +1,150 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional, Any
+from utils.mmap_store import MmapDocstore
+
+if TYPE_CHECKING:
+    from langchain_core.vectorstores import VectorStore
+
+# Rough per-chunk overhead of the Document object, its metadata dict and the id mappings
+_PER_CHUNK_OVERHEAD = 512
+
+
+def estimate_vectorstore_bytes(vectorstore: "VectorStore") -> int:
+    """Estimate the resident size of a FAISS vectorstore: index vectors plus docstore text."""
+    index = getattr(vectorstore, "index", None)
+    index_bytes = 0
+    ntotal = 0
+    if index is not None:
+        # Charged in full whether or not the vectors are mapped (faiss < 1.11 reads them into the heap)
+        ntotal = index.ntotal
+        code_size = getattr(index, "code_size", 0) or index.d * 4
+        index_bytes = ntotal * code_size
+
+    text_bytes = 0
+    docstore = getattr(vectorstore, "docstore", None)
+    if isinstance(docstore, MmapDocstore):
+        # Compact-layout stores keep their text in mapped pages rather than in Document objects;
+        # those pages are charged in full, as a store that is being searched has them resident
+        text_bytes = docstore.nbytes()
+    for doc in getattr(docstore, "_dict", {}).values():
+        text_bytes += len(doc.page_content.encode("utf-8"))
+        text_bytes += sum(len(str(k)) + len(str(v)) for k, v in doc.metadata.items())
+
+    return index_bytes + text_bytes + ntotal * _PER_CHUNK_OVERHEAD
+
+
+class VectorStoreCache:
+    """Memory-bounded cache of uploaded-document vectorstores.
+
+    Entries are evicted by LRU or LFU order once the estimated resident bytes
+    exceed `max_bytes`. Evicted stores stay on disk, so a later miss reloads
+    them lazily through the loader passed to get_or_load.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+
+        # key -> {"store", "bytes", "uses"}; ordered from least to most recently used
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self._loading: Dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: str) -> Optional["VectorStore"]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["uses"] += 1
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["store"]
+
+    def put(self, key: str, vectorstore: "VectorStore") -> None:
+        size = estimate_vectorstore_bytes(vectorstore)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._resident_bytes -= previous["bytes"]
+            self._entries[key] = {"store": vectorstore, "bytes": size, "uses": 1}
+            self._resident_bytes += size
+            self._evict(keep=key)
+
+    def _evict(self, keep: str) -> None:
+        while self._resident_bytes > self.max_bytes and len(self._entries) > 1:
+            candidates = [k for k in self._entries if k != keep]
+            if self.policy == "lfu":
+                # Least used first; OrderedDict order breaks ties by recency
+                victim = min(candidates, key=lambda k: self._entries[k]["uses"])
+            else:
+                victim = candidates[0]
+            entry = self._entries.pop(victim)
+            self._resident_bytes -= entry["bytes"]
+            self.evictions += 1
+
+    async def get_or_load(self, key: str, loader: Callable[[str], Awaitable[Optional["VectorStore"]]]) -> Optional["VectorStore"]:
+        """Return the cached store, or load it with `loader`; concurrent misses share one load."""
+        vectorstore = self.get(key)
+        if vectorstore is not None:
+            return vectorstore
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            vectorstore = await loader(key)
+            if vectorstore is not None:
+                self.loads += 1
+                self.put(key, vectorstore)
+            future.set_result(vectorstore)
+            return vectorstore
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._loading.pop(key, None)
+            if not future.done():
+                # The loading request itself was cancelled
+                future.cancel()
+            elif not future.cancelled():
+                # Nobody else may be waiting; mark any exception as retrieved
+                future.exception()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._resident_bytes -= entry["bytes"]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "resident_bytes": self._resident_bytes,
+                "max_bytes": self.max_bytes,
+                "policy": self.policy,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "loads": self.loads,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,14 @@
+import { NextResponse } from "next/server";
+
+export async function GET(req) {
+  // file_id is returned from ask-upload while the document is still being processed
+  const fileId = req.nextUrl.searchParams.get("file_id");
+  if (!fileId) {
+    return NextResponse.json({ error: "file_id is required" }, { status: 400 });
+  }
+
+  const response = await fetch(`http://localhost:8000/upload-status/${encodeURIComponent(fileId)}`);
+
+  const data = await response.json();
+  return NextResponse.json(data);
+}
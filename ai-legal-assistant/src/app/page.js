@@ -10,6 +10,11 @@ import { chatService } from "./services/chatService.js";
 import SignaturePad from "./components/SignaturePad.js";
 import Modal from "./components/Modal.js";
 
+// Stop waiting for a document that is still being processed after this long
+const UPLOAD_WAIT_TIMEOUT_MS = 10 * 60 * 1000;
+
+const uploadError = (message) => Object.assign(new Error(message), { isUploadError: true });
+
 export default function Home() {
   const router = useRouter();
   const { isSignedIn, isLoaded, userId } = useAuth();
@@ -224,6 +229,19 @@ export default function Home() {
     }
   };
 
+  const waitForUpload = async (uploadFileId) => {
+    const deadline = Date.now() + UPLOAD_WAIT_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+      const response = await fetch(`/api/ai/ask-upload/status?file_id=${encodeURIComponent(uploadFileId)}`);
+      const status = await response.json();
+      // A failed job reports its error here
+      if (status.error) throw uploadError(status.error);
+      if (status.status === 'ready') return;
+      await new Promise((resolve) => setTimeout(resolve, 1500));
+    }
+    throw uploadError("Processing the document is taking too long. Please try again later.");
+  };
+
   const handleAnalyze = async () => {
     setLoading(true);
     setAiResponse("");
@@ -251,10 +269,24 @@ export default function Home() {
           method: 'POST',
           body: formData,
         });
-        const data = await response.json();
+        let data = await response.json();
         if (data.error) throw new Error(data.error);
 
         setFileId(data.file_id);
+
+        // New documents are processed in the background; wait for them, then ask via the context route
+        if (data.status) {
+          await waitForUpload(data.file_id);
+          const contextData = new FormData();
+          contextData.append("query", question);
+          contextData.append("file_id", data.file_id);
+          const contextResponse = await fetch('/api/ai/ask-upload/context', {
+            method: 'POST',
+            body: contextData,
+          });
+          data = { ...(await contextResponse.json()), file_id: data.file_id };
+          if (data.error) throw new Error(data.error);
+        }
         setAiResponse(data.answer);
         
         // Save chat with document if it's a new analysis
@@ -279,7 +311,9 @@ export default function Home() {
       }
     } catch (error) {
       console.error('Error:', error);
-      setAiResponse("Sorry, there was an error processing your request.");
+      setAiResponse(error.isUploadError
+        ? `Sorry, the document could not be processed: ${error.message}`
+        : "Sorry, there was an error processing your request.");
     } finally {
       setLoading(false);
     }